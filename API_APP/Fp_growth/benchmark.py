@@ -0,0 +1,219 @@
+"""
+FP-growth 性能基准与正确性校验
+
+按Zipf分布生成模拟处方（药品出现频次服从幂律），分别统计建全局FP树（create_fptree）、
+递归挖掘条件FP树（create_cond_fptree）和完整规则生成（generate_R）的耗时与峰值内存，每个组合输出一行JSON；
+--check 在小规模数据上用穷举法校验频繁项集、关联规则以及闭/最大/top-k模式的结果，用于验证新的挖掘实现与现有输出一致。
+
+运行（仓库根目录）：
+    python -m API_APP.Fp_growth.benchmark --transactions 10000 100000 --items 500 --zipf 1.1 --output bench.jsonl
+    python -m API_APP.Fp_growth.benchmark --check 50
+"""
+import argparse
+import contextlib
+import itertools
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from API_APP.Fp_growth.fp_growth import Fp_growth, resolve_min_support
+
+
+def generate_baskets(n_transactions: int, n_items: int, zipf_s: float = 1.0, mean_size: float = 4.0, seed: int = 0):
+    """
+    生成模拟处方数据集
+    :param n_transactions: 处方数
+    :param n_items: 药品种类数
+    :param zipf_s: Zipf指数，第r常用药品的出现概率正比于 1/r^s，越大越偏斜
+    :param mean_size: 平均每张处方的药品数（泊松分布，至少1味）
+    :param seed: 随机种子
+    :return: 二维列表，与 load_data 的返回格式相同
+    """
+    rng = np.random.default_rng(seed)
+    names = [f"药品{i:05d}" for i in range(n_items)]
+    p = 1.0 / np.arange(1, n_items + 1) ** zipf_s
+    p /= p.sum()
+    sizes = np.clip(rng.poisson(mean_size - 1, n_transactions) + 1, 1, n_items)
+    draws = rng.choice(n_items, size=int(sizes.sum() * 1.5) + n_items, p=p)
+    baskets = []
+    pos = 0
+    for size in sizes:
+        basket = set()
+        while len(basket) < size:
+            if pos == len(draws):
+                draws = rng.choice(n_items, size=len(draws), p=p)
+                pos = 0
+            basket.add(draws[pos])
+            pos += 1
+        baskets.append(sorted(names[i] for i in basket))
+    return baskets
+
+
+@contextlib.contextmanager
+def quiet():
+    """屏蔽挖掘代码打印的进度信息，避免混入JSON Lines输出和计时"""
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+def check(condition, message):
+    """校验失败时抛出AssertionError，不使用assert语句，python -O 下仍然生效"""
+    if not condition:
+        raise AssertionError(message)
+
+
+def brute_force_support(data_set, min_support):
+    """穷举每条处方的全部非空子集统计支持度计数，仅适用于单条处方药品数较少的数据"""
+    counts = {}
+    for t in data_set:
+        items = sorted(set(t))
+        for size in range(1, len(items) + 1):
+            for subset in itertools.combinations(items, size):
+                key = frozenset(subset)
+                counts[key] = counts.get(key, 0) + 1
+    return {itemset: count for itemset, count in counts.items() if count >= min_support}
+
+
+def brute_force_rules(support_data, min_conf):
+    """穷举每个频繁项集的全部前件/后件划分"""
+    rules = set()
+    for itemset, support in support_data.items():
+        for size in range(1, len(itemset)):
+            for antecedent in itertools.combinations(sorted(itemset), size):
+                antecedent = frozenset(antecedent)
+                conf = support / support_data[antecedent]
+                if conf >= min_conf:
+                    rules.add((antecedent, itemset - antecedent, round(conf, 9)))
+    return rules
+
+
+def cross_check(n_cases: int = 20, seed: int = 0):
+    """
+    在随机小规模数据上比较 Fp_growth 与穷举结果，不一致时抛出AssertionError
+    :param n_cases: 随机用例数
+    :param seed: 随机种子
+    :return: 各用例的规模统计
+    """
+    rng = np.random.default_rng(seed)
+    fp = Fp_growth()
+    records = []
+    for case in range(n_cases):
+        data_set = generate_baskets(int(rng.integers(10, 300)), int(rng.integers(3, 20)), float(rng.uniform(0.5, 2.0)),
+                                    float(rng.uniform(1.5, 5.0)), seed=seed + case)
+        min_support = int(rng.integers(1, 10))
+        min_conf = float(rng.uniform(0.05, 0.9))
+        expected = brute_force_support(data_set, min_support)
+
+        _, support_data = fp.generate_L(data_set, min_support)
+        check(support_data == expected, f"用例{case}：频繁项集不一致")
+
+        rules = {(a, c, round(conf, 9)) for a, c, conf in fp.generate_R(data_set, min_support, min_conf)}
+        check(rules == brute_force_rules(expected, min_conf), f"用例{case}：关联规则不一致")
+
+        closed = {s: c for s, c in expected.items() if not any(s < t and expected[t] == c for t in expected)}
+        check(fp.generate_condensed(data_set, min_support, "closed") == closed, f"用例{case}：闭频繁项集不一致")
+        maximal = {s: c for s, c in expected.items() if not any(s < t for t in expected)}
+        check(fp.generate_condensed(data_set, min_support, "maximal") == maximal, f"用例{case}：最大频繁项集不一致")
+
+        k = int(rng.integers(1, 30))
+        supports = sorted((c for s, c in expected.items() if len(s) > 1), reverse=True)
+        threshold = max(min_support, supports[k - 1]) if len(supports) >= k else min_support
+        _, top_k = fp.generate_top_k_L(data_set, min_support, k)
+        check(top_k == {s: c for s, c in expected.items() if c >= threshold}, f"用例{case}：top-k项集不一致")
+
+        records.append({"case": case, "n_transactions": len(data_set), "min_support": min_support,
+                        "n_itemsets": len(expected), "n_rules": len(rules)})
+    return records
+
+
+def time_stages(data_set, min_support: int, min_conf: float, n_jobs: int = 1):
+    """分别统计建全局FP树、挖掘条件FP树和完整规则生成的耗时"""
+    fp = Fp_growth()
+    with quiet():
+        return _time_stages(fp, data_set, min_support, min_conf, n_jobs)
+
+
+def _time_stages(fp, data_set, min_support, min_conf, n_jobs):
+    start = time.perf_counter()
+    tree, _ = fp.build_tree(data_set, min_support)
+    build_seconds = time.perf_counter() - start
+
+    n_nodes = 0 if tree is None else len(tree.item) - 1
+    support_data = {}
+    start = time.perf_counter()
+    if tree is not None:
+        fp.create_cond_fptree(tree, min_support, frozenset(), set(), support_data)
+    mine_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    rules = fp.generate_R(data_set, min_support, min_conf, n_jobs)
+    rules_seconds = time.perf_counter() - start
+    return {
+        "create_fptree_seconds": round(build_seconds, 4),
+        "create_cond_fptree_seconds": round(mine_seconds, 4),
+        "generate_R_seconds": round(rules_seconds, 4),
+        "n_nodes": n_nodes,
+        "n_itemsets": len(support_data),
+        "n_rules": len(rules),
+    }
+
+
+def run_case(data_set, min_support: int, min_conf: float, n_jobs: int = 1, repeat: int = 1):
+    record = min((time_stages(data_set, min_support, min_conf, n_jobs) for _ in range(repeat)),
+                 key=lambda r: r["generate_R_seconds"])
+
+    # tracemalloc会拖慢计算，峰值内存单独运行一次统计（多进程时不含子进程内存）
+    tracemalloc.start()
+    with quiet():
+        Fp_growth().generate_R(data_set, min_support, min_conf, n_jobs)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    record["peak_memory_mb"] = round(peak / 1024 / 1024, 2)
+    return record
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="FP-growth 性能基准")
+    parser.add_argument("--transactions", nargs="+", type=int, default=[10000, 50000])
+    parser.add_argument("--items", nargs="+", type=int, default=[200, 1000])
+    parser.add_argument("--zipf", nargs="+", type=float, default=[1.0])
+    parser.add_argument("--mean-size", type=float, default=6.0, help="平均每张处方的药品数")
+    parser.add_argument("--min-support", type=float, default=0.005, help="小于1时为占事务总数的比例")
+    parser.add_argument("--min-conf", type=float, default=0.5)
+    parser.add_argument("--n-jobs", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=1, help="每个组合重复计时次数，取最短耗时")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--check", type=int, default=0, help="穷举校验的随机用例数，大于0时只做校验")
+    parser.add_argument("--output", default=None, help="JSON Lines输出文件，默认输出到标准输出")
+    args = parser.parse_args(argv)
+
+    out = open(args.output, "w") if args.output else sys.stdout
+    try:
+        if args.check > 0:
+            with quiet():
+                records = cross_check(args.check, args.seed)
+            for record in records:
+                out.write(json.dumps(record) + "\n")
+            return
+        for n_transactions in args.transactions:
+            for n_items in args.items:
+                for zipf_s in args.zipf:
+                    data_set = generate_baskets(n_transactions, n_items, zipf_s, args.mean_size, args.seed)
+                    min_support = resolve_min_support(args.min_support, n_transactions)
+                    record = {"n_transactions": n_transactions, "n_items": n_items, "zipf": zipf_s,
+                              "mean_size": args.mean_size, "min_support": min_support, "min_conf": args.min_conf,
+                              "n_jobs": args.n_jobs}
+                    record.update(run_case(data_set, min_support, args.min_conf, args.n_jobs, args.repeat))
+                    out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
 import os
+from enum import Enum
 from pathlib import Path
 from fastapi import APIRouter
 from fastapi import File, UploadFile, Form
@@ -13,23 +14,41 @@ router = APIRouter(
 )
 
 
+class MiningMode(str, Enum):
+    all = "all"  # 全部频繁项集生成规则
+    closed = "closed"  # 闭频繁项集
+    maximal = "maximal"  # 最大频繁项集
+    top_k = "top_k"  # 支持度最高的top_k个项集生成规则
+
+
+class OutputFormat(str, Enum):
+    csv = "csv"
+    parquet = "parquet"
+
+
 @router.post("/")
 async def fpgrowth(
-        min_support: int = Form(default=25, gt=0),
+        min_support: float = Form(default=25, gt=0, description="最小支持度，小于1时为占事务总数的比例"),
         min_conf: float = Form(default=0.7, gt=0, le=1),
-        data_file: UploadFile = File(description="FP-growth data_files file, file_type = csv or xls")
+        n_jobs: int = Form(default=1, ge=0, description="并行挖掘进程数，0为CPU核数"),
+        mode: MiningMode = Form(default=MiningMode.all, description="挖掘模式，closed/maximal 只输出项集不生成规则"),
+        top_k: int = Form(default=100, gt=0, description="top_k 模式下的项集个数"),
+        output_format: OutputFormat = Form(default=OutputFormat.csv, description="结果文件格式"),
+        data_file: UploadFile = File(description="FP-growth data_files file, file_type = csv, xls or xlsx")
 ):
-    description = f"使用FP-growth算法进行关联规则挖掘，返回的计算结果为txt文件。\
-        数据文件名：{data_file.filename}，最小支持度：{min_support}，最小置信度：{min_conf}。"
+    description = f"使用FP-growth算法进行关联规则挖掘，返回的计算结果为{output_format.value}文件。\
+        数据文件名：{data_file.filename}，最小支持度：{min_support}，最小置信度：{min_conf}，挖掘模式：{mode.value}。"
 
     current_dir = Path(__file__).resolve().parent.parent
     data_path = f"{current_dir}/temp_files/{data_file.filename.replace('./', '')}"
     os.makedirs(os.path.dirname(data_path), exist_ok=True)
     with open(data_path, "wb") as f:
-        contents = await data_file.read()
-        f.write(contents)
+        # 分块写入，避免将整个上传文件读入内存
+        while contents := await data_file.read(1024 * 1024):
+            f.write(contents)
 
-    task = cal_fg_task.apply_async(args=[data_path, str(current_dir), min_support, min_conf])
+    task = cal_fg_task.apply_async(args=[data_path, str(current_dir), min_support, min_conf, n_jobs,
+                                         mode.value, top_k, output_format.value])
     add_task_to_frontend(
         task_id=task.id,
         task_name="关联规则挖掘",
@@ -1,199 +1,515 @@
 import csv
+import hashlib
+import heapq
+import math
+import multiprocessing
 import os
+import pickle
+import shutil
+from array import array
+from concurrent.futures import ProcessPoolExecutor
 
+import pandas as pd
+from openpyxl import load_workbook
 from xlrd import open_workbook
 
 
-class Node:
-    def __init__(self, node_name, count, parentNode):
+class FPTree:
+    def __init__(self, item_ids, item_counts):
         """
-        初始化节点
-        :param node_name: 节点名称
-        :param count: 节点计数
-        :param parentNode: 父节点
+        用并列的整数数组存储FP树，节点以下标表示，0为根节点
+        :param item_ids: 本树局部项编号到上层项编号的映射，局部编号按支持度从大到小排列
+        :param item_counts: 各局部项的支持度计数
         """
-        self.name = node_name
-        self.count = count
-        self.nodeLink = None  # 根据nodeLink可以找到整棵树中所有nodename一样的节点
-        self.parent = parentNode  # 父亲节点
-        self.children = {}  # 子节点{节点名字:节点地址}
+        self.item_ids = item_ids
+        # 节点数组：项编号、计数、父节点、同项下一个节点（nodeLink）
+        self.item = [-1]
+        self.count = [0]
+        self.parent = [-1]
+        self.next = [-1]
+        self.children = {}  # 子节点哈希表 {(父节点, 项编号): 子节点}
+        self.path_cache = {}  # 挖掘时缓存的节点路径 {节点: 该节点到根节点的上层项编号路径}
+        # 头表：各项支持度计数、链表头节点、链表尾节点
+        self.header_count = item_counts
+        self.head = [-1] * len(item_ids)
+        self.tail = [-1] * len(item_ids)
+
+    def add_node(self, item, count, parent):
+        node = len(self.item)
+        self.item.append(item)
+        self.count.append(count)
+        self.parent.append(parent)
+        self.next.append(-1)
+        self.children[(parent, item)] = node
+        return node
+
+    def to_arrays(self):
+        """导出重建该树所需的紧凑数组（节点项编号、计数、父节点及头表），子节点哈希表和节点链表可由此重建"""
+        return {
+            "item_ids": array('I', self.item_ids),
+            "header_count": array('I', self.header_count),
+            "item": array('i', self.item),
+            "count": array('I', self.count),
+            "parent": array('i', self.parent),
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays, n_items=None):
+        """
+        由 to_arrays 导出的数组重建FP树
+        :param arrays: to_arrays 的返回值
+        :param n_items: 只保留局部编号小于n_items的项（支持度最高的n_items项），默认保留全部。
+            每条路径上的局部编号自根向下递增，这些节点构成包含根节点的子树，按下标顺序截取即可
+        :return: FP树
+        """
+        if n_items is None:
+            n_items = len(arrays["item_ids"])
+        tree = cls(list(arrays["item_ids"][:n_items]), list(arrays["header_count"][:n_items]))
+        new_node = [0] * len(arrays["item"])
+        for node in range(1, len(arrays["item"])):  # 父节点下标总小于子节点
+            item = arrays["item"][node]
+            if item >= n_items:
+                continue
+            child = new_node[node] = tree.add_node(item, arrays["count"][node], new_node[arrays["parent"][node]])
+            # 按原节点顺序追加到节点链表尾部
+            if tree.head[item] == -1:
+                tree.head[item] = child
+            else:
+                tree.next[tree.tail[item]] = child
+            tree.tail[item] = child
+        return tree
 
 
 class Fp_growth():
-    def update_header(self, node, targetNode):
+    def __init__(self, tree_cache=None):
         """
-        更新headertable中的node节点形成的链表
-        :param node: 当前节点
-        :param targetNode: 目标节点
+        :param tree_cache: FpCache，提供时对 stream_data/FpCache 得到的数据集复用缓存的全局FP树
         """
-        while node.nodeLink != None:
-            node = node.nodeLink
-        node.nodeLink = targetNode
+        self.tree_cache = tree_cache
 
-    def update_fptree(self, items, node, headerTable):
+    def update_header(self, tree, node):
         """
-        用于更新fptree
-        :param items: 待更新的项集
-        :param node: 当前节点
-        :param headerTable: 头表
+        将node追加到头表中同项节点链表的尾部，借助尾指针为O(1)
+        :param tree: FP树
+        :param node: 新节点
         """
-        if items[0] in node.children:
-            # 判断items的第一个结点是否已作为子结点
-            node.children[items[0]].count += 1
+        item = tree.item[node]
+        if tree.head[item] == -1:
+            tree.head[item] = node
         else:
-            # 创建新的分支
-            node.children[items[0]] = Node(items[0], 1, node)
-            # 更新相应频繁项集的链表，往后添加
-            if headerTable[items[0]][1] == None:
-                headerTable[items[0]][1] = node.children[items[0]]
+            tree.next[tree.tail[item]] = node
+        tree.tail[item] = node
+
+    def update_fptree(self, items, node, tree, count=1):
+        """
+        用于更新fptree，从node开始沿items逐项向下插入
+        :param items: 待更新的项集（局部项编号，按支持度从大到小排序）
+        :param node: 当前节点
+        :param tree: FP树
+        :param count: 该项集的权重（出现次数）
+        """
+        children = tree.children
+        for item in items:
+            child = children.get((node, item))
+            if child is not None:
+                # 判断item是否已作为子结点
+                tree.count[child] += count
             else:
-                self.update_header(
-                    headerTable[items[0]][1], node.children[items[0]])
-            # 递归
-        if len(items) > 1:
-            self.update_fptree(items[1:], node.children[items[0]], headerTable)
+                # 创建新的分支，并更新相应频繁项的链表
+                child = tree.add_node(item, count, node)
+                self.update_header(tree, child)
+            node = child
 
-    def create_fptree(self, data_set, min_support):
+    def create_fptree(self, data_set, min_support, item_count=None):
         """
         根据data_set创建fp树
-        :param data_set: 数据集
+        :param data_set: 加权数据集，各元素为 (项编号序列, 出现次数)
         :param min_support: 最小支持度
-        :return: 树的根节点和头表
-        """
-        item_count = {}  # 统计各项出现次数
-        for t in data_set:  # 第一次遍历，得到频繁一项集
-            for item in t:
-                if item not in item_count:
-                    item_count[item] = 1
-                else:
-                    item_count[item] += 1
-        headerTable = {}
-        for k in item_count:  # 剔除不满足最小支持度的项
-            if item_count[k] >= min_support:
-                headerTable[k] = item_count[k]
-
-        freqItemSet = set(headerTable.keys())  # 满足最小支持度的频繁项集
-        if len(freqItemSet) == 0:
-            return None, None
-        for k in headerTable:
-            headerTable[k] = [headerTable[k], None]  # element: [count, node]
-        tree_header = Node('head node', 1, None)
-        ite = data_set
-        for t in ite:  # 第二次遍历，建树
-            localD = {}
-            for item in t:
-                if item in freqItemSet:  # 过滤，只取该样本中满足最小支持度的频繁项
-                    localD[item] = headerTable[item][0]  # element : count
-            if len(localD) > 0:
-                # 根据全局频数从大到小对单样本排序
-                order_item = [v[0] for v in sorted(
-                    localD.items(), key=lambda x: x[1], reverse=True)]
-                # 用过滤且排序后的样本更新树
-                self.update_fptree(order_item, tree_header, headerTable)
-        return tree_header, headerTable
-
-    def find_path(self, node, nodepath):
-        """
-        递归将node的父节点添加到路径
+        :param item_count: 已统计好的各项出现次数，提供时跳过第一次遍历（data_set只需遍历一次）
+        :return: FP树，无频繁项时为None
+        """
+        if item_count is None:
+            item_count = {}  # 统计各项出现次数
+            for t, count in data_set:  # 第一次遍历，得到频繁一项集
+                for item in t:
+                    if item not in item_count:
+                        item_count[item] = count
+                    else:
+                        item_count[item] += count
+        # 剔除不满足最小支持度的项，按全局频数从大到小分配局部编号
+        freq_items = sorted(((item, count) for item, count in item_count.items() if count >= min_support),
+                            key=lambda x: (-x[1], x[0]))
+        if len(freq_items) == 0:
+            return None
+        tree = FPTree([item for item, _ in freq_items], [count for _, count in freq_items])
+        local_ids = {item: i for i, (item, _) in enumerate(freq_items)}
+        for t, count in data_set:  # 第二次遍历，建树
+            # 过滤，只取该样本中满足最小支持度的频繁项，局部编号升序即全局频数降序
+            order_item = sorted({local_ids[item] for item in t if item in local_ids})
+            if len(order_item) > 0:
+                # 用过滤且排序后的样本更新树，每条加权样本只插入一次
+                self.update_fptree(order_item, 0, tree, count)
+        return tree
+
+    def find_path(self, tree, node):
+        """
+        找出node的前缀路径（由父节点到根节点的上层项编号）。
+        沿途节点的路径都会缓存，同一棵树中共享前缀的节点不必重复向上遍历
+        :param tree: FP树
         :param node: 当前节点
-        :param nodepath: 路径列表
+        :return: 前缀路径元组
         """
-        if node.parent != None:
-            nodepath.append(node.parent.name)
-            self.find_path(node.parent, nodepath)
+        cache = tree.path_cache
+        # 向上找到第一个已缓存路径的祖先
+        stack = []
+        ancestor = tree.parent[node]
+        while ancestor > 0 and ancestor not in cache:
+            stack.append(ancestor)
+            ancestor = tree.parent[ancestor]
+        path = cache[ancestor] if ancestor > 0 else ()
+        for ancestor in reversed(stack):
+            path = (tree.item_ids[tree.item[ancestor]],) + path
+            cache[ancestor] = path
+        return path
 
-    def find_cond_pattern_base(self, node_name, headerTable):
+    def find_cond_pattern_base(self, item, tree):
         """
-        根据节点名字，找出所有条件模式基
-        :param node_name: 节点名称
-        :param headerTable: 头表
-        :return: 条件模式基
+        根据局部项编号，找出所有条件模式基
+        :param item: 局部项编号
+        :param tree: FP树
+        :return: 条件模式基 {上层项编号路径: 计数}
         """
-        treeNode = headerTable[node_name][1]
+        node = tree.head[item]
         cond_pat_base = {}  # 保存所有条件模式基
-        while treeNode != None:
-            nodepath = []
-            self.find_path(treeNode, nodepath)
-            if len(nodepath) > 1:
-                cond_pat_base[frozenset(nodepath[:-1])] = treeNode.count
-            treeNode = treeNode.nodeLink
+        while node != -1:
+            path = self.find_path(tree, node)
+            if len(path) > 0:
+                cond_pat_base[path] = cond_pat_base.get(path, 0) + tree.count[node]
+            node = tree.next[node]
         return cond_pat_base
 
-    def create_cond_fptree(self, headerTable, min_support, temp, freq_items, support_data):
+    def create_cond_fptree(self, tree, min_support, temp, freq_items, support_data):
         """
         创建条件FP树
-        :param headerTable: 头表
+        :param tree: FP树
         :param min_support: 最小支持度
         :param temp: 临时频繁项集
         :param freq_items: 频繁项集
         :param support_data: 支持度数据
         """
-        # 最开始的频繁项集是headerTable中的各元素
-        freqs = [v[0] for v in sorted(
-            headerTable.items(), key=lambda p: p[1][0])]  # 根据频繁项的总频次排序
-        for freq in freqs:  # 对每个频繁项
-            freq_set = temp.copy()
-            freq_set.add(freq)
-            freq_items.add(frozenset(freq_set))
-            if frozenset(freq_set) not in support_data:  # 检查该频繁项是否在support_data中
-                support_data[frozenset(freq_set)] = headerTable[freq][0]
-            else:
-                support_data[frozenset(freq_set)] += headerTable[freq][0]
-
-            cond_pat_base = self.find_cond_pattern_base(
-                freq, headerTable)  # 寻找到所有条件模式基
-            cond_pat_dataset = []  # 将条件模式基字典转化为数组
-            for item in cond_pat_base:
-                item_temp = list(item)
-                item_temp.sort()
-                for i in range(cond_pat_base[item]):
-                    cond_pat_dataset.append(item_temp)
-            # 创建条件模式树
-            cond_tree, cur_headtable = self.create_fptree(
-                cond_pat_dataset, min_support)
-            if cur_headtable != None:
-                self.create_cond_fptree(
-                    cur_headtable, min_support, freq_set, freq_items, support_data)  # 递归挖掘条件FP树
-
-    def generate_L(self, data_set, min_support):
+        # 最开始的频繁项集是头表中的各元素，按频繁项的总频次从小到大处理
+        for item in reversed(range(len(tree.item_ids))):  # 对每个频繁项
+            self.mine_item(tree, item, min_support, temp, freq_items, support_data)
+        tree.path_cache.clear()  # 该树挖掘完毕，释放路径缓存
+
+    def mine_item(self, tree, item, min_support, temp, freq_items, support_data):
         """
-        生成频繁项集
-        :param data_set: 数据集
+        挖掘头表中单个频繁项：记录 temp∪{item} 的支持度，并递归挖掘其条件FP树
+        :param tree: FP树
+        :param item: 局部项编号
         :param min_support: 最小支持度
-        :return: 频繁项集和支持度数据
+        :param temp: 临时频繁项集
+        :param freq_items: 频繁项集
+        :param support_data: 支持度数据
         """
-        freqItemSet = set()
-        support_data = {}
-        tree_header, headerTable = self.create_fptree(
-            data_set, min_support)  # 创建数据集的fptree
-        # 创建各频繁一项的fptree，并挖掘频繁项并保存支持度计数
-        self.create_cond_fptree(headerTable, min_support,
-                                set(), freqItemSet, support_data)
+        freq_set = temp | {tree.item_ids[item]}
+        freq_items.add(freq_set)
+        support_data[freq_set] = tree.header_count[item]
+
+        cond_pat_base = self.find_cond_pattern_base(item, tree)  # 寻找到所有条件模式基
+        # 以 (路径, 计数) 作为加权样本创建条件模式树
+        cond_tree = self.create_fptree(cond_pat_base.items(), min_support)
+        if cond_tree is not None:
+            self.create_cond_fptree(cond_tree, min_support, freq_set, freq_items, support_data)  # 递归挖掘条件FP树
+
+    def partition_header_items(self, tree, n_groups):
+        """
+        按条件模式基规模估计（该项所有节点的深度之和）将头表各项贪心分配到n_groups组，使各组负载均衡
+        :param tree: FP树
+        :param n_groups: 分组数
+        :return: 各组的局部项编号列表
+        """
+        depth = [0] * len(tree.item)
+        cost = [0] * len(tree.item_ids)
+        for node in range(1, len(tree.item)):  # 父节点下标总小于子节点
+            depth[node] = depth[tree.parent[node]] + 1
+            cost[tree.item[node]] += depth[node]
+        groups = [[] for _ in range(n_groups)]
+        loads = [(0, g) for g in range(n_groups)]
+        for item in sorted(range(len(cost)), key=lambda i: -cost[i]):
+            load, g = heapq.heappop(loads)
+            groups[g].append(item)
+            heapq.heappush(loads, (load + cost[item], g))
+        return [group for group in groups if group]
+
+    def mine_parallel(self, tree, min_support, n_jobs, support_data):
+        """
+        多进程并行挖掘头表各项的条件FP树。全局树通过进程池初始化参数传给子进程
+        （fork方式下与主进程共享只读内存），各子进程返回的支持度数据合并到support_data
+        :param tree: 全局FP树
+        :param min_support: 最小支持度
+        :param n_jobs: 进程数
+        :param support_data: 支持度数据
+        """
+        groups = self.partition_header_items(tree, n_jobs)
+        if _in_daemon_process():
+            # Celery prefork的子进程为守护进程，multiprocessing不允许其创建子进程，改用Celery自带的billiard进程池
+            from billiard.pool import Pool
+            pool = Pool(processes=len(groups), initializer=_init_mining_worker, initargs=(tree, min_support))
+            try:
+                for group_support_data in pool.map(_mine_items, groups):
+                    support_data.update(group_support_data)
+            finally:
+                pool.terminate()
+                pool.join()
+            return
+        with ProcessPoolExecutor(max_workers=len(groups), initializer=_init_mining_worker,
+                                 initargs=(tree, min_support)) as executor:
+            for group_support_data in executor.map(_mine_items, groups):
+                support_data.update(group_support_data)
+
+    def build_tree(self, data_set, min_support):
+        """
+        将数据集编码为整数并创建全局FP树
+        :param data_set: 数据集，二维列表或 stream_data 得到的 EncodedTransactions
+        :param min_support: 最小支持度
+        :return: FP树（无频繁项时为None）和项编号到项名称的映射
+        """
+        if isinstance(data_set, EncodedTransactions):
+            item_names = data_set.item_names
+            tree = self.tree_cache.load_tree(data_set, min_support) if self.tree_cache is not None else None
+            if tree is None:
+                # 已编码并统计过项频数，直接从磁盘缓冲区单次遍历建树
+                tree = self.create_fptree(((t, 1) for t in data_set), min_support,
+                                          dict(enumerate(data_set.item_counts)))
+                if self.tree_cache is not None and tree is not None:
+                    self.tree_cache.save_tree(data_set, min_support, tree)
+            elif len(tree.item_ids) == 0:
+                tree = None
+        else:
+            # 预先将各项编码为整数，挖掘过程中只处理整数编号，相同样本合并为一条加权样本
+            item_index = {}
+            encoded_set = {}
+            for t in data_set:
+                key = tuple(sorted({item_index.setdefault(item, len(item_index)) for item in t}))
+                encoded_set[key] = encoded_set.get(key, 0) + 1
+            item_names = list(item_index)
+            tree = self.create_fptree(encoded_set.items(), min_support)  # 创建数据集的fptree
+        return tree, item_names
 
+    def group_by_size(self, support_data):
+        """
+        将项集根据大小保存到容器L中，L[i]为项个数为 i+1 的项集
+        :param support_data: 支持度数据
+        :return: L
+        """
         max_l = 0
-        for i in freqItemSet:  # 将频繁项根据大小保存到指定的容器L中
+        for i in support_data:
             if len(i) > max_l:
                 max_l = len(i)
         L = [set() for _ in range(max_l)]
-        for i in freqItemSet:
+        for i in support_data:
             L[len(i) - 1].add(i)
         for i in range(len(L)):
             print("项个数为 {} 的频繁项集 : {}个".format(i + 1, len(L[i])))
-        return L, support_data
-
-    def save_rule(self, rule, path):
-        # 保存结果到txt文件
-        with open(path, "w") as f:
-            f.write("index  confidence" + "   rules\n")
-            index = 1
-            for item in rule:
-                s = " {:<4d}  {:.3f}        {}=>{}\n".format(index, item[2], str(list(item[0])), str(list(item[1])))
-                index += 1
-                f.write(s)
-            f.close()
+        return L
+
+    def generate_L(self, data_set, min_support, n_jobs=1):
+        """
+        生成频繁项集
+        :param data_set: 数据集，二维列表或 stream_data 得到的 EncodedTransactions
+        :param min_support: 最小支持度
+        :param n_jobs: 并行挖掘进程数，1为单进程
+        :return: 频繁项集和支持度数据
+        """
+        tree, item_names = self.build_tree(data_set, min_support)
+
+        freq_ids = set()
+        id_support_data = {}
+        if tree is not None and n_jobs > 1 and len(tree.item_ids) > 1:
+            self.mine_parallel(tree, min_support, min(n_jobs, len(tree.item_ids)), id_support_data)
+        elif tree is not None:
+            # 创建各频繁一项的fptree，并挖掘频繁项并保存支持度计数
+            self.create_cond_fptree(tree, min_support, frozenset(), freq_ids, id_support_data)
+
+        # 将项编号解码为原始项名称
+        support_data = {frozenset(item_names[i] for i in ids): count for ids, count in id_support_data.items()}
+        return self.group_by_size(support_data), support_data
+
+    def mine_closed(self, tree, min_support, temp, index):
+        """
+        FP-close方式挖掘闭频繁项集（不存在支持度相同的真超集）。
+        条件模式基中计数等于 temp∪{item} 支持度的项必然与之同时出现，直接并入得到其闭包；
+        若闭包已被支持度相同的已知闭项集包含，则其所有扩展的闭包也已找到，整棵子树剪枝
+        :param tree: FP树
+        :param min_support: 最小支持度
+        :param temp: 临时频繁项集
+        :param index: 已找到的闭项集，ItemsetIndex
+        """
+        for item in reversed(range(len(tree.item_ids))):
+            support = tree.header_count[item]
+            cond_pat_base = self.find_cond_pattern_base(item, tree)
+            item_count = {}
+            for path, count in cond_pat_base.items():
+                for i in path:
+                    item_count[i] = item_count.get(i, 0) + count
+            closure = {i for i, count in item_count.items() if count == support}
+            freq_set = temp | {tree.item_ids[item]} | closure
+            if index.has_superset(freq_set, support):
+                continue
+            index.add(freq_set, support)
+            # 闭包中的项已并入freq_set，建条件FP树时去掉
+            if len(closure) > 0:
+                reduced_base = {}
+                for path, count in cond_pat_base.items():
+                    path = tuple(i for i in path if i not in closure)
+                    reduced_base[path] = reduced_base.get(path, 0) + count
+                cond_pat_base = reduced_base
+            cond_tree = self.create_fptree(cond_pat_base.items(), min_support)
+            if cond_tree is not None:
+                self.mine_closed(cond_tree, min_support, freq_set, index)
+        tree.path_cache.clear()
+
+    def mine_maximal(self, tree, min_support, temp, index):
+        """
+        FP-max方式挖掘最大频繁项集（不存在频繁的真超集）。
+        按支持度从小到大处理各项时，后找到的项集不会是先找到的项集的超集，因此只需检查新项集是否被已知最大项集包含；
+        若 temp∪{item} 与其条件FP树中全部项的并集已被包含，整棵子树剪枝
+        :param tree: FP树
+        :param min_support: 最小支持度
+        :param temp: 临时频繁项集
+        :param index: 已找到的最大项集，ItemsetIndex
+        """
+        if all(tree.parent[node] == node - 1 for node in range(1, len(tree.item))):
+            # 单路径FP树：路径上全部项与temp的并集是该分支唯一的最大项集
+            freq_set = temp | set(tree.item_ids)
+            if not index.has_superset(freq_set):
+                index.add(freq_set, tree.count[-1])
+            return
+        for item in reversed(range(len(tree.item_ids))):
+            freq_set = temp | {tree.item_ids[item]}
+            cond_tree = self.create_fptree(self.find_cond_pattern_base(item, tree).items(), min_support)
+            tail = set(cond_tree.item_ids) if cond_tree is not None else set()
+            if index.has_superset(freq_set | tail):
+                continue
+            if cond_tree is None:
+                index.add(freq_set, tree.header_count[item])
+            else:
+                self.mine_maximal(cond_tree, min_support, freq_set, index)
+        tree.path_cache.clear()
+
+    def mine_top_k(self, tree, temp, state, support_data):
+        """
+        挖掘支持度最高的k个（项数不少于2的）频繁项集，最小支持度随已找到的第k大支持度动态提高，
+        低于当前最小支持度的项及其子树直接跳过
+        :param tree: FP树
+        :param temp: 临时频繁项集
+        :param state: TopKState
+        :param support_data: 支持度数据
+        """
+        for item in reversed(range(len(tree.item_ids))):
+            support = tree.header_count[item]
+            if support < state.min_support:
+                continue
+            freq_set = temp | {tree.item_ids[item]}
+            support_data[freq_set] = support
+            if len(freq_set) > 1:
+                state.push(support)
+            cond_tree = self.create_fptree(self.find_cond_pattern_base(item, tree).items(), state.min_support)
+            if cond_tree is not None:
+                self.mine_top_k(cond_tree, freq_set, state, support_data)
+        tree.path_cache.clear()
+
+    def generate_condensed(self, data_set, min_support, mode):
+        """
+        生成闭频繁项集或最大频繁项集，结果数量远小于全部频繁项集
+        :param data_set: 数据集，二维列表或 stream_data 得到的 EncodedTransactions
+        :param min_support: 最小支持度
+        :param mode: "closed" 或 "maximal"
+        :return: 支持度数据 {项集: 支持度计数}
+        """
+        tree, item_names = self.build_tree(data_set, min_support)
+        index = ItemsetIndex()
+        if tree is not None:
+            if mode == "closed":
+                self.mine_closed(tree, min_support, frozenset(), index)
+            else:
+                self.mine_maximal(tree, min_support, frozenset(), index)
+        support_data = {frozenset(item_names[i] for i in ids): count
+                        for ids, count in zip(index.itemsets, index.supports)}
+        self.group_by_size(support_data)
+        return support_data
+
+    def generate_top_k_L(self, data_set, min_support, k):
+        """
+        生成支持度最高的k个频繁项集（并列第k的全部保留）及其所有子集，子集的支持度不低于其超集，可直接用于生成规则
+        :param data_set: 数据集，二维列表或 stream_data 得到的 EncodedTransactions
+        :param min_support: 最小支持度下限
+        :param k: 项数不少于2的频繁项集个数
+        :return: 频繁项集和支持度数据
+        """
+        tree, item_names = self.build_tree(data_set, min_support)
+        state = TopKState(k, min_support)
+        id_support_data = {}
+        if tree is not None:
+            self.mine_top_k(tree, frozenset(), state, id_support_data)
+        print("top-{} 最终最小支持度：{}".format(k, state.min_support))
+        support_data = {frozenset(item_names[i] for i in ids): count
+                        for ids, count in id_support_data.items() if count >= state.min_support}
+        return self.group_by_size(support_data), support_data
+
+    def itemset_table(self, support_data, n_transactions):
+        """
+        将闭/最大频繁项集整理为表格，按支持度从大到小排列
+        :param support_data: 支持度数据
+        :param n_transactions: 事务总数
+        :return: DataFrame，列为 itemset, size, support_count, support
+        """
+        itemsets = sorted(support_data.items(), key=lambda x: (-x[1], -len(x[0]), sorted(x[0])))
+        return pd.DataFrame({
+            "itemset": [";".join(sorted(itemset)) for itemset, _ in itemsets],
+            "size": [len(itemset) for itemset, _ in itemsets],
+            "support_count": [count for _, count in itemsets],
+            "support": [count / n_transactions for _, count in itemsets],
+        })
+
+    def rule_table(self, rule_list, support_data, n_transactions):
+        """
+        计算各规则的评价指标，所需支持度均取自挖掘时保存的support_data，无需再次遍历数据集
+            support = P(A∪B)，confidence = P(A∪B) / P(A)，lift = confidence / P(B)，
+            leverage = P(A∪B) - P(A)P(B)，conviction = (1 - P(B)) / (1 - confidence)（置信度为1时为inf）
+        :param rule_list: 关联规则列表，元素为 (前件, 后件, 置信度)
+        :param support_data: 支持度数据
+        :param n_transactions: 事务总数
+        :return: DataFrame，前件、后件中的项以“;”连接
+        """
+        rows = []
+        for antecedent, consequent, conf in rule_list:
+            support = support_data[antecedent | consequent] / n_transactions
+            antecedent_support = support_data[antecedent] / n_transactions
+            consequent_support = support_data[consequent] / n_transactions
+            rows.append((
+                ";".join(sorted(antecedent)),
+                ";".join(sorted(consequent)),
+                support_data[antecedent | consequent],
+                support,
+                conf,
+                conf / consequent_support,
+                support - antecedent_support * consequent_support,
+                (1 - consequent_support) / (1 - conf) if conf < 1 else math.inf,
+            ))
+        return pd.DataFrame(rows, columns=["antecedents", "consequents", "support_count", "support", "confidence",
+                                           "lift", "leverage", "conviction"])
+
+    def save_table(self, table, path):
+        # 按文件后缀保存为csv或parquet（parquet需安装pyarrow）
+        if path.endswith(".parquet"):
+            table.to_parquet(path, index=False)
+        else:
+            table.to_csv(path, index=False, encoding="utf-8-sig")
         print("result saved,path is:{}".format(path))
 
-    def generate_R(self, data_set, min_support, min_conf):
+    def generate_R(self, data_set, min_support, min_conf, n_jobs=1, return_support=False):
         """
         基于频繁项集生成关联规则
         关联规则是从频繁项集中提取出的规则，通常表示为 A → B，其中：A 是规则的前件（antecedent）。B 是规则的后件（consequent）。
@@ -209,58 +525,418 @@ class Fp_growth():
         :param data_set: 数据集
         :param min_support: 最小支持度，用于生成频繁项集
         :param min_conf: 最小置信度，用于过滤规则
+        :param n_jobs: 并行挖掘进程数，1为单进程
+        :param return_support: 为True时同时返回支持度数据，用于计算规则的评价指标
         :return: 关联规则列表
         """
-        L, support_data = self.generate_L(data_set, min_support)
-        rule_list = []
-        sub_set_list = []
-        for i in range(0, len(L)):
+        L, support_data = self.generate_L(data_set, min_support, n_jobs)
+        rule_list = self.generate_rules(L, support_data, min_conf)
+        if return_support:
+            return rule_list, support_data
+        return rule_list
+
+    def generate_rules(self, L, support_data, min_conf):
+        """
+        由频繁项集生成满足最小置信度的关联规则，按置信度从大到小排列
+        :param L: 按大小分组的频繁项集
+        :param support_data: 支持度数据，需包含L中各项集的全部子集
+        :param min_conf: 最小置信度
+        :return: 关联规则列表
+        """
+        rule_set = set()  # 用集合去重
+        for i in range(1, len(L)):
             for freq_set in L[i]:
-                for sub_set in sub_set_list:
-                    # and freq_set-sub_set in support_data
-                    if sub_set.issubset(freq_set) and freq_set - sub_set in support_data:
-                        conf = support_data[freq_set] / support_data[freq_set - sub_set]
-                        big_rule = (freq_set - sub_set, sub_set, conf)
-                        if conf >= min_conf and big_rule not in rule_list:
-                            # print freq_set-sub_set, " => ", sub_set, "conf: ", conf
-                            rule_list.append(big_rule)
-                sub_set_list.append(freq_set)
-        rule_list = sorted(rule_list, key=lambda x: (x[2]), reverse=True)
+                self.generate_itemset_rules(freq_set, support_data, min_conf, rule_set)
+        rule_list = sorted(rule_set, key=lambda x: (-x[2], sorted(x[0]), sorted(x[1])))
         return rule_list
 
+    def generate_itemset_rules(self, freq_set, support_data, min_conf, rule_set):
+        """
+        按ap-genrules方式生成单个频繁项集的规则：后件从一项开始逐层增大，
+        由于后件增大时置信度单调不增，只有满足最小置信度的后件才参与合并生成下一层后件
+        :param freq_set: 频繁项集
+        :param support_data: 支持度数据
+        :param min_conf: 最小置信度
+        :param rule_set: 规则集合，元素为 (前件, 后件, 置信度)
+        """
+        support = support_data[freq_set]
+        consequents = [frozenset([item]) for item in freq_set]
+        while consequents and len(consequents[0]) < len(freq_set):
+            passed = []
+            for consequent in consequents:
+                antecedent = freq_set - consequent
+                conf = support / support_data[antecedent]
+                if conf >= min_conf:
+                    rule_set.add((antecedent, consequent, conf))
+                    passed.append(consequent)
+            consequents = self.merge_consequents(passed)
+
+    def merge_consequents(self, consequents):
+        """
+        由m项后件合并生成m+1项候选后件，候选的所有m项子集都必须在consequents中
+        :param consequents: 满足最小置信度的m项后件列表
+        :return: m+1项候选后件列表
+        """
+        passed = set(consequents)
+        candidates = set()
+        for i in range(len(consequents)):
+            for j in range(i + 1, len(consequents)):
+                union = consequents[i] | consequents[j]
+                if len(union) == len(consequents[i]) + 1 and union not in candidates \
+                        and all(union - {item} in passed for item in union):
+                    candidates.add(union)
+        return list(candidates)
+
+
+# 并行挖掘子进程中的全局FP树和最小支持度，由 _init_mining_worker 设置
+_mining_tree = None
+_mining_min_support = None
+
+
+def _in_daemon_process():
+    """是否运行在守护进程中，如Celery prefork的子进程（billiard创建，multiprocessing不一定能识别）"""
+    if multiprocessing.current_process().daemon:
+        return True
+    try:
+        import billiard
+    except ImportError:
+        return False
+    return bool(billiard.current_process().daemon)
+
+
+def _init_mining_worker(tree, min_support):
+    global _mining_tree, _mining_min_support
+    _mining_tree = tree
+    _mining_min_support = min_support
+
+
+def _mine_items(items):
+    """在子进程中挖掘一组头表项，返回该组的支持度数据"""
+    fp = Fp_growth()
+    support_data = {}
+    for item in items:
+        fp.mine_item(_mining_tree, item, _mining_min_support, frozenset(), set(), support_data)
+    return support_data
+
+
+class ItemsetIndex:
+    def __init__(self):
+        """
+        闭/最大项集的子集检查结构：每项对应一个整数位图，第j位表示第j个已保存项集包含该项，
+        多个位图按位与的结果非零即存在包含给定项集的已保存项集；按支持度另建一组位图用于闭项集检查
+        """
+        self.itemsets = []
+        self.supports = []
+        self.item_masks = {}  # {项编号: 位图}
+        self.support_masks = {}  # {支持度: {项编号: 位图}}
+
+    def add(self, itemset, support):
+        bit = 1 << len(self.itemsets)
+        self.itemsets.append(frozenset(itemset))
+        self.supports.append(support)
+        masks = self.support_masks.setdefault(support, {})
+        for item in itemset:
+            self.item_masks[item] = self.item_masks.get(item, 0) | bit
+            masks[item] = masks.get(item, 0) | bit
+
+    def has_superset(self, itemset, support=None):
+        """
+        是否存在包含itemset的已保存项集
+        :param itemset: 项集
+        :param support: 不为None时只检查支持度等于support的项集
+        """
+        masks = self.item_masks if support is None else self.support_masks.get(support, {})
+        result = -1
+        for item in itemset:
+            result &= masks.get(item, 0)
+            if result == 0:
+                return False
+        return result != 0
 
-def load_data(file_path):
-    ans = []  # 将数据保存到该数组
 
+class TopKState:
+    def __init__(self, k, min_support):
+        """
+        top-k挖掘的动态最小支持度：用小顶堆保存已找到的前k大支持度，堆满后最小支持度提高到堆顶
+        :param k: 项集个数
+        :param min_support: 最小支持度下限
+        """
+        self.k = k
+        self.min_support = min_support
+        self.heap = []
+
+    def push(self, support):
+        if len(self.heap) < self.k:
+            heapq.heappush(self.heap, support)
+        elif support > self.heap[0]:
+            heapq.heapreplace(self.heap, support)
+        if len(self.heap) == self.k and self.heap[0] > self.min_support:
+            self.min_support = self.heap[0]
+
+
+class EncodedTransactions:
+    def __init__(self, buffer_path, chunk_size=1 << 16, item_names=None, item_counts=None, n_transactions=0):
+        """
+        磁盘上的紧凑事务缓冲区：每条事务依次写入长度和升序项编号（uint32），
+        写入时将项名称编码为整数并统计各项出现次数，读取时按块遍历，内存占用与数据量无关
+        :param buffer_path: 缓冲区文件路径
+        :param chunk_size: 读写缓冲的整数个数
+        :param item_names: 已写好的缓冲区的项名称，提供时直接打开该缓冲区只读遍历（见 FpCache）
+        :param item_counts: 已写好的缓冲区的各项出现次数
+        :param n_transactions: 已写好的缓冲区的事务数
+        """
+        self.buffer_path = buffer_path
+        self.chunk_size = chunk_size
+        self.item_names = item_names if item_names is not None else []  # 项编号 -> 项名称
+        self.item_index = {item: i for i, item in enumerate(self.item_names)}  # 项名称 -> 项编号
+        self.item_counts = item_counts if item_counts is not None else []  # 项编号 -> 出现次数
+        self.n_transactions = n_transactions
+        self._pending = array('I')
+        self._file = open(buffer_path, "wb") if item_names is None else None
+
+    def add(self, items):
+        ids = set()
+        for item in items:
+            item_id = self.item_index.get(item)
+            if item_id is None:
+                item_id = self.item_index[item] = len(self.item_names)
+                self.item_names.append(item)
+                self.item_counts.append(0)
+            ids.add(item_id)
+        if len(ids) == 0:
+            return
+        for item_id in ids:
+            self.item_counts[item_id] += 1
+        self._pending.append(len(ids))
+        self._pending.extend(sorted(ids))
+        self.n_transactions += 1
+        if len(self._pending) >= self.chunk_size:
+            self._pending.tofile(self._file)
+            self._pending = array('I')
+
+    def close(self):
+        """写入剩余数据并关闭缓冲区文件，之后才能遍历"""
+        if self._file is not None:
+            self._pending.tofile(self._file)
+            self._pending = array('I')
+            self._file.close()
+            self._file = None
+
+    def remove(self):
+        self.close()
+        if os.path.exists(self.buffer_path):
+            os.remove(self.buffer_path)
+
+    def __iter__(self):
+        with open(self.buffer_path, "rb") as f:
+            buf = array('I')
+            while True:
+                block = array('I')
+                try:
+                    block.fromfile(f, self.chunk_size)
+                except EOFError:  # 文件末尾不足一块时仍会读入剩余数据
+                    pass
+                if len(block) == 0:
+                    break
+                buf.extend(block)
+                pos = 0
+                while pos < len(buf) and pos + buf[pos] < len(buf):
+                    yield tuple(buf[pos + 1:pos + 1 + buf[pos]])
+                    pos += 1 + buf[pos]
+                buf = buf[pos:]
+
+
+class FpCache:
+    def __init__(self, cache_dir, max_entries=8):
+        """
+        按数据文件内容哈希缓存编码后的事务和目前所请求的最低最小支持度下建好的全局FP树，
+        同一文件以不同最小支持度、置信度重复计算时无需重新读取文件和建树。每个文件一个子目录：
+            transactions.enc  事务缓冲区（EncodedTransactions）
+            meta.pkl          项名称、各项出现次数、事务数
+            tree.pkl          FP树数组（FPTree.to_arrays）及建树时的最小支持度
+        meta.pkl 的修改时间作为最近使用时间，条目数超过max_entries时淘汰最久未使用的条目
+        :param cache_dir: 缓存目录
+        :param max_entries: 最多缓存的文件数
+        """
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+
+    def file_hash(self, file_path):
+        sha = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            while block := f.read(1024 * 1024):
+                sha.update(block)
+        return sha.hexdigest()
+
+    def _dump(self, obj, path):
+        # 先写临时文件再替换，避免多个worker同时写入同一缓存文件
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    def transactions(self, file_path):
+        """
+        获取数据文件编码后的事务，未缓存时流式读取文件并写入缓存
+        :param file_path: 数据文件路径
+        :return: EncodedTransactions，缓冲区文件属于缓存，使用后不要删除
+        """
+        entry_dir = os.path.join(self.cache_dir, self.file_hash(file_path))
+        buffer_path = os.path.join(entry_dir, "transactions.enc")
+        meta_path = os.path.join(entry_dir, "meta.pkl")
+        if os.path.exists(meta_path) and os.path.exists(buffer_path):
+            with open(meta_path, "rb") as f:
+                meta = pickle.load(f)
+            os.utime(meta_path)  # 更新最近使用时间
+            print("命中事务缓存：{}".format(entry_dir))
+            return EncodedTransactions(buffer_path, item_names=meta["item_names"], item_counts=meta["item_counts"],
+                                       n_transactions=meta["n_transactions"])
+
+        os.makedirs(entry_dir, exist_ok=True)
+        tmp_path = f"{buffer_path}.{os.getpid()}.tmp"
+        data_set = stream_data(file_path, tmp_path)
+        os.replace(tmp_path, buffer_path)
+        data_set.buffer_path = buffer_path
+        self._dump({"item_names": data_set.item_names, "item_counts": data_set.item_counts,
+                    "n_transactions": data_set.n_transactions}, meta_path)
+        self.evict(keep=entry_dir)
+        return data_set
+
+    def load_tree(self, data_set, min_support):
+        """
+        读取缓存的FP树，缓存的建树最小支持度不高于min_support时截取支持度不低于min_support的项返回
+        :param data_set: transactions 返回的 EncodedTransactions
+        :param min_support: 最小支持度
+        :return: FP树，无可用缓存时为None
+        """
+        tree_path = os.path.join(os.path.dirname(data_set.buffer_path), "tree.pkl")
+        if not os.path.exists(tree_path):
+            return None
+        with open(tree_path, "rb") as f:
+            cached = pickle.load(f)
+        if cached["min_support"] > min_support:
+            return None
+        # 头表按支持度从大到小排列，满足最小支持度的项为前n_items项
+        n_items = sum(1 for count in cached["arrays"]["header_count"] if count >= min_support)
+        print("复用最小支持度为 {} 的缓存FP树".format(cached["min_support"]))
+        return FPTree.from_arrays(cached["arrays"], n_items)
+
+    def save_tree(self, data_set, min_support, tree):
+        """缓存在更低最小支持度下新建的FP树"""
+        tree_path = os.path.join(os.path.dirname(data_set.buffer_path), "tree.pkl")
+        self._dump({"min_support": min_support, "arrays": tree.to_arrays()}, tree_path)
+
+    def evict(self, keep=None):
+        """按最近使用时间淘汰超出max_entries的条目"""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            meta_path = os.path.join(self.cache_dir, name, "meta.pkl")
+            if os.path.exists(meta_path):
+                entries.append((os.path.getmtime(meta_path), os.path.join(self.cache_dir, name)))
+        entries.sort(reverse=True)
+        for _, entry_dir in entries[self.max_entries:]:
+            if entry_dir != keep:
+                shutil.rmtree(entry_dir, ignore_errors=True)
+
+
+def _parse_prescription(cell):
+    """解析处方药品清单单元格，如“药品A:10g;药品B:5g;”，返回去掉用量的药品列表"""
+    if not isinstance(cell, str):
+        return []
+    temp = cell.split(";")[:-1]  # 以“;”分割为数组
+    return [j.split(":")[0] for j in temp]  # 将药品后跟着的药品用量去掉
+
+
+def iter_transactions(file_path):
+    """
+    逐行读取事务文件，不将整个文件读入内存
+    xls/xlsx：忽视header，从第二行开始读数据，第一列为处方ID，第二列为药品清单；csv：每行为一条事务
+    """
     if file_path.endswith(".xls"):
-        workbook = open_workbook(file_path)
+        workbook = open_workbook(file_path, on_demand=True)
         sheet = workbook.sheet_by_index(0)
-        for i in range(1, sheet.nrows):  # 忽视header,从第二行开始读数据,第一列为处方ID,第二列为药品清单
-            temp = sheet.row_values(i)[1].split(";")[:-1]  # 取该行数据的第二列并以“;”分割为数组
-            if len(temp) == 0:
-                continue
-            temp = [j.split(":")[0] for j in temp]  # 将药品后跟着的药品用量去掉
-            temp.sort()
-            ans.append(temp)  # 将处理好的数据添加到数组
+        for i in range(1, sheet.nrows):
+            yield _parse_prescription(sheet.cell_value(i, 1))
+        workbook.release_resources()
+
+    elif file_path.endswith(".xlsx"):
+        # xlrd 2.x 不再支持xlsx，使用openpyxl只读模式逐行读取
+        workbook = load_workbook(file_path, read_only=True)
+        try:
+            for row in workbook.worksheets[0].iter_rows(min_row=2, max_col=2, values_only=True):
+                yield _parse_prescription(row[1] if len(row) > 1 else None)
+        finally:
+            workbook.close()
 
     elif file_path.endswith(".csv"):
         with open(file_path, 'r', encoding='utf-8') as csv_file:
-            csv_reader = csv.reader(csv_file)
-            for row in csv_reader:
-                row.sort()
-                ans.append(row)  # 将添加好的数据添加到数组
+            for row in csv.reader(csv_file):
+                yield [item for item in row if item]
 
-    return ans  # 返回处理好的数据集，为二维数组
 
+def stream_data(file_path, buffer_path=None):
+    """
+    流式读取事务文件：第一遍读取时编码各项、统计项频数并写入磁盘缓冲区，建树时再遍历缓冲区
+    :param file_path: 数据文件路径
+    :param buffer_path: 缓冲区文件路径，默认为数据文件路径加 .enc 后缀
+    :return: EncodedTransactions
+    """
+    transactions = EncodedTransactions(buffer_path or f"{file_path}.enc")
+    try:
+        for items in iter_transactions(file_path):
+            transactions.add(items)
+    finally:
+        transactions.close()
+    return transactions
+
+
+def load_data(file_path):
+    """
+    将整个事务文件读入内存，与 iter_transactions 的解析规则相同（忽略空单元格和空事务），每条事务排序
+    :return: 二维列表
+    """
+    return [sorted(items) for items in iter_transactions(file_path) if items]
+
+
+def resolve_min_support(min_support, n_transactions):
+    """
+    最小支持度小于1时视为占事务总数的比例，换算为支持度计数；不小于1时为支持度计数。
+    均向上取整，如1.5取2，阈值不会因截断而放宽
+    :param min_support: 最小支持度
+    :param n_transactions: 事务总数
+    :return: 最小支持度计数
+    """
+    if min_support < 1:
+        return max(1, math.ceil(min_support * n_transactions))
+    return math.ceil(min_support)
 
-def calculation(data_path, current_dir, min_support: int, min_conf: float, task_id: str):
-    data_set = load_data(data_path)
-    fp = Fp_growth()
-    rule_list = fp.generate_R(data_set, min_support, min_conf)
-    file_name = f"fp-growth/{task_id}.txt"
 
+def calculation(data_path, current_dir, min_support: float, min_conf: float, task_id: str, n_jobs: int = 1,
+                mode: str = "all", top_k: int = 100, output_format: str = "csv"):
+    """
+    :param min_support: 最小支持度，小于1时为占事务总数的比例
+    :param mode: all 为全部频繁项集生成规则；closed/maximal 输出闭/最大频繁项集；top_k 为支持度最高的top_k个项集生成规则
+    :param output_format: 结果文件格式，csv 或 parquet
+    """
+    cache = FpCache(f"{current_dir}/cache_files/fp-growth")
+    data_set = cache.transactions(data_path)
+    fp = Fp_growth(cache)
+    n_transactions = data_set.n_transactions
+    min_support = resolve_min_support(min_support, n_transactions)
+    print("事务总数：{}，最小支持度计数：{}".format(n_transactions, min_support))
+    file_name = f"fp-growth/{task_id}.{output_format}"
     save_path = f"{current_dir}/data_files/{file_name}"
     os.makedirs(os.path.dirname(save_path), exist_ok=True)
-    fp.save_rule(rule_list, save_path)
+    if mode in ("closed", "maximal"):
+        support_data = fp.generate_condensed(data_set, min_support, mode)
+        fp.save_table(fp.itemset_table(support_data, n_transactions), save_path)
+        return file_name
+    if mode == "top_k":
+        L, support_data = fp.generate_top_k_L(data_set, min_support, top_k)
+        rule_list = fp.generate_rules(L, support_data, min_conf)
+    else:
+        rule_list, support_data = fp.generate_R(data_set, min_support, min_conf, n_jobs or os.cpu_count(),
+                                                return_support=True)
+    fp.save_table(fp.rule_table(rule_list, support_data, n_transactions), save_path)
 
     return file_name
@@ -6,7 +6,8 @@ from celery.signals import task_postrun
 
 from API_APP.Fp_growth import fp_growth
 from API_APP.celery_app import celery_app
-from API_APP.data_manager import get_frontend_data, save_frontend_data
+from API_APP.data_manager import get_frontend_data, save_frontend_data, publish_island_elites, \
+    fetch_island_elites
 from API_APP.design_space import includeN, withM, withoutM, includeN_noR, withM_noR, withoutM_noR
 from API_APP.multi_optimization import multi_opt_cal
 
@@ -37,9 +38,11 @@ def update_task_status(task_id=None, state=None, **kwargs):
 
 
 @celery_app.task(bind=True)
-def cal_fg_task(self, data_path, current_dir, min_support, min_conf):
+def cal_fg_task(self, data_path, current_dir, min_support, min_conf, n_jobs=1, mode="all", top_k=100,
+                output_format="csv"):
     try:
-        file_name = fp_growth.calculation(data_path, current_dir, min_support, min_conf, self.request.id)
+        file_name = fp_growth.calculation(data_path, current_dir, min_support, min_conf, self.request.id, n_jobs,
+                                          mode, top_k, output_format)
         os.remove(data_path)
         return file_name
     except Exception as e:
@@ -117,3 +120,39 @@ def cal_multi_opt_task(self, request, current_dir):
             }
         )
         raise e
+
+
+@celery_app.task(bind=True)
+def cal_multi_opt_island_task(self, request, current_dir, run_id, island_id):
+    def migrate(elites):
+        # 环形拓扑：发布本岛精英个体，迁入上一个岛的精英个体
+        publish_island_elites(run_id, island_id, elites.tolist())
+        return fetch_island_elites(run_id, (island_id - 1) % request['islands'])
+
+    try:
+        return multi_opt_cal.island_calculation(request, current_dir, island_id, migrate)
+    except Exception as e:
+        self.update_state(
+            state=states.FAILURE,
+            meta={
+                "exc_type": type(e).__name__,
+                "exc_message": str(e)
+            }
+        )
+        raise e
+
+
+@celery_app.task(bind=True)
+def merge_multi_opt_task(self, island_results, request, current_dir):
+    try:
+        file_name = multi_opt_cal.merge_islands(request, current_dir, island_results, self.request.id)
+        return file_name
+    except Exception as e:
+        self.update_state(
+            state=states.FAILURE,
+            meta={
+                "exc_type": type(e).__name__,
+                "exc_message": str(e)
+            }
+        )
+        raise e
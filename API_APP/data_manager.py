@@ -6,9 +6,9 @@ import redis
 from fastapi import HTTPException
 from pydantic import BaseModel
 from pydantic import Field
-from sqlalchemy import text
+from sqlalchemy import bindparam, text
 
-from mysql import AsyncDBSession
+from mysql import AsyncDBSession, decode_spectrum, wavelength_keys
 
 # 连接Redis
 r = redis.Redis(host='127.0.0.1', port=6379, db=0, decode_responses=True)  # 自动解码为字符串
@@ -72,6 +72,16 @@ def save_frontend_data(data: FrontendData):
     r.set("frontend_data", data.model_dump_json())
 
 
+def publish_island_elites(run_id: str, island_id: int, elites: list):
+    # 岛屿模型中各岛最新精英个体，一天后自动过期
+    r.set(f"multi_opt_island:{run_id}:{island_id}", json.dumps(elites), ex=24 * 60 * 60)
+
+
+def fetch_island_elites(run_id: str, island_id: int):
+    data = r.get(f"multi_opt_island:{run_id}:{island_id}")
+    return json.loads(data) if data else None
+
+
 def add_task_to_frontend(task_id: str, task_name: str, description: str):
     data = get_frontend_data()
     current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -88,6 +98,29 @@ def add_task_to_frontend(task_id: str, task_name: str, description: str):
     print(f"{current_time}  新增后台任务   任务id：{task_id}  目前任务数：{len(data.tasks)}")
 
 
+# 已读取的光谱波长轴 {SpectrumAxes.ID: 波长字符串列表}
+_spectrum_axes = {}
+
+
+async def _load_spectrum_axes(session, axis_ids):
+    """读取尚未缓存的波长轴"""
+    missing = [axis_id for axis_id in set(axis_ids) if axis_id is not None and axis_id not in _spectrum_axes]
+    if missing:
+        sql = text("SELECT ID, wavelengths FROM SpectrumAxes WHERE ID IN :ids").bindparams(
+            bindparam("ids", expanding=True))
+        result = await session.execute(sql, {"ids": missing})
+        for row in result.mappings().all():
+            _spectrum_axes[row["ID"]] = wavelength_keys(row["wavelengths"])
+
+
+def _spectrum_dict(row):
+    """将光谱行解码为 {波长: 吸光度}，波长键为字符串，与旧格式的JSON文本一致"""
+    if row["spectrum"] is not None:
+        absorbance = decode_spectrum(row["spectrum"], row["encoding"])
+        return dict(zip(_spectrum_axes[row["axis_id"]], absorbance.tolist()))
+    return json.loads(row["data"]) if isinstance(row["data"], str) else row["data"]
+
+
 async def fetch_data(table_name, experiment_id=0, limit=100, last_timestamp=None):
     async with AsyncDBSession() as session:
         # 先检查实验是否存在，实验ID为0时跳过检查
@@ -99,9 +132,11 @@ async def fetch_data(table_name, experiment_id=0, limit=100, last_timestamp=None
                 raise HTTPException(status_code=404, detail="实验不存在")
 
         effective_limit = limit if experiment_id == 0 else None
+        is_spectrum = table_name in ("UVs", "NIRs")
+        columns = "time, data, spectrum, encoding, axis_id" if is_spectrum else "time, data"
 
         if last_timestamp:
-            base_sql = f"SELECT time, data FROM {table_name} WHERE experiment_id = :experiment_id AND time > :last_timestamp ORDER BY time DESC"
+            base_sql = f"SELECT {columns} FROM {table_name} WHERE experiment_id = :experiment_id AND time > :last_timestamp ORDER BY time DESC"
             params = {"experiment_id": experiment_id, "last_timestamp": last_timestamp}
             if effective_limit is not None:
                 sql = base_sql + " LIMIT :limit"
@@ -109,7 +144,7 @@ async def fetch_data(table_name, experiment_id=0, limit=100, last_timestamp=None
             else:
                 sql = base_sql
         else:
-            base_sql = f"SELECT time, data FROM {table_name} WHERE experiment_id = :experiment_id ORDER BY time DESC"
+            base_sql = f"SELECT {columns} FROM {table_name} WHERE experiment_id = :experiment_id ORDER BY time DESC"
             params = {"experiment_id": experiment_id}
             if effective_limit is not None:
                 sql = base_sql + " LIMIT :limit"
@@ -119,6 +154,9 @@ async def fetch_data(table_name, experiment_id=0, limit=100, last_timestamp=None
 
         result = await session.execute(text(sql), params)
         results = result.mappings().all()
+        if is_spectrum:
+            await _load_spectrum_axes(session, [row["axis_id"] for row in results])
+            return [{"time": row["time"].isoformat(sep=' '), "data": _spectrum_dict(row)} for row in results[::-1]]
         return [
             {
                 "time": row["time"].isoformat(sep=' '),
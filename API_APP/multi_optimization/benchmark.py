@@ -0,0 +1,176 @@
+"""
+多目标优化性能基准
+
+以银杏叶提取物纯化工艺（6个工艺变量，内酯/黄酮醇苷纯度和产率4个目标）为例，按算法、种群规模和目标函数
+计算方式（row / vectorized / parallel）统计 calculation 的耗时、每秒评价次数、超体积和峰值内存，
+每个组合输出一行JSON，用于确定种群规模并发现 CustomMOOProblem._evaluate 的性能退化。
+
+运行（仓库根目录）：
+    python -m API_APP.multi_optimization.benchmark --populations 200 500 2000 --output bench.jsonl
+"""
+import argparse
+import copy
+import json
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+from pymoo.indicators.hv import HV
+from scipy.stats import qmc
+
+from API_APP.multi_optimization.multi_opt_cal import build_algorithm, build_problem, optimize, save_solutions
+
+GINKGO_REQUEST = {
+    "variables": {
+        "sample_time": {"lower": 1.00, "upper": 2.00},
+        "sample_flow": {"lower": 0.5, "upper": 1.5},
+        "washing_time": {"lower": 0.50, "upper": 1.50},
+        "washing_flow": {"lower": 1.5, "upper": 2.5},
+        "elution_time": {"lower": 0.50, "upper": 1.50},
+        "elution_flow": {"lower": 2.5, "upper": 3.5}
+    },
+    "objective_functions": {
+        "lactone_purity": "def lactone_purity(sample_time, sample_flow, washing_time, washing_flow, elution_time, "
+                          "elution_flow):\n"
+                          "    return 3.1167 - 10.7425 * 0.5835 + 0.7026 * sample_flow + 3.9301 * washing_time "
+                          "+ 1.8364 * washing_flow",
+        "flavonol_glycoside_purity": "def flavonol_glycoside_purity(sample_time, sample_flow, washing_time, "
+                                     "washing_flow, elution_time, elution_flow):\n"
+                                     "    return 0.4002 - 50.0259 * 0.5835 + 18.7848 * washing_time "
+                                     "+ 9.5709 * washing_flow + 3.8743 * elution_time + 2.9674 * elution_flow",
+        "lactone_productivity": "def lactone_productivity(sample_time, sample_flow, washing_time, washing_flow, "
+                                "elution_time, elution_flow):\n"
+                                "    return 32.8842 + 17.5758 * (sample_flow * elution_flow) - 2.3691 * sample_time "
+                                "- 23.4526 * sample_flow - 8.2481 * elution_flow - 5.7581 * washing_time "
+                                "- 9.4687 * (sample_flow * washing_time) + 20.6692 * (sample_time * sample_flow)",
+        "flavonol_glycoside_productivity": "def flavonol_glycoside_productivity(sample_time, sample_flow, "
+                                           "washing_time, washing_flow, elution_time, elution_flow):\n"
+                                           "    return 47.4225 + 49.6461 * (sample_flow * elution_flow) "
+                                           "+ 13.6240 * sample_time - 18.6213 * sample_flow "
+                                           "- 10.5198 * elution_flow - 22.3586 * washing_time "
+                                           "- 26.3807 * (sample_flow * washing_time) "
+                                           "+ 58.9702 * (sample_time * sample_flow)"
+    },
+    "objective_ranges": {
+        "lactone_purity": {"min_value": 6, "max_value": None, "direction": "max"},
+        "flavonol_glycoside_purity": {"min_value": 24, "max_value": None, "direction": "max"},
+        "lactone_productivity": {"min_value": None, "max_value": None, "direction": "max"},
+        "flavonol_glycoside_productivity": {"min_value": None, "max_value": None, "direction": "max"}
+    },
+    "algorithm": "nsga3",
+    "population_size": 2000,
+    "generations": 100
+}
+
+
+def objective_bounds(request: dict, n_samples: int = 4096):
+    """
+    用Sobol序列采样变量空间，取各目标F的最小、最大值作为超体积归一化的理想点和最差点，
+    使不同算法、种群规模的超体积可直接比较
+    """
+    problem, _ = build_problem({**request, "eval_mode": "row"})
+    sampler = qmc.Sobol(d=problem.n_var, seed=0)
+    X = qmc.scale(sampler.random(n_samples), problem.xl, problem.xu)
+    F = problem.evaluate(X, return_values_of=["F"])
+    return F.min(axis=0), F.max(axis=0)
+
+
+def hypervolume(F, ideal, nadir):
+    """归一化目标空间中相对参考点 (1.1, ..., 1.1) 的超体积"""
+    if F is None:
+        return 0.0
+    scale = np.where(nadir - ideal > 1e-12, nadir - ideal, 1.0)
+    return float(HV(ref_point=np.full(len(ideal), 1.1)).do((np.atleast_2d(F) - ideal) / scale))
+
+
+def timed_calculation(request: dict, work_dir: str):
+    """与 calculation 相同的计算流程，额外返回耗时和优化结果"""
+    start = time.perf_counter()
+    problem, objective_names, res = optimize(request, work_dir)
+    try:
+        if res.F is not None:
+            save_solutions(request, problem, objective_names, np.atleast_2d(res.X)[:5], work_dir, "benchmark")
+    finally:
+        problem.close()
+    return time.perf_counter() - start, res
+
+
+def evaluate_throughput(request: dict, n_rows: int, repeat: int = 5):
+    """单独统计 problem.evaluate 每秒可计算的个体数，首次调用用于预热（进程池启动、数组输入检测）"""
+    problem, _ = build_problem(request)
+    X = np.random.default_rng(0).uniform(problem.xl, problem.xu, size=(n_rows, problem.n_var))
+    try:
+        problem.evaluate(X)
+        start = time.perf_counter()
+        for _ in range(repeat):
+            problem.evaluate(X)
+        return n_rows * repeat / (time.perf_counter() - start)
+    finally:
+        problem.close()
+
+
+def run_case(request: dict, work_dir: str, ideal, nadir, repeat: int = 1):
+    # 预先生成并缓存NSGA3参考方向，避免计入计时
+    problem, _ = build_problem(request)
+    try:
+        build_algorithm(request, problem, request['population_size'], work_dir)
+    finally:
+        problem.close()
+
+    seconds, res = min((timed_calculation(request, work_dir) for _ in range(repeat)), key=lambda r: r[0])
+    n_eval = res.algorithm.evaluator.n_eval
+
+    # tracemalloc会拖慢计算，峰值内存单独运行一次统计（parallel模式不含子进程内存）
+    tracemalloc.start()
+    timed_calculation(request, work_dir)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "algorithm": request['algorithm'],
+        "population_size": request['population_size'],
+        "generations": request['generations'],
+        "eval_mode": request['eval_mode'],
+        "seconds": round(seconds, 4),
+        "n_eval": int(n_eval),
+        "evals_per_sec": round(n_eval / seconds, 1),
+        "evaluate_rows_per_sec": round(evaluate_throughput(request, request['population_size']), 1),
+        "hypervolume": hypervolume(res.F, ideal, nadir),
+        "n_front": 0 if res.F is None else len(np.atleast_2d(res.F)),
+        "peak_memory_mb": round(peak / 1024 / 1024, 2),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="多目标优化性能基准")
+    parser.add_argument("--algorithms", nargs="+", default=["nsga2", "nsga3"])
+    parser.add_argument("--populations", nargs="+", type=int, default=[100, 500, 2000])
+    parser.add_argument("--modes", nargs="+", default=["row", "vectorized", "parallel"])
+    parser.add_argument("--generations", type=int, default=GINKGO_REQUEST["generations"])
+    parser.add_argument("--repeat", type=int, default=1, help="每个组合重复计时次数，取最短耗时")
+    parser.add_argument("--output", default=None, help="JSON Lines输出文件，默认输出到标准输出")
+    parser.add_argument("--work-dir", default=None, help="结果文件和参考方向缓存目录，默认使用临时目录")
+    args = parser.parse_args(argv)
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="multi-opt-benchmark-")
+    ideal, nadir = objective_bounds(GINKGO_REQUEST)
+    out = open(args.output, "w") if args.output else sys.stdout
+    try:
+        for algorithm in args.algorithms:
+            for population_size in args.populations:
+                for eval_mode in args.modes:
+                    request = copy.deepcopy(GINKGO_REQUEST)
+                    request.update(algorithm=algorithm, population_size=population_size,
+                                   generations=args.generations, eval_mode=eval_mode)
+                    record = run_case(request, work_dir, ideal, nadir, args.repeat)
+                    out.write(json.dumps(record) + "\n")
+                    out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
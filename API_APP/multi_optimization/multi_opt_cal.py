@@ -1,14 +1,21 @@
 import ast
+import json
+import math
 import os
+import time
 import types
-from typing import List
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, List, Optional
 
 import numpy as np
 from pymoo.algorithms.moo.nsga2 import NSGA2
 from pymoo.algorithms.moo.nsga3 import NSGA3
+from pymoo.core.population import Population
 from pymoo.core.problem import Problem
 from pymoo.optimize import minimize
+from pymoo.util.nds.non_dominated_sorting import NonDominatedSorting
 from pymoo.util.ref_dirs import get_reference_directions
+from scipy.stats import qmc
 
 
 def safe_eval_function(function_code: str, function_name: str, expected_params: List[str]):
@@ -60,80 +67,325 @@ def safe_eval_function(function_code: str, function_name: str, expected_params:
         raise ValueError(f"函数解析错误: {str(e)}")
 
 
+def _das_dennis_count(n_obj: int, n_partitions: int) -> int:
+    """das-dennis 方法在给定划分数下生成的参考方向数量"""
+    return math.comb(n_obj + n_partitions - 1, n_obj - 1)
+
+
+def _multi_layer_ref_dirs(n_obj: int, n_points: int) -> np.ndarray:
+    """
+    生成两层das-dennis参考方向（外层scaling=1.0，内层scaling=0.5），
+    每层划分数取方向数不超过n_points/2的最大值
+    """
+    n_partitions = 1
+    while _das_dennis_count(n_obj, n_partitions + 1) <= max(n_points // 2, n_obj):
+        n_partitions += 1
+    return get_reference_directions(
+        "multi-layer",
+        get_reference_directions("das-dennis", n_obj, n_partitions=n_partitions, scaling=1.0),
+        get_reference_directions("das-dennis", n_obj, n_partitions=n_partitions, scaling=0.5)
+    )
+
+
+def get_ref_dirs(n_obj: int, n_points: int, method: str, cache_dir: str) -> np.ndarray:
+    """
+    根据目标数和种群规模生成NSGA3参考方向，并按 (method, n_obj, n_points) 缓存到磁盘
+    :param n_obj: 优化目标数
+    :param n_points: 期望的参考方向数量，一般取种群规模
+    :param method: auto / energy（Riesz s-energy） / multi-layer / das-dennis（n_partitions=12）
+    :param cache_dir: 缓存目录
+    :return: 参考方向数组，shape为 (参考方向数, n_obj)
+    """
+    if n_obj == 1:
+        return np.array([[1.0]])
+    if method == "auto":
+        # Riesz s-energy 在点数较多时生成耗时过长，改用多层das-dennis
+        method = "energy" if n_points <= 1000 else "multi-layer"
+
+    cache_path = os.path.join(cache_dir, f"{method}_{n_obj}_{n_points}.npy")
+    if os.path.exists(cache_path):
+        return np.load(cache_path)
+
+    if method == "energy":
+        ref_dirs = get_reference_directions("energy", n_obj, n_points, seed=1)
+    elif method == "multi-layer":
+        ref_dirs = _multi_layer_ref_dirs(n_obj, n_points)
+    elif method == "das-dennis":
+        ref_dirs = get_reference_directions("das-dennis", n_obj, n_partitions=12)
+    else:
+        raise ValueError(f"不支持的参考方向生成方法: {method}")
+
+    # 先写临时文件再替换，避免多个worker同时写入同一缓存文件
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, ref_dirs)
+    os.replace(tmp_path, cache_path)
+    return ref_dirs
+
+
+class RegressionSurrogate:
+    """
+    逐步回归模型代理，模型项采用 sr_router.Create_terms 的命名方式：
+    Constant（或const）为常数项，A 为一次项，A*B 为交叉项，A^2 为二次项。
+    所有目标的模型项合并为同一个项矩阵，一次矩阵乘法即可计算全部目标值
+    """
+
+    def __init__(self, variable_names: List[str], models: List[dict]):
+        """
+        :param variable_names: 优化变量名列表
+        :param models: 各目标的回归系数，{模型项: 系数}
+        """
+        self.variable_names = variable_names
+        self.terms = []
+        for model in models:
+            for term in model:
+                if term not in self.terms:
+                    self.terms.append(term)
+        # 各模型项中各变量的指数，shape为 (项数, 变量数)
+        self.powers = np.array([self._parse_term(term) for term in self.terms], dtype=np.int64)
+        # 系数矩阵，shape为 (项数, 目标数)
+        self.coefficients = np.array([[model.get(term, 0.0) for model in models] for term in self.terms],
+                                     dtype=np.float64)
+
+    def _parse_term(self, term: str) -> List[int]:
+        power = [0] * len(self.variable_names)
+        if term in ('Constant', 'const'):
+            return power
+        if term.endswith('^2') and term[:-2] in self.variable_names:
+            power[self.variable_names.index(term[:-2])] = 2
+            return power
+        factors = term.split('*')
+        if not all(factor in self.variable_names for factor in factors):
+            raise ValueError(f"模型项 {term} 引用了未定义的优化变量")
+        for factor in factors:
+            power[self.variable_names.index(factor)] += 1
+        return power
+
+    def design_matrix(self, X: np.ndarray) -> np.ndarray:
+        """计算项矩阵，shape为 (样本数, 项数)"""
+        return np.prod(X[:, None, :] ** self.powers[None, :, :], axis=2)
+
+    def evaluate(self, X: np.ndarray) -> np.ndarray:
+        """计算全部目标值，shape为 (样本数, 目标数)"""
+        return self.design_matrix(X) @ self.coefficients
+
+    def gradient(self, X: np.ndarray) -> np.ndarray:
+        """计算全部目标对各变量的解析梯度，shape为 (样本数, 目标数, 变量数)"""
+        grad = np.empty((X.shape[0], self.coefficients.shape[1], X.shape[1]))
+        for j in range(X.shape[1]):
+            powers = self.powers.copy()
+            powers[:, j] = np.maximum(powers[:, j] - 1, 0)
+            d_terms = self.powers[:, j] * np.prod(X[:, None, :] ** powers[None, :, :], axis=2)
+            grad[:, :, j] = d_terms @ self.coefficients
+        return grad
+
+
+def _row_values(objective_functions: List[callable], variable_names: List[str], X: np.ndarray) -> np.ndarray:
+    """逐行调用目标函数计算目标值"""
+    values = np.zeros((X.shape[0], len(objective_functions)))
+    for i, x in enumerate(X):
+        params = {name: x[j] for j, name in enumerate(variable_names)}
+        for j, func in enumerate(objective_functions):
+            values[i, j] = func(**params)
+    return values
+
+
+# 并行计算子进程中的目标函数，由 _init_worker 根据函数源码重建（exec生成的函数无法pickle）
+_worker_functions = []
+_worker_variable_names = []
+
+
+def _init_worker(function_sources: dict, variable_names: List[str]):
+    global _worker_functions, _worker_variable_names
+    _worker_functions = [safe_eval_function(code, name, expected_params=variable_names)
+                         for name, code in function_sources.items()]
+    _worker_variable_names = variable_names
+
+
+def _worker_row_values(X: np.ndarray) -> np.ndarray:
+    return _row_values(_worker_functions, _worker_variable_names, X)
+
+
 class CustomMOOProblem(Problem):
     def __init__(
             self,
             variable_names: List[str],
             variable_bounds: np.ndarray,
             objective_functions: List[callable],
-            objective_ranges: List[dict]
+            objective_ranges: List[dict],
+            surrogate: RegressionSurrogate = None,
+            eval_mode: str = "row",
+            function_sources: dict = None,
+            n_workers: int = None
     ):
-        n_constr = sum(1 for obj_range in objective_ranges
-                       if obj_range.get('min_value') is not None or obj_range.get('max_value') is not None)
+        """
+        :param eval_mode: 目标函数计算方式，row 逐行调用；vectorized 以整列数组调用，
+            函数不支持数组输入时自动退回逐行；parallel 在进程池中分块逐行计算（需提供function_sources）
+        :param function_sources: 目标函数源码，{函数名: 源码}，parallel模式下用于在子进程中重建函数
+        :param n_workers: parallel模式的进程数，默认为CPU核数
+        """
         self.variable_names = variable_names
         self.objective_functions = objective_functions
         self.objective_ranges = objective_ranges
-        self.n_actual_obj = sum(1 for obj in objective_ranges if obj.get('direction') is not None)
+        self.surrogate = surrogate
+        self.eval_mode = eval_mode
+        self.function_sources = function_sources
+        self.n_workers = n_workers or os.cpu_count()
+        self._row_only = set()  # vectorized模式下不支持数组输入的函数序号
+        self._executor = None
+
+        # 约束 G = (value - bound) * sign <= 0，最小值约束sign为-1，最大值约束sign为1
+        self.constr_index, self.constr_bound, self.constr_sign = [], [], []
+        # 目标 F = value * sign，最大化目标sign为-1
+        self.obj_index, self.obj_sign = [], []
+        for j, obj_range in enumerate(objective_ranges):
+            if obj_range.get('min_value') is not None:
+                self.constr_index.append(j)
+                self.constr_bound.append(obj_range.get('min_value'))
+                self.constr_sign.append(-1.0)
+            if obj_range.get('max_value') is not None:
+                self.constr_index.append(j)
+                self.constr_bound.append(obj_range.get('max_value'))
+                self.constr_sign.append(1.0)
+            if obj_range.get('direction') is not None:
+                self.obj_index.append(j)
+                self.obj_sign.append(-1.0 if obj_range.get('direction') == "max" else 1.0)
+        self.constr_bound = np.array(self.constr_bound, dtype=np.float64)
+        self.constr_sign = np.array(self.constr_sign, dtype=np.float64)
+        self.obj_sign = np.array(self.obj_sign, dtype=np.float64)
+        self.n_actual_obj = len(self.obj_index)
         super().__init__(
             n_var=len(variable_names),
             n_obj=max(1, self.n_actual_obj),
-            n_constr=n_constr,
+            n_constr=len(self.constr_index),
             xl=variable_bounds[:, 0],
             xu=variable_bounds[:, 1]
         )
 
+    def objective_values(self, X):
+        """计算所有目标函数的原始值，shape为 (样本数, 目标函数数)"""
+        if self.surrogate is not None:
+            return self.surrogate.evaluate(X)
+        if self.eval_mode == "vectorized":
+            return self._vectorized_values(X)
+        if self.eval_mode == "parallel":
+            return self._parallel_values(X)
+        return _row_values(self.objective_functions, self.variable_names, X)
+
+    def _vectorized_values(self, X):
+        values = np.zeros((X.shape[0], len(self.objective_functions)))
+        params = {name: X[:, j] for j, name in enumerate(self.variable_names)}
+        for j, func in enumerate(self.objective_functions):
+            if j not in self._row_only:
+                try:
+                    values[:, j] = np.broadcast_to(np.asarray(func(**params), dtype=np.float64), (X.shape[0],))
+                    continue
+                except Exception:
+                    # 函数含if、max、math等仅支持标量的写法，之后对该函数逐行计算
+                    self._row_only.add(j)
+            values[:, j] = _row_values([func], self.variable_names, X)[:, 0]
+        return values
+
+    def _parallel_values(self, X):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.n_workers, initializer=_init_worker,
+                                                 initargs=(self.function_sources, self.variable_names))
+        chunks = np.array_split(X, min(self.n_workers, X.shape[0]))
+        return np.vstack(list(self._executor.map(_worker_row_values, chunks)))
+
+    def close(self):
+        """关闭parallel模式的进程池"""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
     def _evaluate(self, X, out, *args, **kwargs):
+        values = self.objective_values(X)
         F = np.zeros((X.shape[0], self.n_obj))
-        G = np.zeros((X.shape[0], self.n_constr))
-        for i, x in enumerate(X):
-            params = {name: x[j] for j, name in enumerate(self.variable_names)}
-            constr_idx = 0
-            actual_obj_idx = 0
-            for j, func in enumerate(self.objective_functions):
-                value = func(**params)
-                if self.objective_ranges[j].get('min_value') is not None:
-                    G[i, constr_idx] = self.objective_ranges[j].get('min_value') - value
-                    constr_idx += 1
-                if self.objective_ranges[j].get('max_value') is not None:
-                    G[i, constr_idx] = value - self.objective_ranges[j].get('max_value')
-                    constr_idx += 1
-                if self.objective_ranges[j].get('direction') is not None:
-                    if self.objective_ranges[j].get('direction') == "max":
-                        F[i, actual_obj_idx] = -value
-                    else:
-                        F[i, actual_obj_idx] = value
-                    actual_obj_idx += 1
+        F[:, :self.n_actual_obj] = values[:, self.obj_index] * self.obj_sign
         out["F"] = F
-        out["G"] = G
+        out["G"] = (values[:, self.constr_index] - self.constr_bound) * self.constr_sign
 
 
-def calculation(request: dict, current_dir: str, task_id: str):
+def refine_front(problem: CustomMOOProblem, X: np.ndarray) -> np.ndarray:
+    """
+    基于解析梯度对帕累托前沿做局部精修：以各前沿解为起点，在满足原有约束且各目标均不劣于起点的条件下，
+    用SLSQP最小化归一化目标之和，得到的解弱支配原解
+    :param problem: 带回归代理模型的优化问题
+    :param X: 前沿解，shape为 (解数, 变量数)
+    :return: 精修后的前沿解
+    """
+    from scipy.optimize import minimize as local_minimize
+
+    surrogate = problem.surrogate
+    obj_index, obj_sign = problem.obj_index, problem.obj_sign
+    constr_index, constr_bound, constr_sign = problem.constr_index, problem.constr_bound, problem.constr_sign
+    F_front = surrogate.evaluate(X)[:, obj_index] * obj_sign
+    scale = np.ptp(F_front, axis=0)
+    scale[scale < 1e-12] = 1.0
+    bounds = list(zip(problem.xl, problem.xu))
+
+    def fun(x):
+        return float(np.sum(surrogate.evaluate(x[None, :])[0, obj_index] * obj_sign / scale))
+
+    def jac(x):
+        return np.sum(surrogate.gradient(x[None, :])[0, obj_index] * (obj_sign / scale)[:, None], axis=0)
+
+    refined = X.copy()
+    for i, x0 in enumerate(X):
+        f0 = F_front[i]
+        constraints = [
+            # 各目标不劣于起点: f0 - F(x) >= 0
+            {'type': 'ineq',
+             'fun': lambda x, f0=f0: f0 - surrogate.evaluate(x[None, :])[0, obj_index] * obj_sign,
+             'jac': lambda x: -surrogate.gradient(x[None, :])[0, obj_index] * obj_sign[:, None]}
+        ]
+        if constr_index:
+            constraints.append(
+                # 原有约束: -G(x) >= 0
+                {'type': 'ineq',
+                 'fun': lambda x: -(surrogate.evaluate(x[None, :])[0, constr_index] - constr_bound) * constr_sign,
+                 'jac': lambda x: -surrogate.gradient(x[None, :])[0, constr_index] * constr_sign[:, None]}
+            )
+        res = local_minimize(fun, x0, jac=jac, bounds=bounds, constraints=constraints, method='SLSQP')
+        if res.success:
+            refined[i] = np.clip(res.x, problem.xl, problem.xu)
+    return refined
+
+
+def build_problem(request: dict):
+    """
+    根据优化请求构建优化问题
+    :return: 优化问题实例和目标名称列表
+    """
     # 提取变量名称和边界
     variable_names = list(request['variables'].keys())
     variable_bounds = np.array([
         [var['lower'], var['upper']] for var in request['variables'].values()
     ])
 
-    population_size = request['population_size']
-
-    # 提取目标范围
-    objective_ranges = list(request['objective_ranges'].values())
+    # 目标函数可由函数源码或逐步回归模型系数给出
+    objective_models = request.get('objective_models')
+    if objective_models:
+        objective_names = list(objective_models.keys())
+        surrogate = RegressionSurrogate(variable_names, list(objective_models.values()))
+        objective_functions = []
+    else:
+        objective_names = list(request['objective_functions'].keys())
+        surrogate = None
+        # 构建目标函数列表
+        objective_functions = [
+            safe_eval_function(
+                func_code,
+                func_name,
+                expected_params=variable_names
+            )
+            for func_name, func_code in request['objective_functions'].items()
+        ]
 
-    # 构建目标函数列表
-    objective_functions = [
-        safe_eval_function(
-            func_code,
-            func_name,
-            expected_params=variable_names
-        )
-        for func_name, func_code in request['objective_functions'].items()
-    ]
-
-    # from dask.distributed import Client
-    # client = Client()
-    # client.restart()
-    # print("DASK STARTED")
-    # runner = DaskParallelization(client)
+    # 按目标名称提取目标范围
+    objective_ranges = [request['objective_ranges'][name] for name in objective_names]
 
     # 创建优化问题实例
     problem = CustomMOOProblem(
@@ -141,50 +393,107 @@ def calculation(request: dict, current_dir: str, task_id: str):
         variable_bounds=variable_bounds,
         objective_functions=objective_functions,
         objective_ranges=objective_ranges,
+        surrogate=surrogate,
+        eval_mode=request.get('eval_mode', "row"),
+        function_sources=request.get('objective_functions'),
+        n_workers=request.get('n_workers'),
     )
-    # problem.elementwise_runner = runner
+    return problem, objective_names
+
 
-    # 根据请求选择优化算法
+def feasibility_precheck(problem: CustomMOOProblem, n_samples: int, seed: int = 0, time_budget: float = 1.0):
+    """
+    用Sobol序列采样变量空间，分批计算约束违反量，超过time_budget秒后停止计算剩余批次
+    :param problem: 优化问题
+    :param n_samples: 采样数，向上取为2的幂
+    :param seed: Sobol序列扰动的随机种子
+    :param time_budget: 计算时间上限，秒
+    :return: 按约束违反量从小到大排序的样本、对应的约束违反量、各约束在样本中的最小G值
+    """
+    sampler = qmc.Sobol(d=problem.n_var, scramble=True, seed=seed)
+    X = qmc.scale(sampler.random_base2(max(0, math.ceil(math.log2(n_samples)))), problem.xl, problem.xu)
+    start = time.perf_counter()
+    G_parts = []
+    for chunk in np.array_split(X, math.ceil(len(X) / 1024)):
+        G_parts.append(np.atleast_2d(problem.evaluate(chunk, return_values_of=["G"])).reshape(len(chunk), -1))
+        if time.perf_counter() - start > time_budget:
+            break
+    G = np.vstack(G_parts)
+    X = X[:len(G)]
+    cv = np.maximum(G, 0).sum(axis=1)
+    order = np.argsort(cv, kind='stable')
+    return X[order], cv[order], G.min(axis=0)
+
+
+def infeasibility_message(problem: CustomMOOProblem, objective_names: List[str], G_best: np.ndarray) -> str:
+    """根据预检查中各约束的最小G值，说明哪些约束在变量范围内无法满足"""
+    details = []
+    for k, g in enumerate(G_best):
+        if g > 0:
+            name = objective_names[problem.constr_index[k]]
+            bound, sign = problem.constr_bound[k], problem.constr_sign[k]
+            details.append(f"{name}{'>=' if sign < 0 else '<='}{bound:g}（采样中最接近的值为{bound + g * sign:.4g}）")
+    message = "; ".join(details) if details else "各约束无法同时满足"
+    return f"Sobol采样预检查未找到可行解: {message}。如确认可行，可设置feasibility_precheck为false跳过预检查"
+
+
+def initial_sampling(request: dict, problem: CustomMOOProblem, objective_names: List[str], population_size: int,
+                     seed: int = 0):
+    """
+    约束可行性预检查，无可行样本时直接报错，避免耗尽全部迭代后才失败；
+    否则以违反量最小的样本（可行样本优先）作为初始种群
+    :return: 初始种群变量矩阵，无约束或关闭预检查时为None
+    """
+    if problem.n_constr == 0 or not request.get('feasibility_precheck', True):
+        return None
+    X, cv, G_best = feasibility_precheck(problem, max(1024, 2 * population_size), seed=seed)
+    if cv[0] > 0:
+        raise ValueError(infeasibility_message(problem, objective_names, G_best))
+    return X[:population_size]
+
+
+def build_algorithm(request: dict, problem: CustomMOOProblem, population_size: int, current_dir: str,
+                    sampling: np.ndarray = None):
+    """根据请求选择优化算法，sampling为初始种群变量矩阵，None时使用算法默认的随机采样"""
     n_actual_obj = problem.n_actual_obj
     algorithm = None
+    options = {} if sampling is None else {'sampling': sampling}
     if request['algorithm'] == "nsga2":
-        algorithm = NSGA2(pop_size=population_size)
+        algorithm = NSGA2(pop_size=population_size, **options)
     elif request['algorithm'] == "nsga3":
         if n_actual_obj > 0:
-            ref_dirs = get_reference_directions("das-dennis", n_actual_obj, n_partitions=12)
-            algorithm = NSGA3(pop_size=population_size, ref_dirs=ref_dirs)
+            ref_dirs = get_ref_dirs(
+                n_actual_obj,
+                population_size,
+                request.get('ref_dirs', "auto"),
+                cache_dir=f"{current_dir}/cache_files/ref-dirs"
+            )
+            algorithm = NSGA3(pop_size=population_size, ref_dirs=ref_dirs, **options)
         else:
             raise ValueError("NSGA3需要至少一个优化目标")
+    return algorithm
 
-    # 执行优化
-    res = minimize(
-        problem,
-        algorithm,
-        ('n_gen', request['generations']),
-        seed=1,
-        verbose=False
-    )
 
-    # client.close()
-    # print("DASK SHUTDOWN")
-    # 处理优化结果
-    if res.F is None:
-        raise ValueError("优化未找到可行解")
+def save_solutions(request: dict, problem: CustomMOOProblem, objective_names: List[str], X_front: np.ndarray,
+                   current_dir: str, task_id: str):
+    """对前沿解做可选的局部精修，计算各目标原始值并保存到文件"""
+    if problem.surrogate is not None and request.get('local_refinement'):
+        X_front = refine_front(problem, X_front)
 
+    # 计算所有目标原始值
+    values = problem.objective_values(X_front)
     optimal_solutions = []
-    for idx in range(min(5, len(res.X))):
-        x = res.X[idx]
+    for x, value in zip(X_front, values):
         solution = {
             "optimal_variables": {
                 name: float(x[i])
-                for i, name in enumerate(variable_names)
+                for i, name in enumerate(problem.variable_names)
             },
-            "optimal_objectives": {}
+            "optimal_objectives": {
+                name: float(value[j])
+                for j, name in enumerate(objective_names)
+            }
         }
-        # 计算所有目标原始值
-        params = solution["optimal_variables"]
-        for name, func in zip(request['objective_functions'].keys(), objective_functions):
-            solution["optimal_objectives"][name] = float(func(**params))
         optimal_solutions.append(solution)
 
     # 保存结果到文件
@@ -192,67 +501,128 @@ def calculation(request: dict, current_dir: str, task_id: str):
     save_path = f"{current_dir}/data_files/{file_name}"
     os.makedirs(os.path.dirname(save_path), exist_ok=True)
     with open(save_path, "w") as f:
-        import json
         f.write(json.dumps(optimal_solutions, indent=4))
 
     return file_name
 
 
-if __name__ == "__main__":
-    import json
-    import os
-
-    # 更新后的请求数据（使用新的生产率计算公式）
-    request_str = '''{
-        "variables": {
-            "sample_time": {"lower": 1.00, "upper": 2.00},
-            "sample_flow": {"lower": 0.5, "upper": 1.5},
-            "washing_time": {"lower": 0.50, "upper": 1.50},
-            "washing_flow": {"lower": 1.5, "upper": 2.5},
-            "elution_time": {"lower": 0.50, "upper": 1.50},
-            "elution_flow": {"lower": 2.5, "upper": 3.5}
-        },
-        "objective_functions": {
-            "lactone_purity": "def lactone_purity(sample_time, sample_flow, washing_time, washing_flow, elution_time, elution_flow):\\n    return 3.1167 - 10.7425 * 0.5835 + 0.7026 * sample_flow + 3.9301 * washing_time + 1.8364 * washing_flow",
-            "flavonol_glycoside_purity": "def flavonol_glycoside_purity(sample_time, sample_flow, washing_time, washing_flow, elution_time, elution_flow):\\n    return 0.4002 - 50.0259 * 0.5835 + 18.7848 * washing_time + 9.5709 * washing_flow + 3.8743 * elution_time + 2.9674 * elution_flow",
-            "lactone_productivity": "def lactone_productivity(sample_time, sample_flow, washing_time, washing_flow, elution_time, elution_flow):\\n    return 32.8842 + 17.5758 * (sample_flow * elution_flow) - 2.3691 * sample_time - 23.4526 * sample_flow - 8.2481 * elution_flow - 5.7581 * washing_time - 9.4687 * (sample_flow * washing_time) + 20.6692 * (sample_time * sample_flow)",
-            "flavonol_glycoside_productivity": "def flavonol_glycoside_productivity(sample_time, sample_flow, washing_time, washing_flow, elution_time, elution_flow):\\n    return 47.4225 + 49.6461 * (sample_flow * elution_flow) + 13.6240 * sample_time - 18.6213 * sample_flow - 10.5198 * elution_flow - 22.3586 * washing_time - 26.3807 * (sample_flow * washing_time) + 58.9702 * (sample_time * sample_flow)"
-        },
-        "objective_ranges": {
-            "lactone_purity": {"min_value": 6, "max_value": null, "direction": "max"},
-            "flavonol_glycoside_purity": {"min_value": 24, "max_value": null, "direction": "max"},
-            "lactone_productivity": {"min_value": null, "max_value": null, "direction": "max"},
-            "flavonol_glycoside_productivity": {"min_value": null, "max_value": null, "direction": "max"}
-        },
-        "algorithm": "nsga3",
-        "population_size": 2000,
-        "generations": 100
-    }'''
+def optimize(request: dict, current_dir: str):
+    """
+    执行单种群优化
+    :return: 优化问题实例、目标名称列表和pymoo优化结果
+    """
+    population_size = request['population_size']
+
+    # from dask.distributed import Client
+    # client = Client()
+    # client.restart()
+    # print("DASK STARTED")
+    # runner = DaskParallelization(client)
+
+    problem, objective_names = build_problem(request)
+    # problem.elementwise_runner = runner
 
     try:
-        # 解析请求数据
-        request = json.loads(request_str)
-
-        # 设置当前目录为脚本所在目录
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        # 测试用任务ID
-        task_id = "debug_test_001"
-
-        # 执行计算
-        result_file = calculation(request, current_dir, task_id)
-        print(f"优化完成，结果已保存至：{os.path.join(current_dir, 'data_files', result_file)}")
-
-        # 读取并打印结果（可选）
-        with open(os.path.join(current_dir, 'data_files', result_file), 'r') as f:
-            results = json.load(f)
-        print("前5个优化解：")
-        for i, sol in enumerate(results[:5], 1):  # 只显示前5个解
-            print(f"\n解 {i}:")
-            print("最优变量：", sol["optimal_variables"])
-            print("目标函数值：", sol["optimal_objectives"])
-    except json.JSONDecodeError as e:
-        print(f"JSON解析错误：{str(e)}")
-        print(f"错误位置：行 {e.lineno}, 列 {e.colno}")
-    except Exception as e:
-        print(f"调试过程中发生错误：{str(e)}")
+        sampling = initial_sampling(request, problem, objective_names, population_size)
+        algorithm = build_algorithm(request, problem, population_size, current_dir, sampling)
+
+        # 执行优化
+        res = minimize(
+            problem,
+            algorithm,
+            ('n_gen', request['generations']),
+            seed=1,
+            verbose=False
+        )
+    finally:
+        problem.close()
+
+    # client.close()
+    # print("DASK SHUTDOWN")
+    return problem, objective_names, res
+
+
+def calculation(request: dict, current_dir: str, task_id: str):
+    problem, objective_names, res = optimize(request, current_dir)
+
+    # 处理优化结果
+    if res.F is None:
+        raise ValueError("优化未找到可行解")
+
+    X_front = np.atleast_2d(res.X)[:5]
+    try:
+        return save_solutions(request, problem, objective_names, X_front, current_dir, task_id)
+    finally:
+        problem.close()
+
+
+def island_calculation(request: dict, current_dir: str, island_id: int,
+                       migrate: Optional[Callable[[np.ndarray], Optional[np.ndarray]]] = None):
+    """
+    岛屿模型中单个子种群的优化计算，种群规模为 population_size / islands，随机种子为 1 + island_id。
+    每隔 migration_interval 代调用一次 migrate：传入本岛精英个体，返回其他岛迁入的个体（可为None），
+    迁入个体经评价后与本岛种群合并，再由算法的环境选择保留原种群规模
+    :return: 本岛最终前沿解，{"X": [[...], ...]}，无可行解时为空列表
+    """
+    n_islands = request.get('islands', 1)
+    migration_interval = request.get('migration_interval', 10)
+    population_size = math.ceil(request['population_size'] / n_islands)
+
+    problem, objective_names = build_problem(request)
+
+    try:
+        sampling = initial_sampling(request, problem, objective_names, population_size, seed=1 + island_id)
+        algorithm = build_algorithm(request, problem, population_size, current_dir, sampling)
+        algorithm.setup(problem, termination=('n_gen', request['generations']), seed=1 + island_id, verbose=False)
+        _run_island(algorithm, problem, population_size, migration_interval, migrate)
+    finally:
+        problem.close()
+
+    res = algorithm.result()
+    X = [] if res.X is None else np.atleast_2d(res.X).tolist()
+    return {"X": X}
+
+
+def _run_island(algorithm, problem: CustomMOOProblem, population_size: int, migration_interval: int,
+                migrate: Optional[Callable[[np.ndarray], Optional[np.ndarray]]]):
+    while algorithm.has_next():
+        algorithm.next()
+        if migrate is None or algorithm.n_gen % migration_interval != 0 or not algorithm.has_next():
+            continue
+        # 从当前前沿中随机选取约5%种群规模的精英个体迁出
+        elites = algorithm.opt.get("X")
+        n_migrants = min(len(elites), max(1, population_size // 20))
+        elites = elites[algorithm.random_state.choice(len(elites), n_migrants, replace=False)]
+        immigrants = migrate(elites)
+        if immigrants is None or len(immigrants) == 0:
+            continue
+        immigrants = Population.new(X=np.clip(np.atleast_2d(immigrants), problem.xl, problem.xu))
+        algorithm.evaluator.eval(problem, immigrants, algorithm=algorithm)
+        merged = Population.merge(algorithm.pop, immigrants)
+        algorithm.pop = algorithm.survival.do(problem, merged, n_survive=len(algorithm.pop),
+                                              random_state=algorithm.random_state, algorithm=algorithm)
+
+
+def merge_islands(request: dict, current_dir: str, island_results: List[dict], task_id: str):
+    """
+    合并各岛最终前沿，对合并后的解重新评价并做非支配排序，沿第一个目标均匀选取5个前沿解保存
+    """
+    problem, objective_names = build_problem(request)
+    X = np.array([x for result in island_results for x in result["X"]], dtype=np.float64)
+    if len(X) == 0:
+        raise ValueError("优化未找到可行解")
+
+    try:
+        out = problem.evaluate(X, return_as_dictionary=True)
+        F, G = out["F"], out["G"]
+        feasible = np.all(G <= 0, axis=1) if G is not None and G.size else np.ones(len(X), dtype=bool)
+        X, F = X[feasible], F[feasible]
+        if len(X) == 0:
+            raise ValueError("优化未找到可行解")
 
+        front = NonDominatedSorting().do(F, only_non_dominated_front=True)
+        front = front[np.argsort(F[front, 0])]
+        selected = front[np.unique(np.linspace(0, len(front) - 1, min(5, len(front))).round().astype(int))]
+        return save_solutions(request, problem, objective_names, X[selected], current_dir, task_id)
+    finally:
+        problem.close()
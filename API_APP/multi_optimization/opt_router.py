@@ -1,11 +1,13 @@
 from enum import Enum
 from pathlib import Path
 from typing import Dict, Optional
+from uuid import uuid4
 
+from celery import chord
 from fastapi import HTTPException, APIRouter
 from pydantic import BaseModel, Field, field_validator
 
-from API_APP.celery_config import cal_multi_opt_task
+from API_APP.celery_config import cal_multi_opt_task, cal_multi_opt_island_task, merge_multi_opt_task
 from API_APP.data_manager import add_task_to_frontend
 
 router = APIRouter(
@@ -36,6 +38,19 @@ class OptimizationAlgorithm(str, Enum):
     NSGA3 = "nsga3"
 
 
+class RefDirsMethod(str, Enum):
+    AUTO = "auto"  # 按种群规模自动选择 energy 或 multi-layer
+    ENERGY = "energy"  # Riesz s-energy
+    MULTI_LAYER = "multi-layer"  # 多层das-dennis
+    DAS_DENNIS = "das-dennis"  # 固定n_partitions=12的das-dennis
+
+
+class EvalMode(str, Enum):
+    ROW = "row"  # 逐行调用目标函数
+    VECTORIZED = "vectorized"  # 以整列数组调用目标函数，不支持数组输入时自动退回逐行
+    PARALLEL = "parallel"  # 进程池分块逐行计算
+
+
 class ObjectiveRange(BaseModel):
     min_value: Optional[float] = None
     max_value: Optional[float] = None
@@ -52,11 +67,20 @@ class ObjectiveRange(BaseModel):
 
 class OptimizationRequest(BaseModel):
     variables: Dict[str, VariableRange]
-    objective_functions: Dict[str, str]
+    objective_functions: Optional[Dict[str, str]] = None  # 目标函数源码
+    # 逐步回归模型系数，{目标名: {模型项: 系数}}，模型项命名同Create_terms，如Constant、A、A*B、A^2
+    objective_models: Optional[Dict[str, Dict[str, float]]] = None
     objective_ranges: Dict[str, ObjectiveRange]
     algorithm: OptimizationAlgorithm = OptimizationAlgorithm.NSGA2
     population_size: int = Field(500, gt=0)
     generations: int = Field(100, gt=0)
+    ref_dirs: RefDirsMethod = RefDirsMethod.AUTO  # NSGA3参考方向生成方法
+    local_refinement: bool = False  # 是否基于回归模型梯度对帕累托前沿做局部精修，仅objective_models时有效
+    eval_mode: EvalMode = EvalMode.ROW  # 目标函数计算方式，objective_models时始终为矩阵乘法
+    n_workers: Optional[int] = Field(None, gt=0)  # parallel模式的进程数，默认为CPU核数
+    feasibility_precheck: bool = True  # 优化任务开始前用Sobol采样检查约束可行性（无可行点时任务失败），并以可行样本作为初始种群
+    islands: int = Field(1, ge=1)  # 岛屿模型子种群数，大于1时各子种群作为并行的Celery任务运行
+    migration_interval: int = Field(10, gt=0)  # 岛屿间精英个体迁移间隔代数
 
     @field_validator('objective_ranges')
     def check_objective_ranges(cls, value):
@@ -77,7 +101,10 @@ async def run_optimization(request: OptimizationRequest):
     try:
         if not request.variables:
             raise HTTPException(status_code=400, detail="至少需要定义一个优化变量")
-        if set(request.objective_functions.keys()) != set(request.objective_ranges.keys()):
+        if (request.objective_functions is None) == (request.objective_models is None):
+            raise HTTPException(status_code=400, detail="objective_functions和objective_models必须且只能指定一个")
+        objectives = request.objective_functions or request.objective_models
+        if set(objectives.keys()) != set(request.objective_ranges.keys()):
             raise HTTPException(status_code=400, detail="目标函数和目标范围不匹配")
         current_dir = Path(__file__).resolve().parent.parent
 
@@ -85,13 +112,26 @@ async def run_optimization(request: OptimizationRequest):
         opt_target = ", ".join(variable_names)
         description = f"使用全局优化算法 {request.algorithm.value} 进行多目标优化，优化目标为{opt_target}。\
                             计算返回前5个帕累托前沿，具体结果见txt文件。"
-        task = cal_multi_opt_task.apply_async(args=[request.model_dump(), str(current_dir)])
+        request_data = request.model_dump()
+
+        if request.islands > 1:
+            # 各岛并行优化，全部完成后由回调任务合并前沿
+            run_id = uuid4().hex
+            task = chord(
+                cal_multi_opt_island_task.s(request_data, str(current_dir), run_id, island_id)
+                for island_id in range(request.islands)
+            )(merge_multi_opt_task.s(request_data, str(current_dir)))
+            description += f"采用岛屿模型，{request.islands}个子种群并行计算。"
+        else:
+            task = cal_multi_opt_task.apply_async(args=[request_data, str(current_dir)])
         add_task_to_frontend(
             task_id=task.id,
             task_name="多目标优化",
             description=description
         )
         return {"result": "多目标优化任务启动，可在任务运行情况中查看详情"}
+    except HTTPException as he:
+        raise he
     except Exception as e:
         raise HTTPException(
             status_code=500,
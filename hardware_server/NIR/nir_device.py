@@ -1,23 +1,27 @@
 import numpy as np
-import threading
 
 from hardware.NIR.wrapper import *
+from spectral_device import SpectralDevice
 
 
-class NIRDevice:
+class NIRDevice(SpectralDevice):
+    label = "近红外"
+
     def __init__(self):
         self.nirState = {'avg_times': 6}
         # 900 - 1700nm设备，共计228个波长点
         self.WLS_NUM = 228
         self.wavelengths = np.zeros(self.WLS_NUM, dtype=np.float64)
         self.deviceIndex = 0
-        self.dark_data = np.zeros(self.WLS_NUM, dtype=np.float64)  # 用于存储暗底数据
-        self.reference_data = np.zeros(self.WLS_NUM, dtype=np.float64)  # 用于存储参照数据
-        self.absorbance_data = np.zeros(self.WLS_NUM, dtype=np.float64)  # 用于存储吸光度mau数据
+        # 暗背景、参比、吸光度（mau）等数组，设置暗背景和参比时软件平均5次扫描（每次扫描另有设备的 avg_times 平均）
+        self.init_processing(self.WLS_NUM, calibration_scans=5)
         self.intensity_data = np.zeros(self.WLS_NUM, dtype=np.float64)  # 用于存储当前强度值
-        self.lock = threading.Lock()  # 线程锁
+        # 预分配的强度缓冲区，只用 np.frombuffer 包装一次，读取全部波长点时不再分配
+        self.intensity_buf = (ctypes.c_int * self.WLS_NUM)()
+        self.intensity_counts = np.frombuffer(self.intensity_buf, dtype=np.int32)
 
         self.init_nir()
+        self.set_roi()  # 读取波长后按实际波长重建ROI，默认保留全部像素
 
     # 初始化设备
     def init_nir(self):
@@ -81,44 +85,30 @@ class NIRDevice:
             return None
 
     # 设置暗背景
-    def set_background(self):
-        """
-        设置暗背景数据，调用 get_intensities 函数获取当前强度值并存储到 dark_data 中。
+    def set_background(self, n_scans=None):
         """
-        self.dark_data[:] = self.get_intensities()
-        print("[近红外] 已设置暗背景")
+        设置暗背景数据，调用 collect_average 函数多次读取强度值并平均后存储到 dark_data 中。
 
-    # 设置参比
-    def set_reference(self):
-        """
-        设置参比数据，调用 get_intensities 函数获取当前强度值并存储到 reference_data 中。
+        参数:
+            n_scans (int): 扫描次数，默认为 calibration_scans。
+
+        返回:
+            设置成功返回True，否则返回False。
         """
-        self.reference_data[:] = self.get_intensities() - self.dark_data
-        print("[近红外] 已设置参比光谱")
+        return self.calibrate_background(n_scans)
 
-    def get_absorbance(self):
+    # 设置参比
+    def set_reference(self, n_scans=None):
         """
-        计算并返回吸光度数据。
+        设置参比数据，调用 collect_average 函数多次读取强度值并平均，减去暗背景后存储到 reference_data 中。
 
-        步骤:
-        1. 调用 get_intensities 函数获取当前强度值。
-        2. 计算信号值（当前强度值减去暗背景值）。
-        3. 计算吸光度，仅对信号值和参比值都大于0的波长点进行计算。
-        4. 对于不满足条件的波长点，吸光度设为0。
+        参数:
+            n_scans (int): 扫描次数，默认为 calibration_scans。
 
         返回:
-            如果采集到数据，返回吸光度数组；否则返回None。
+            设置成功返回True，否则返回False。
         """
-        data = self.get_intensities()
-        if data is not None:
-            signal = data - self.dark_data
-            valid_mask = (signal > 0) & (self.reference_data > 0)
-            self.absorbance_data[valid_mask] = 1000 * np.log10(self.reference_data[valid_mask] / signal[valid_mask])
-            self.absorbance_data[~valid_mask] = 0.0
-            return self.absorbance_data
-        else:
-            print("[近红外] [Error] 没有采集到数据")
-            return None
+        return self.calibrate_reference(n_scans)
 
     # 获取波长值
     def get_wavelengths(self):
@@ -130,6 +120,13 @@ class NIRDevice:
         """
         return self.wavelengths
 
+    # 全部波长点的波长值，用于创建ROI
+    def full_wavelengths(self):
+        return self.wavelengths
+
+    def read_scan(self):
+        return self.get_intensities()
+
     # 获取波长对应强度值
     def get_intensities(self, activeIndex=0, num=None):
         """
@@ -140,16 +137,20 @@ class NIRDevice:
             num (int): 扫描的波长数，默认为228。
 
         返回:
-            如果获取成功，返回强度值数组；否则返回None。
+            如果获取成功，返回强度值数组（intensity_data，下次读取时被覆盖）；否则返回None。
         """
         self.lock.acquire()  # 获取锁
         try:
             if num is None:
                 num = self.WLS_NUM
-            intensities = (ctypes.c_int * num)()
+            if num == self.WLS_NUM:
+                intensities, counts = self.intensity_buf, self.intensity_counts
+            else:
+                intensities = (ctypes.c_int * num)()
+                counts = np.frombuffer(intensities, dtype=np.int32)
             ret = wrapper.dlpGetIntensities(activeIndex, intensities, num)
             if ret >= 0:
-                self.intensity_data[:] = np.ctypeslib.as_array(intensities)
+                self.intensity_data[:num] = counts
                 return self.intensity_data
             else:
                 print(f"[近红外] 获取强度失败: {ret}")
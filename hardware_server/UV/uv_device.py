@@ -1,21 +1,24 @@
 import time
-import threading
 from ctypes import byref
 import numpy as np
 from hardware.UV.wrapper import *
+from spectral_device import SpectralDevice
 
 
-class UVDevice:
+class UVDevice(SpectralDevice):
+    label = "紫外"
+
     def __init__(self):
         self.integration_time_us = 96 * 1000  # 初始积分时间，单位: 微秒
         self.average_times = 5  # 初始平均次数
         self.m_uiTimeouts = 1000  # 超时，单位: 毫秒
         self.m_dWavelengths = np.zeros(2048, dtype=np.float64)  # 2048 个双精度浮点数，用于存储波长数据
-        self.dark_data = np.zeros(2048, dtype=np.float64)  # 2048 个双精度浮点数，用于存储暗底数据
-        self.reference_data = np.zeros(2048, dtype=np.float64)  # 2048 个双精度浮点数，用于存储参照数据
-        self.absorbance_data = np.zeros(2048, dtype=np.float64)  # 2048 个双精度浮点数，用于存储吸光度mau数据
+        # 暗底、参比、吸光度（mau）等数组，设置暗底和参比时软件平均10次扫描
+        self.init_processing(2048, calibration_scans=10)
+        # 预分配的采集缓冲区（每个像素2字节，大端序），只用 np.frombuffer 包装一次，采集时不再分配和转换
+        self.recv_buf = (ctypes.c_ubyte * (2048 * 2))()
+        self.raw_counts = np.frombuffer(self.recv_buf, dtype='>u2')  # 与 recv_buf 共享内存的像素值视图
         self.hd = None  # 设备句柄作为类的属性
-        self.lock = threading.Lock()  # 线程锁
 
         self.uvState = {'lamp': False, 'avg_times': self.average_times,
                         'integration_time': self.integration_time_us/1000}
@@ -107,6 +110,7 @@ class UVDevice:
         self.set_integration_time(integration_time_us)
         self.set_average(average_times)
         self.get_Wavelengths()
+        self.set_roi(self.roi.ranges, self.roi.bin_size)
         self.set_background()
         self.set_reference()
         print("[紫外] 设备初始化并打开成功")
@@ -295,33 +299,40 @@ class UVDevice:
         else:
             return np.around(self.m_dWavelengths, decimals=2)
 
+    # ========================== 感兴趣区域与像素合并 ============================= #
+    def full_wavelengths(self):
+        """
+        全部像素的波长，用于创建ROI（见 SpectralDevice.set_roi）。
+
+        返回:
+        numpy.ndarray: 保留两位小数的波长数组。
+        """
+        return np.around(self.m_dWavelengths, decimals=2)
+
     # ========================== 数据采集 ============================= #
     def collect_one(self):
         """
-        采集一次数据。
+        采集一次数据到预分配的采集缓冲区。
 
         返回:
-        numpy.ndarray或None: 如果成功采集到数据，返回包含采集数据的numpy数组；否则返回None。
+        numpy.ndarray或None: 如果成功采集到数据，返回缓冲区的像素值视图（大端序uint16，下次采集时被覆盖，
+        调用方需在 self.lock 内使用或复制）；否则返回None。
         """
-        self.lock.acquire()  # 获取锁
-        try:
+        with self.lock:
             pixel_start = 0
             pixel_stop = 2047
-            num_pixels = pixel_stop - pixel_start + 1
-            buf_len = num_pixels * 2  # 每个像素2字节
-            recv_buf = (ctypes.c_ubyte * buf_len)()
             real_len = c_uint32(0)
             # print(f"[紫外] [Info] 准备采集数据，超时: {self.m_uiTimeouts} ms")
-            ret = modbus_splibex.SPLIBEX_CollectionBytes(self.hd, recv_buf, pixel_start, pixel_stop, byref(real_len),
-                                                        self.m_uiTimeouts)
+            ret = modbus_splibex.SPLIBEX_CollectionBytes(self.hd, self.recv_buf, pixel_start, pixel_stop,
+                                                        byref(real_len), self.m_uiTimeouts)
             if ret != 0:
                 print(f"[紫外] [Error] 采集失败，错误码: {ret}")
                 return None
             # print(f"[紫外] [Info] 成功采集 {num_pixels} 个像素的数据")
-            data = self.parse_data(recv_buf)
-            return data
-        finally:
-            self.lock.release()  # 确保锁释放
+            return self.raw_counts
+
+    def read_scan(self):
+        return self.collect_one()
 
     def parse_data(self, buf):
         """
@@ -331,65 +342,42 @@ class UVDevice:
         buf (ctypes.c_ubyte数组): 采集到的原始数据缓冲区。
 
         返回:
-        numpy.ndarray: 解析后的数据数组。
+        numpy.ndarray: 与缓冲区共享内存的大端序uint16像素值视图。
         """
-        buf = np.frombuffer(buf, dtype=np.uint8)
-        # 注意数据截断
-        data = (buf[::2].astype(np.uint16) << 8) | buf[1::2].astype(np.uint16)
-        return data
+        return np.frombuffer(buf, dtype='>u2')
 
-    # ========================== 关灯采集一次数据作为暗底数据 ============================= #
-    def set_background(self):
-        """
-        关灯采集一次数据作为暗底数据。
-
-        返回:
-        None
+    # ========================== 关灯采集多次数据平均作为暗底数据 ============================= #
+    def set_background(self, n_scans=None):
         """
-        self.enable_lamp(0)
-        time.sleep(2)
-        data = self.collect_one()
-        if data is not None:
-            self.dark_data[:] = data.astype(np.float64)
-            print(f"[紫外] 设置暗底成功")
-        else:
-            print("[紫外] 设置暗底失败")
+        关灯采集多次数据，剔除异常值后平均作为暗底数据。阻塞调用（含灯稳定时间），应在工作线程中执行。
 
-    # ========================== 开灯采集新数据（减去暗底数据）作为参考数据 ============================= #
-    def set_reference(self):
-        """
-        开灯采集新数据（减去暗底数据）作为参考数据。
+        参数:
+        n_scans (int或None): 扫描次数，默认为 calibration_scans。
 
         返回:
-        None
+        bool: 设置成功返回True，否则返回False。
         """
-        self.enable_lamp(1)
-        time.sleep(2)
-        data = self.collect_one()
-        if data is not None:
-            self.reference_data[:] = data.astype(np.float64) - self.dark_data
-            print(f"[紫外] 参比设置成功")
-        else:
-            print("[紫外] 参比设置失败")
+        # 标定期间持有锁，并发的标定和吸光度采集等待关灯、稳定和采集全部完成
+        with self.lock:
+            self.enable_lamp(0)
+            time.sleep(2)
+            return self.calibrate_background(n_scans)
 
-    # ========================== 采集新数据计算吸光度 ============================= #
-    def get_absorbance(self):
+    # ========================== 开灯采集多次数据平均（减去暗底数据）作为参考数据 ============================= #
+    def set_reference(self, n_scans=None):
         """
-        采集新数据并计算吸光度。
+        开灯采集多次数据，剔除异常值后平均并减去暗底数据作为参考数据。阻塞调用（含灯稳定时间），应在工作线程中执行。
+
+        参数:
+        n_scans (int或None): 扫描次数，默认为 calibration_scans。
 
         返回:
-        numpy.ndarray或None: 如果成功采集到数据并计算出吸光度，返回包含吸光度数据的numpy数组；否则返回None。
-        """
-        data = self.collect_one()
-        if data is not None:
-            signal = data.astype(np.float64) - self.dark_data
-            valid_mask = (signal > 0) & (self.reference_data > 0)
-            self.absorbance_data[valid_mask] = 1000 * np.log10(self.reference_data[valid_mask] / signal[valid_mask])
-            self.absorbance_data[~valid_mask] = 0.0
-            return self.absorbance_data
-        else:
-            print("[紫外] [Error] 没有采集到数据")
-            return None
+        bool: 设置成功返回True，否则返回False。
+        """
+        with self.lock:
+            self.enable_lamp(1)
+            time.sleep(2)
+            return self.calibrate_reference(n_scans)
 
     # ========================== 主函数 ============================= #
     def main(self):
@@ -2,6 +2,7 @@ import asyncio
 import math
 
 from hardware_config import HardwareConfig
+from scheduler import PeriodicTimer, wait_for
 
 
 class ChromParameters:
@@ -41,7 +42,7 @@ class ChromProcess(ChromParameters):
         self.valve_controller = valve_controller
         self.sampleSpan = sample_span
         self.current_stage = None  # 当前实验阶段
-        self.skip_stage = False  # 跳过当前阶段的标志
+        self.skip_event = asyncio.Event()  # 跳过当前阶段，置位时立即结束当前阶段的等待
 
         # 计算柱体积，mL
         self.bv = math.pi * pow(experiment_record['column_inner_diameter'] / 2, 2) * experiment_record['bed_height']
@@ -57,6 +58,18 @@ class ChromProcess(ChromParameters):
         self.equilibrate_speed = (self.bv * (self.equilibrate_flow / 60) *
                                   HardwareConfig.pump_factor[f'{self.equilibrate_pump}'])
 
+    @property
+    def skip_stage(self):
+        """跳过当前阶段的标志"""
+        return self.skip_event.is_set()
+
+    @skip_stage.setter
+    def skip_stage(self, value):
+        if value:
+            self.skip_event.set()
+        else:
+            self.skip_event.clear()
+
     def switch_mode(self, mode):
         mode_config = {
             'feed': (self.feed_pump, self.feed_speed, self.feed_valve),
@@ -96,20 +109,17 @@ class ChromProcess(ChromParameters):
     async def reach_equilibration(self, check_equilibrium, flow, stage):
         # 至少上1.5个柱体积
         await self.wait(1.5 * 60 * 60 / flow)
+        # 每个光谱采样间隔检查一次，判断耗时不累积
+        timer = PeriodicTimer(self.sampleSpan, f"{stage}_equilibrium_check")
         while True:
             if self.skip_stage or await check_equilibrium(stage):
                 break
             else:
-                await self.wait(self.sampleSpan + 10)
+                await timer.wait(event=self.skip_event)
 
-    # 计算函数
+    # 计时函数：等待total_time秒，跳过当前阶段时立即返回
     async def wait(self, total_time):
-        rest_time = total_time  # 剩下的时间
-        while rest_time > 0:
-            if self.skip_stage:
-                break
-            await asyncio.sleep(1)
-            rest_time -= 1
+        await wait_for(total_time, self.skip_event)
 
     # 执行柱层析过程
     async def execute_process(self, check_equilibrium, send_log, reset_es):
@@ -137,8 +147,9 @@ class ChromProcess(ChromParameters):
 
         # 设置光谱参考值
         await send_log("正在设置UV和NIR的参比光谱...")
-        await asyncio.to_thread(self.uv_controller.set_reference)
-        await asyncio.to_thread(self.nir_controller.set_reference)
+        # 两台光谱仪的多次扫描平均在各自的工作线程中同时进行
+        await asyncio.gather(asyncio.to_thread(self.uv_controller.set_reference),
+                             asyncio.to_thread(self.nir_controller.set_reference))
         await send_log("UV和NIR的参考值已设置完成。")
 
         # 开始上样阶段
@@ -1,30 +1,42 @@
 import asyncio
 import json
-from collections import deque
+import os
+import time
 
-import numpy as np
-from sklearn.decomposition import PCA
 from sqlalchemy import text
 
-import NIR
-import UV
 from chrom_process import ChromProcess
+from equilibrium_monitor import EquilibriumMonitor
+from db_writer import DBWriter, SPECTRUM_RECORD, pack_sensor, pack_spectrum, unpack_sensor, unpack_spectrum
 from hardware_config import HardwareConfig
-from mysql import AsyncDBSession
+from mysql import AsyncDBSession, encode_wavelengths
 from level_control import PIDController, FuzzyController
 from pumps import PumpController
+from sample_window import SampleWindow
+from scheduler import Notifier, PeriodicTimer
+from segment_store import SegmentStore
 from sensors import SensorController
 from valves import ValveController
 
 
+def check_span(span):
+    """采样、控制间隔必须为正数，为0时周期定时器无法推进"""
+    if not isinstance(span, (int, float)) or isinstance(span, bool) or span <= 0:
+        raise ValueError(f"时间间隔必须大于0: {span}")
+
+
 class ChromSys:
-    def __init__(self):
+    def __init__(self, backend=None):
+        """
+        :param backend: 硬件后端，"real"为真实设备，"sim"为模拟设备（simulator包），为None时读取环境变量 CHROM_HARDWARE，默认"real"
+        """
         self.experiment_id = 0  # 未启动具体实验默认为0
-        self.sampleSpan_run = 5  # 实验时传感器和光谱采样间隔s
-        self.sampleSpan_stop = 600  # 不在实验时传感器和光谱采样间隔s
-        self.lc_span = 1  # 液位控制时间间隔s
+        self.sampling_changed = Notifier()  # 实验启停或采样间隔修改时唤醒各采集任务和液位控制
+        self.sample_spans_run = {"sensor": 1, "uv": 5, "nir": 5}  # 实验时各仪器独立的采样间隔s
+        self._sampleSpan_stop = 600  # 不在实验时传感器和光谱采样间隔s
+        self._lc_span = 1  # 液位控制时间间隔s
         self.equilibriumCheckSpan = 20  # 检查柱层析流出液是否达到平衡的传感器与光谱数据检查窗口，min
-        self.running = False  # 实验运行状态
+        self._running = False  # 实验运行状态
         self.chrom_process = None  # 柱层析实验对象
         self.chrom_task = None
         self.equilibrium_status = None  # 平衡状态
@@ -47,27 +59,74 @@ class ChromSys:
         }
         # 光谱稳定性参数
         self.spectral_threshold = 0.001  # 光谱稳定性阈值
-        self.pca_components = 5  # PCA主成分数量
+        self._pca_components = 5  # PCA主成分数量
+        self.spectral_bin = 1  # 平衡判断时光谱波长合并点数，1为不合并；合并会降低主成分得分中的噪声，需相应调整 spectral_threshold
 
         # 初始化设备控制器
         pump_addresses = [0x05, 0x06, 0x07, 0x08, 0x09, 0x0A]
         valve_channels = [1, 2, 3, 4, 5, 8, 9, 10, 11]
 
-        self.uv_controller = UV.UVDevice()
-        self.nir_controller = NIR.NIRDevice()
-        self.sensor_controller = SensorController(port='com8', conductivity_address=1, ph_address=2, orp_address=3,
-                                                  level_address=4)
-        self.pump_controller = PumpController(port='com5', pump_addresses=pump_addresses)
-        self.valve_controller = ValveController(client=self.pump_controller.get_client(), valve_channels=valve_channels,
-                                                slave_address=1)
+        self.backend = backend or os.environ.get("CHROM_HARDWARE", "real")
+        self.simulator = None
+        if self.backend == "sim":
+            # 模拟后端：泵、阀门、传感器仍使用真实控制器，经进程内Modbus服务器做寄存器级模拟
+            from simulator import SimulatedHardware
+            self.simulator = SimulatedHardware.from_env(pump_addresses, valve_channels, valve_address=1,
+                                                        conductivity_address=1, ph_address=2, orp_address=3,
+                                                        level_address=4)
+            self.uv_controller = self.simulator.uv_controller
+            self.nir_controller = self.simulator.nir_controller
+            self.sensor_controller = self.simulator.sensor_controller
+            self.pump_controller = self.simulator.pump_controller
+            self.valve_controller = self.simulator.valve_controller
+        elif self.backend == "real":
+            # 光谱仪包在导入时加载厂商驱动，只在使用真实设备时导入
+            import NIR
+            import UV
+            self.uv_controller = UV.UVDevice()
+            self.nir_controller = NIR.NIRDevice()
+            self.sensor_controller = SensorController(port='com8', conductivity_address=1, ph_address=2, orp_address=3,
+                                                      level_address=4)
+            self.pump_controller = PumpController(port='com5', pump_addresses=pump_addresses)
+            self.valve_controller = ValveController(client=self.pump_controller.get_client(),
+                                                    valve_channels=valve_channels, slave_address=1)
+        else:
+            raise ValueError(f"未知的硬件后端: {self.backend}")
+        self.spectral_controllers = {"uv": self.uv_controller, "nir": self.nir_controller}
+        # 全部像素的波长，用于确定分段存储的记录大小（ROI内合并后的光谱不超过全部像素）和原始光谱冷存储
         self.uv_wavelengths = self.uv_controller.get_Wavelengths()
         self.nir_wavelengths = self.nir_controller.get_wavelengths()
+        self.db_writer = DBWriter()  # 传感器、光谱和日志数据的后台批量写入任务，在lifespan中启动
+
+        # 采集数据的本地分段存储，采集循环先写入此处，数据库慢或不可用时不丢数据、不影响采样节奏
+        store_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sample_store")
+        self.sample_stores = {
+            "Sensors": SegmentStore(os.path.join(store_dir, "sensors"), record_size=4096),
+            "UVs": SegmentStore(os.path.join(store_dir, "uv"), record_size=SegmentStore.HEADER.size +
+                                SPECTRUM_RECORD.size + 4 * len(self.uv_wavelengths)),
+            "NIRs": SegmentStore(os.path.join(store_dir, "nir"), record_size=SegmentStore.HEADER.size +
+                                 SPECTRUM_RECORD.size + 4 * len(self.nir_wavelengths)),
+        }
+        for table, store in self.sample_stores.items():
+            self.db_writer.add_store(table, store, unpack_sensor if table == "Sensors" else unpack_spectrum)
+
+        # 原始光谱（全部像素）冷存储：只保存在本地，不复制到数据库，记录格式与 sample_stores 相同，
+        # 波长轴文件保存在 db_writer.axes_dir 中，可用 unpack_spectrum 离线导出
+        self.raw_spectra_store = False  # 是否保存原始光谱
+        self.raw_stores = {
+            "uv": SegmentStore(os.path.join(store_dir, "raw_uv"), record_size=SegmentStore.HEADER.size +
+                               SPECTRUM_RECORD.size + 4 * len(self.uv_wavelengths)),
+            "nir": SegmentStore(os.path.join(store_dir, "raw_nir"), record_size=SegmentStore.HEADER.size +
+                                SPECTRUM_RECORD.size + 4 * len(self.nir_wavelengths)),
+        }
 
-        # 时间窗口中的数据
-        self.max_data_points = int(self.equilibriumCheckSpan * 60 / (self.sampleSpan_run + 10))  # 由于延迟采样间隔约10s
-        self.sensor_datas = deque(maxlen=self.max_data_points)
-        self.uv_datas = deque(maxlen=self.max_data_points)
-        self.nir_datas = deque(maxlen=self.max_data_points)
+        # 时间窗口中的数据，按采集时间戳保存，各仪器采样间隔不同
+        self.sample_windows = {name: SampleWindow(self.equilibriumCheckSpan * 60) for name in self.sample_spans_run}
+        # 平衡判断的增量统计，每个紫外光谱采样时刻加入一组对齐的数据
+        self.equilibrium_monitor = EquilibriumMonitor(self.equilibriumCheckSpan * 60, self._pca_components,
+                                                      self.spectral_bin)
+        self.timers = {name: PeriodicTimer(span, name) for name, span in self.sample_spans_run.items()}
+        self.timers["level_control"] = PeriodicTimer(self.lc_span, "level_control")
 
         # 初始化PID控制器
         # # 增大 Kp：加快系统响应速度，但可能引起振荡
@@ -86,89 +145,186 @@ class ChromSys:
         # 初始化模糊控制器
         self.level_controller = FuzzyController()
 
-    # 传输光谱数据到数据库
-    async def send_spectral(self, wavelengths, absorbance, table):
-        keys_list = wavelengths.tolist()
-        values_list = absorbance.tolist()
-        data_dict = dict(zip(keys_list, values_list))
-        json_data = json.dumps(data_dict)
+    @property
+    def running(self):
+        return self._running
+
+    @running.setter
+    def running(self, value):
+        self._running = value
+        self.notify_sampling_changed()
+
+    @property
+    def sampleSpan_run(self):
+        """实验时光谱采样间隔s，设置时同时修改紫外和近红外的采样间隔"""
+        return max(self.sample_spans_run["uv"], self.sample_spans_run["nir"])
+
+    @sampleSpan_run.setter
+    def sampleSpan_run(self, value):
+        check_span(value)
+        self.sample_spans_run["uv"] = self.sample_spans_run["nir"] = value
+        self.notify_sampling_changed()
+
+    @property
+    def sampleSpan_stop(self):
+        return self._sampleSpan_stop
+
+    @sampleSpan_stop.setter
+    def sampleSpan_stop(self, value):
+        check_span(value)
+        self._sampleSpan_stop = value
+        self.notify_sampling_changed()
+
+    @property
+    def lc_span(self):
+        return self._lc_span
+
+    @lc_span.setter
+    def lc_span(self, value):
+        check_span(value)
+        self._lc_span = value
+
+    def set_sample_spans_run(self, spans):
+        """
+        设置实验时各仪器的采样间隔
+        :param spans: {仪器: 采样间隔s}，仪器为 sensor、uv、nir
+        """
+        unknown = set(spans) - set(self.sample_spans_run)
+        if unknown:
+            raise ValueError(f"未知仪器: {', '.join(sorted(unknown))}")
+        for span in spans.values():
+            check_span(span)
+        self.sample_spans_run.update(spans)
+        self.notify_sampling_changed()
+
+    @property
+    def pca_components(self):
+        return self._pca_components
+
+    @pca_components.setter
+    def pca_components(self, value):
+        self._pca_components = value
+        self.equilibrium_monitor.set_components(value)
+
+    def set_spectral_roi(self, name, ranges=None, bin_size=1):
+        """
+        设置光谱仪的感兴趣区域与像素合并，光谱维度变化，清空该仪器的时间窗口和平衡判断的统计量
+        :param name: 仪器，uv、nir
+        :param ranges: 波长范围列表 [(起始波长nm, 结束波长nm), ...]，为None时保留全部像素
+        :param bin_size: 合并像素数
+        """
+        self.spectral_controllers[name].set_roi(ranges, bin_size)
+        self.sample_windows[name].clear()
+        self.equilibrium_monitor.reset()
 
-        async with AsyncDBSession() as session:
-            try:
-                if table == "uv":
-                    sql = text("INSERT INTO UVs (data, experiment_id) VALUES (:json_data, :experiment_id)")
-                elif table == "nir":
-                    sql = text("INSERT INTO NIRs (data, experiment_id) VALUES (:json_data, :experiment_id)")
-                else:
-                    raise ValueError("Table must be either uv or nir")
+    def set_equilibrium_check_span(self, minutes):
+        self.equilibriumCheckSpan = minutes
+        for window in self.sample_windows.values():
+            window.span = minutes * 60
+        self.equilibrium_monitor.span = minutes * 60
 
-                await session.execute(sql, {"json_data": json_data, "experiment_id": self.experiment_id})
-                await session.commit()
-            except Exception as e:
-                print(f"传输光谱数据到数据库错误: {e}")
-                await session.rollback()
+    def notify_sampling_changed(self):
+        """唤醒正在等待下一采样时刻的采集任务，立即按新的采样间隔重新调度"""
+        self.sampling_changed.notify()
 
-    # 传输传感器数据到数据库
-    async def send_sensor(self, sensor_data):
-        json_data = json.dumps(sensor_data, indent=4)
-        async with AsyncDBSession() as session:
-            try:
-                sql = text("INSERT INTO Sensors (data, experiment_id) VALUES (:sensor_data, :experiment_id)")
-                await session.execute(sql, {"sensor_data": json_data, "experiment_id": self.experiment_id})
-                await session.commit()
-            except Exception as e:
-                print(f"传输传感器数据到数据库错误: {e}")
-                await session.rollback()
+    def sample_period(self, name):
+        return self.sample_spans_run[name] if self.running else self.sampleSpan_stop
 
-    # 采集数据
-    async def start_data_collection(self):
-        while True:
-            try:
-                # 并发采集传感器、紫外、近红外数据
-                sensor_task = asyncio.to_thread(self.sensor_controller.read_all_sensors)
-                uv_task = asyncio.to_thread(self.uv_controller.get_absorbance)
-                nir_task = asyncio.to_thread(self.nir_controller.get_absorbance)
-
-                # 等待所有采集任务完成
-                sensor_data, uv_absorbance, nir_absorbance = await asyncio.gather(
-                    sensor_task,
-                    uv_task,
-                    nir_task
-                )
+    def scheduler_stats(self):
+        """各采集任务和液位控制的调度统计：触发抖动、超时次数等"""
+        return {name: timer.stats() for name, timer in self.timers.items()}
+
+    # 保存光谱数据：先写入本地分段存储，由后台写入任务复制到数据库，吸光度以float32二进制保存
+    async def send_spectral(self, wavelengths, absorbance, table, timestamp=None):
+        try:
+            if table == "uv":
+                table_name = "UVs"
+            elif table == "nir":
+                table_name = "NIRs"
+            else:
+                raise ValueError("Table must be either uv or nir")
+
+            blob, axis_hash = encode_wavelengths(wavelengths)
+            self.db_writer.register_axis(axis_hash, blob)
+            self.sample_stores[table_name].append(pack_spectrum(self.experiment_id, axis_hash, absorbance),
+                                                 timestamp or time.time())
+        except Exception as e:
+            print(f"保存光谱数据错误: {e}")
 
-                # 存储采集数据
-                self.sensor_datas.append(sensor_data)
-                self.uv_datas.append(uv_absorbance)
-                self.nir_datas.append(nir_absorbance)
+    # 保存传感器数据：先写入本地分段存储，由后台写入任务复制到数据库
+    async def send_sensor(self, sensor_data, timestamp=None):
+        try:
+            json_data = json.dumps(sensor_data, indent=4)
+            self.sample_stores["Sensors"].append(pack_sensor(self.experiment_id, json_data), timestamp or time.time())
+        except Exception as e:
+            print(f"保存传感器数据错误: {e}")
 
-                # 并发发送数据到数据库
-                send_tasks = [
-                    self.send_sensor(sensor_data),
-                    self.send_spectral(self.uv_wavelengths, uv_absorbance, 'uv'),
-                    self.send_spectral(self.nir_wavelengths, nir_absorbance, 'nir')
-                ]
-                await asyncio.gather(*send_tasks)
+    # 采集数据：传感器、紫外、近红外各自独立按采样间隔采集，慢设备不拖慢其他设备
+    async def start_data_collection(self):
+        await asyncio.gather(
+            self.acquisition_loop("sensor", self.sensor_controller.read_all_sensors),
+            self.acquisition_loop("uv", self.uv_controller.get_absorbance),
+            self.acquisition_loop("nir", self.nir_controller.get_absorbance),
+        )
 
+    async def acquisition_loop(self, name, read):
+        """
+        单个仪器的采集任务，由 PeriodicTimer 按绝对截止时间调度，采集和保存耗时不累积为漂移；
+        实验启停或采样间隔修改后立即采集并以此为新的起点
+        :param name: 仪器，sensor、uv、nir
+        :param read: 阻塞的采集函数，在线程中执行
+        """
+        timer = self.timers[name]
+        timer.reset()
+        while True:
+            changed = self.sampling_changed.event
+            try:
+                timestamp = time.time()
+                data = await asyncio.to_thread(read)
+                if name == "sensor":
+                    self.sample_windows[name].append(timestamp, data)
+                    await self.send_sensor(data, timestamp)
+                else:
+                    await self.save_spectrum(name, timestamp, data)
             except Exception as e:
-                print(f"数据采集发生错误: {e}")
-            finally:
-                running = self.running
-                ssr = self.sampleSpan_run
-                sss = self.sampleSpan_stop
-
-                res_time = self.sampleSpan_run if self.running else self.sampleSpan_stop
-                while res_time > 0:
-                    await asyncio.sleep(1)
-                    res_time -= 1
-                    if running != self.running or ssr != self.sampleSpan_run or sss != self.sampleSpan_stop:
-                        break
+                print(f"{name}数据采集发生错误: {e}")
+            try:
+                await timer.wait(self.sample_period(name), changed)
+            except Exception as e:
+                # 采样间隔异常时不结束采集任务，按1s间隔重试直到间隔被修正
+                print(f"{name}采集调度发生错误: {e}")
+                await asyncio.sleep(1)
+
+    async def save_spectrum(self, name, timestamp, absorbance):
+        """保存一条ROI内合并后的光谱，开启原始光谱冷存储时同时保存全部像素的吸光度"""
+        controller = self.spectral_controllers[name]
+        if absorbance is None:
+            return
+        if len(absorbance) != len(controller.roi):
+            return  # 采集期间修改了ROI，丢弃这条光谱
+        self.sample_windows[name].append(timestamp, absorbance)
+        if name == "uv":
+            self._update_equilibrium_monitor(timestamp, absorbance)
+        await self.send_spectral(controller.get_roi_wavelengths(), absorbance, name, timestamp)
+        if self.raw_spectra_store:
+            try:
+                wavelengths = self.uv_wavelengths if name == "uv" else self.nir_wavelengths
+                blob, axis_hash = encode_wavelengths(wavelengths)
+                self.db_writer.register_axis(axis_hash, blob)
+                self.raw_stores[name].append(pack_spectrum(self.experiment_id, axis_hash, controller.absorbance_data),
+                                            timestamp)
+            except Exception as e:
+                print(f"保存原始光谱数据错误: {e}")
 
     # 根据液面高度，控制出口泵的转速，使得液面维持在一定高度
     async def level_control(self, target_level):
         # self.level_controller.reset()
         self.level_controller.set_target_level(target_level * 10)
+        timer = self.timers["level_control"]
+        timer.reset()
         while True:
             if self.running:
+                changed = self.sampling_changed.event
                 try:
                     # 读取当前液位
                     current_level = await asyncio.to_thread(self.sensor_controller.read_level)
@@ -190,30 +346,26 @@ class ChromSys:
 
                 except Exception as e:
                     print(f"液位控制错误: {e}")
-                finally:
-                    await asyncio.sleep(self.lc_span)
+                # 实验停止时立即结束，液位控制间隔的修改在下一周期生效
+                try:
+                    await timer.wait(self.lc_span, changed)
+                except Exception as e:
+                    print(f"液位控制调度错误: {e}")
+                    await asyncio.sleep(1)
             else:
                 break
 
     # 根据传感器数据判断是否平衡
     async def check_equilibrium(self, stage):
         """根据时间窗口中的传感器和光谱数据判断流出液是否达到平衡"""
-        # 检查数据点数量是否足够，不足则直接返回
-        if not all(len(data) == self.max_data_points for data in [
-            self.sensor_datas,
-            self.uv_datas,
-            self.nir_datas
-        ]):
+        if not self._equilibrium_window_covered():
             print("数据点数量不足，无法进行平衡判断")
             return False
-        # 提取传感器值
-        ph_values = [data['ph']['value'] for data in self.sensor_datas]
-        orp_values = [data['orp']['value'] for data in self.sensor_datas]
-        conductivity_values = [data['conductivity']['value'] for data in self.sensor_datas]
+        monitor = self.equilibrium_monitor
 
         # 阶段约束检查（按传感器单独记录）
         sensor_constraint_ok = {}
-        sensor_data = self.sensor_datas[-1]  # 取最新传感器数据
+        sensor_data = monitor.latest_sensor  # 取最新传感器数据
         for sensor_type, (min_val, max_val) in self.stage_constraints[stage].items():
             value = sensor_data[sensor_type]['value']
             ok = min_val <= value <= max_val
@@ -222,11 +374,7 @@ class ChromSys:
                 print(f"{stage}阶段: {sensor_type}值{value}不在范围[{min_val}, {max_val}]内")
 
         # 传感器稳定性检测
-        sensor_stable = {
-            'ph': self._check_sensor_stability(ph_values, 'ph'),
-            'orp': self._check_sensor_stability(orp_values, 'orp'),
-            'conductivity': self._check_sensor_stability(conductivity_values, 'conductivity')
-        }
+        sensor_stable = {name: self._check_sensor_stability(stats, name) for name, stats in monitor.sensors.items()}
 
         # 记录传感器状态（合并稳定性和约束检查结果，orp无约束）
         for name, stable in sensor_stable.items():
@@ -245,8 +393,8 @@ class ChromSys:
         print(logs)
 
         # 光谱稳定性检测
-        uv_stable = self._check_spectral_stability(np.array(self.uv_datas), "UV")
-        nir_stable = self._check_spectral_stability(np.array(self.nir_datas), "NIR")
+        uv_stable = self._check_spectral_stability(monitor.spectra["uv"], "UV")
+        nir_stable = self._check_spectral_stability(monitor.spectra["nir"], "NIR")
 
         # 记录光谱状态
         self.equilibrium_status["spectra"]["uv"] = bool(uv_stable)
@@ -265,13 +413,29 @@ class ChromSys:
         print(f"系统平衡状态: {'已达到平衡' if equilibrium_reached else '未达到平衡'}")
         return equilibrium_reached
 
-    def _check_sensor_stability(self, values, sensor_name):
-        """检查单个传感器的稳定性"""
+    def _update_equilibrium_monitor(self, timestamp, uv_absorbance):
+        """以紫外光谱采集时刻为基准，传感器和近红外取该时刻之前最新的一次数据，使趋势斜率仍按光谱采样点计算"""
+        sensor_window, nir_window = self.sample_windows["sensor"], self.sample_windows["nir"]
+        if sensor_window.latest() is None or nir_window.latest() is None:
+            return
+        self.equilibrium_monitor.add(timestamp, sensor_window.at(timestamp), uv_absorbance, nir_window.at(timestamp))
+
+    def _equilibrium_window_covered(self):
+        """窗口开始后一个采样间隔内应有数据，否则认为数据尚未覆盖整个检查窗口"""
+        monitor = self.equilibrium_monitor
+        if len(monitor) == 0:
+            return False
+        start = monitor.timestamps[-1] - self.equilibriumCheckSpan * 60
+        return monitor.earliest() <= start + self.sample_spans_run["uv"] and all(
+            window.earliest() <= start + self.sample_spans_run[name] for name, window in self.sample_windows.items())
+
+    def _check_sensor_stability(self, stats, sensor_name):
+        """检查单个传感器的稳定性，stats为窗口内的滑动统计量"""
         thresholds = self.sensor_thresholds[sensor_name]
 
         # 计算统计量
-        std_val = np.std(values)
-        mean_val = np.mean(values)
+        std_val = stats.std()
+        mean_val = stats.mean()
 
         # 量程自适应阈值检测
         if abs(mean_val) < 1:
@@ -280,55 +444,31 @@ class ChromSys:
             stable = (std_val / abs(mean_val)) < thresholds['rel']
 
         # 趋势检测（线性回归斜率）
-        if len(values) >= 5:
-            slope = self._calculate_slope(values)
+        if len(stats) >= 5:
+            slope = stats.slope()
             stable = stable and (abs(slope) < thresholds['slope'])
 
         return stable
 
-    def _check_spectral_stability(self, spectral_data, spectral_type):
-        """使用PCA方法检测光谱稳定性"""
+    def _check_spectral_stability(self, tracker, spectral_type):
+        """使用PCA方法检测光谱稳定性：窗口内各主成分得分的相对标准差（得分均值为0时为标准差）不超过阈值"""
         # 数据量检查
-        if spectral_data.shape[0] < self.pca_components + 1:
-            print(f"{spectral_type}光谱数据不足({spectral_data.shape[0]}点)，无法进行PCA分析")
+        if len(tracker) < self.pca_components + 1:
+            print(f"{spectral_type}光谱数据不足({len(tracker)}点)，无法进行PCA分析")
             return False
 
-        # 创建PCA模型并转换数据
-        pca = PCA(n_components=self.pca_components)
-        scores = pca.fit_transform(spectral_data)
-
-        for i in range(scores.shape[1]):
-            comp_values = scores[:, i]
-            mean_val = np.mean(comp_values)
-            std_val = np.std(comp_values)
-
-            # 避免除以零
-            if abs(mean_val) < 1e-5:
-                rsd = std_val
-            else:
-                rsd = std_val / abs(mean_val)
-
+        for i, std_val in enumerate(tracker.component_std):
+            # 中心化后的得分均值为0，相对标准差即标准差
+            rsd = std_val
             if rsd > self.spectral_threshold:
                 print(f"{spectral_type}光谱主成分{i + 1}不稳定(RSD={rsd:.4f} > {self.spectral_threshold})")
                 return False
 
         return True
 
-    def _calculate_slope(self, values):
-        """计算时间序列的线性趋势斜率"""
-        x = np.arange(len(values))
-        return np.polyfit(x, values, 1)[0]  # 返回线性系数
-
     # 发送日志
     async def send_log(self, content):
-        async with AsyncDBSession() as session:
-            try:
-                sql = text("INSERT INTO Logs (content, experiment_id) VALUES (:content, :experiment_id)")
-                await session.execute(sql, {"content": content, "experiment_id": self.experiment_id})
-                await session.commit()
-            except Exception as e:
-                print(f"发送日志到数据库错误: {e}")
-                await session.rollback()
+        await self.db_writer.put("Logs", {"content": content, "experiment_id": self.experiment_id})
 
     # 添加运行实验协程到事件循环
     async def run_experiment(self, experiment_record):
@@ -481,7 +621,7 @@ class ChromSys:
 
     # 删除指定实验ID的相关数据
     async def delete_experiment_data(self, experiment_id):
-        tables = ['Sensors', 'UVs', 'NIRs', 'Logs']
+        tables = ['Sensors', 'UVs', 'NIRs', 'SpectrumAxes', 'Logs']
         async with AsyncDBSession() as session:
             try:
                 for table in tables:
@@ -491,6 +631,9 @@ class ChromSys:
             except Exception as e:
                 print(f"删除实验 {experiment_id} 相关数据时出错: {e}")
                 await session.rollback()
+                return
+        # 已删除的波长轴ID不能再被新数据引用，尚未写入的旧数据也一并丢弃
+        self.db_writer.forget_experiment(experiment_id)
 
     # 更新实验记录的开始或结束时间为当前时间
     async def update_experiment_time(self, state: bool | None = True):
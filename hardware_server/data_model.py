@@ -10,12 +10,14 @@ class UvType(str, Enum):
     TYPE_C = "integration_time"  # 积分时间
     TYPE_D = "set_background"  # 设置暗背景
     TYPE_E = "set_reference"  # 设置参比
+    TYPE_F = "roi"  # 感兴趣区域与像素合并，如 {"ranges": [[200, 400]], "bin_size": 2}
 
 
 class NirType(str, Enum):
     TYPE_A = "average_times"  # 平均次数
     TYPE_B = "set_background"  # 设置暗背景
     TYPE_C = "set_reference"  # 设置参比
+    TYPE_D = "roi"  # 感兴趣区域与像素合并，如 {"ranges": [[950, 1650]], "bin_size": 2}
 
 
 class SystemType(str, Enum):
@@ -43,12 +45,12 @@ class System(BaseModel):
 
 class Uv(BaseModel):
     type: UvType
-    value: int | bool | None = None
+    value: int | bool | dict | None = None
 
 
 class Nir(BaseModel):
     type: NirType
-    value: int | None = None
+    value: int | dict | None = None
 
 
 class Pump(BaseModel):
@@ -72,6 +74,8 @@ class SystemParamsType(str, Enum):
     TYPE_F = "stage_constraints"  # 阶段约束
     TYPE_G = "spectral_threshold"  # 光谱阈值
     TYPE_H = "pca_components"  # PCA主成分数量
+    TYPE_I = "sample_spans_run"  # 实验时各仪器采样间隔，如 {"sensor": 1, "uv": 5, "nir": 5}
+    TYPE_J = "raw_spectra_store"  # 是否在本地冷存储中保存原始光谱（全部像素）
 
 
 class SystemParams(BaseModel):
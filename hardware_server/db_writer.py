@@ -0,0 +1,320 @@
+import asyncio
+import base64
+import json
+import os
+import struct
+import time
+from datetime import datetime
+
+import numpy as np
+from sqlalchemy import text
+
+from mysql import AsyncDBSession, encode_spectrum
+
+# 各表批量插入的列，time在入队时记录，避免批量写入、溢出补写改变数据时间
+TABLE_COLUMNS = {
+    "Sensors": ("time", "experiment_id", "data"),
+    "Logs": ("time", "experiment_id", "content"),
+    "UVs": ("time", "experiment_id", "spectrum", "encoding", "axis_id"),
+    "NIRs": ("time", "experiment_id", "spectrum", "encoding", "axis_id"),
+}
+SPECTRUM_TABLES = {"UVs": "uv", "NIRs": "nir"}
+
+# 本地分段存储（SegmentStore）中的记录格式
+SPECTRUM_RECORD = struct.Struct("<i32s")  # 实验ID, 波长轴sha256摘要；其后为float32小端序吸光度
+SENSOR_RECORD = struct.Struct("<i")  # 实验ID；其后为传感器数据JSON
+
+
+def pack_spectrum(experiment_id, axis_hash, absorbance):
+    return SPECTRUM_RECORD.pack(experiment_id, bytes.fromhex(axis_hash)) + \
+        np.ascontiguousarray(absorbance, dtype='<f4').tobytes()
+
+
+def unpack_spectrum(timestamp, payload):
+    experiment_id, axis_hash = SPECTRUM_RECORD.unpack_from(payload)
+    spectrum, encoding = encode_spectrum(np.frombuffer(payload, dtype='<f4', offset=SPECTRUM_RECORD.size))
+    return {"time": datetime.fromtimestamp(timestamp), "experiment_id": experiment_id, "spectrum": spectrum,
+            "encoding": encoding, "axis_hash": axis_hash.hex()}
+
+
+def pack_sensor(experiment_id, json_data):
+    return SENSOR_RECORD.pack(experiment_id) + json_data.encode("utf-8")
+
+
+def unpack_sensor(timestamp, payload):
+    experiment_id, = SENSOR_RECORD.unpack_from(payload)
+    return {"time": datetime.fromtimestamp(timestamp), "experiment_id": experiment_id,
+            "data": payload[SENSOR_RECORD.size:].decode("utf-8")}
+
+
+class DBWriter:
+    def __init__(self, max_queue=2000, batch_size=100, flush_interval=2.0, retry_interval=30, spill_path=None,
+                 axes_dir=None):
+        """
+        后台数据库写入任务：日志等数据先进入有界队列，采集数据先写入本地分段存储（见 add_store），
+        按批量大小或时间间隔合并，每张表一条executemany插入，所有表在同一事务中提交，数据采集不再等待数据库。
+        队列满时 put 等待（背压）；数据库不可用时队列数据追加到本地溢出文件，分段存储保留未复制的记录，
+        恢复后按retry_interval重试补写，分段存储从持久化的复制进度继续
+        :param max_queue: 队列最大长度
+        :param batch_size: 单批最大行数（每个分段存储单批也最多读取batch_size条）
+        :param flush_interval: 单批最长等待时间s
+        :param retry_interval: 数据库不可用时重试连接的间隔s
+        :param spill_path: 溢出文件路径，默认为本目录下的 db_spill.jsonl
+        :param axes_dir: 波长轴文件目录，分段存储中的光谱记录只保存波长轴摘要，默认为本目录下的 sample_store/axes
+        """
+        base_dir = os.path.dirname(os.path.abspath(__file__))
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retry_interval = retry_interval
+        self.spill_path = spill_path or os.path.join(base_dir, "db_spill.jsonl")
+        self.axes_dir = axes_dir or os.path.join(base_dir, "sample_store", "axes")
+        self.axes = {}  # {波长轴摘要: 波长轴二进制数据}
+        self.axis_ids = {}  # {(实验ID, 仪器, 波长轴摘要): SpectrumAxes.ID}
+        self.spilled_axes = set()  # 已写入溢出文件的波长轴
+        self.forgotten = {}  # {实验ID: (删除时刻, 删除时的入队计数)}，此前产生的该实验数据不再写入
+        self._put_count = 0  # 调用 put 的次数（含等待入队的）
+        self._taken_count = 0  # 从队列取出的数据条数
+        self.stores = []  # [(表名, SegmentStore, 记录解码函数)]
+        self.task = None
+        self.db_ok = True
+        self._last_retry = 0.0
+
+    def start(self):
+        self.task = asyncio.create_task(self.run())
+
+    async def close(self):
+        """写完队列中剩余数据后结束后台任务"""
+        if self.task is not None:
+            await self.queue.put(None)
+            await self.task
+            self.task = None
+        for _, store, _ in self.stores:
+            store.close()
+
+    def add_store(self, table, store, decode):
+        """
+        注册本地分段存储，其中未复制的记录会被写入table
+        :param table: 表名，见 TABLE_COLUMNS
+        :param store: SegmentStore
+        :param decode: 记录解码函数 (时间戳, 数据) -> 行数据，如 unpack_spectrum
+        """
+        self.stores.append((table, store, decode))
+
+    def register_axis(self, axis_hash, blob):
+        """登记光谱行引用的波长轴并保存到axes_dir，写入时按需插入 SpectrumAxes 表"""
+        if axis_hash in self.axes:
+            return
+        self.axes[axis_hash] = blob
+        path = os.path.join(self.axes_dir, f"{axis_hash}.bin")
+        if not os.path.exists(path):
+            os.makedirs(self.axes_dir, exist_ok=True)
+            with open(f"{path}.tmp", "wb") as f:
+                f.write(blob)
+            os.replace(f"{path}.tmp", path)
+
+    def _axis_blob(self, axis_hash):
+        if axis_hash not in self.axes:
+            with open(os.path.join(self.axes_dir, f"{axis_hash}.bin"), "rb") as f:
+                self.axes[axis_hash] = f.read()
+        return self.axes[axis_hash]
+
+    def forget_experiment(self, experiment_id):
+        """
+        实验数据从数据库删除后调用：清除该实验的波长轴ID缓存（对应的 SpectrumAxes 行已删除），
+        队列、溢出文件和分段存储中删除时刻之前产生的该实验数据在写入时丢弃，这些数据全部处理完后移除记录（见 _prune_forgotten）
+        """
+        self.axis_ids = {key: axis_id for key, axis_id in self.axis_ids.items() if key[0] != experiment_id}
+        self.forgotten[experiment_id] = (datetime.now(), self._put_count)
+
+    def _is_forgotten(self, row):
+        forgotten = self.forgotten.get(row["experiment_id"])
+        return forgotten is not None and row["time"] <= forgotten[0]
+
+    def _prune_forgotten(self, oldest_pending):
+        """
+        成功写入后调用：删除前入队的数据已全部取出、溢出文件已补写完、分段存储中未复制的记录都晚于删除时刻时，
+        不会再遇到该实验被删除前的数据，移除其记录
+        :param oldest_pending: 各分段存储中最早的未复制记录的时间，没有时为None
+        """
+        if os.path.exists(self.spill_path):
+            return
+        for experiment_id, (deleted_at, put_count) in list(self.forgotten.items()):
+            if self._taken_count >= put_count and (oldest_pending is None or oldest_pending > deleted_at):
+                del self.forgotten[experiment_id]
+
+    async def put(self, table, row):
+        """
+        加入写入队列，队列满时等待
+        :param table: 表名，见 TABLE_COLUMNS
+        :param row: 行数据，光谱表用 axis_hash 代替 axis_id
+        """
+        row.setdefault("time", datetime.now())
+        self._put_count += 1
+        await self.queue.put((table, row))
+
+    def store_backlog(self):
+        """分段存储中积压了一批以上的数据且数据库可用时不等待，连续补写"""
+        return self.db_ok and any(store.pending() >= self.batch_size for _, store, _ in self.stores)
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        stop = False
+        while not stop:
+            batch = []
+            deadline = loop.time() + (0 if self.store_backlog() else self.flush_interval)
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                try:
+                    if timeout > 0:
+                        item = await asyncio.wait_for(self.queue.get(), timeout)
+                    else:
+                        item = self.queue.get_nowait()
+                except (asyncio.TimeoutError, asyncio.QueueEmpty):
+                    break
+                if item is None:
+                    stop = True
+                    break
+                self._taken_count += 1
+                batch.append(item)
+            if batch or any(store.pending() > 0 for _, store, _ in self.stores):
+                await self.flush(batch)
+
+    async def flush(self, batch):
+        if self.forgotten:
+            batch = [(table, row) for table, row in batch if not self._is_forgotten(row)]
+        if not self.db_ok and time.monotonic() - self._last_retry < self.retry_interval:
+            # 数据库不可用期间直接追加到溢出文件，不阻塞等待连接超时
+            if batch:
+                await asyncio.to_thread(self.spill, batch)
+            return
+        # 文件读写、msync/fsync和光谱压缩在线程中执行，不占用事件循环，避免干扰采集任务的调度
+        replay = await asyncio.to_thread(self.load_spill) if os.path.exists(self.spill_path) else []
+        store_rows, commits = await asyncio.to_thread(self.read_stores)
+
+        rows = replay + batch + store_rows
+        if self.forgotten:
+            rows = [(table, row) for table, row in rows if not self._is_forgotten(row)]
+        try:
+            await self.write(rows)
+        except Exception as e:
+            print(f"批量写入数据库错误: {e}，{len(batch)}条队列数据写入本地溢出文件，"
+                  f"{len(store_rows)}条采集数据保留在本地分段存储中")
+            self.db_ok = False
+            self._last_retry = time.monotonic()
+            if batch:
+                await asyncio.to_thread(self.spill, batch)  # 补写失败时溢出文件保持不变，只追加本批数据
+            return
+        self.db_ok = True
+        oldest_pending = await asyncio.to_thread(self.commit_stores, commits)
+        if replay:
+            os.remove(self.spill_path)
+            self.spilled_axes.clear()
+            print(f"已补写溢出文件中的{len(replay)}条数据")
+        if self.forgotten:
+            self._prune_forgotten(oldest_pending)
+
+    def read_stores(self):
+        """
+        读取各分段存储中未复制的记录并解码
+        :return: 行数据 [(表名, 行)] 和各存储的复制进度 [(SegmentStore, 下一条序号)]
+        """
+        store_rows = []
+        commits = []
+        for table, store, decode in self.stores:
+            store.sync()
+            records = store.read(store.offset, self.batch_size)
+            if records:
+                store_rows.extend((table, decode(timestamp, payload)) for _, timestamp, payload in records)
+                commits.append((store, records[-1][0] + 1))
+        return store_rows, commits
+
+    def commit_stores(self, commits):
+        """
+        记录各分段存储的复制进度
+        :return: 提交后各存储中最早的未复制记录的时间，没有时为None
+        """
+        for store, next_seq in commits:
+            store.commit(next_seq)
+        pending = [records[0][1] for records in (store.read(store.offset, 1) for _, store, _ in self.stores) if records]
+        return datetime.fromtimestamp(min(pending)) if pending else None
+
+    async def write(self, rows):
+        """按表合并为executemany插入，在同一事务中提交"""
+        grouped = {}
+        for table, row in rows:
+            grouped.setdefault(table, []).append(row)
+        async with AsyncDBSession() as session:
+            try:
+                for table, table_rows in grouped.items():
+                    if table in SPECTRUM_TABLES:
+                        for row in table_rows:
+                            row["axis_id"] = await self.get_axis_id(session, row["experiment_id"],
+                                                                    SPECTRUM_TABLES[table], row["axis_hash"])
+                    columns = TABLE_COLUMNS[table]
+                    sql = text(f"INSERT INTO {table} ({', '.join(columns)}) "
+                               f"VALUES ({', '.join(':' + column for column in columns)})")
+                    await session.execute(sql, [{column: row[column] for column in columns} for row in table_rows])
+                await session.commit()
+            except Exception:
+                await session.rollback()
+                # 回滚后本事务新插入的波长轴不存在，清除缓存以便重新插入
+                self.axis_ids.clear()
+                raise
+
+    async def get_axis_id(self, session, experiment_id, instrument, axis_hash):
+        """获取波长轴ID，同一实验同一仪器标定的波长轴只保存一次"""
+        key = (experiment_id, instrument, axis_hash)
+        if key in self.axis_ids:
+            return self.axis_ids[key]
+
+        params = {"experiment_id": experiment_id, "instrument": instrument, "axis_hash": axis_hash}
+        result = await session.execute(text(
+            "SELECT ID FROM SpectrumAxes "
+            "WHERE experiment_id = :experiment_id AND instrument = :instrument AND axis_hash = :axis_hash"
+        ), params)
+        axis_id = result.scalar()
+        if axis_id is None:
+            result = await session.execute(text(
+                "INSERT INTO SpectrumAxes (experiment_id, instrument, axis_hash, wavelengths) "
+                "VALUES (:experiment_id, :instrument, :axis_hash, :wavelengths)"
+            ), {**params, "wavelengths": self._axis_blob(axis_hash)})
+            axis_id = result.lastrowid
+        self.axis_ids[key] = axis_id
+        return axis_id
+
+    def spill(self, batch):
+        """将数据追加到溢出文件（JSON Lines），二进制数据base64编码，光谱行引用的波长轴在文件中首次出现前写入"""
+        with open(self.spill_path, "a", encoding="utf-8") as f:
+            for table, row in batch:
+                axis_hash = row.get("axis_hash")
+                if axis_hash is not None and axis_hash not in self.spilled_axes:
+                    f.write(json.dumps({"axis": axis_hash,
+                                        "wavelengths": base64.b64encode(self._axis_blob(axis_hash)).decode()}) + "\n")
+                    self.spilled_axes.add(axis_hash)
+                record = {key: value for key, value in row.items() if key != "axis_id"}
+                record["time"] = row["time"].isoformat()
+                if "spectrum" in record:
+                    record["spectrum"] = base64.b64encode(record["spectrum"]).decode()
+                f.write(json.dumps({"table": table, "row": record}, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def load_spill(self):
+        """读取溢出文件中的数据，损坏的行（如断电时写了一半）跳过"""
+        rows = []
+        with open(self.spill_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if "axis" in record:
+                    self.axes[record["axis"]] = base64.b64decode(record["wavelengths"])
+                    continue
+                row = record["row"]
+                row["time"] = datetime.fromisoformat(row["time"])
+                if "spectrum" in row:
+                    row["spectrum"] = base64.b64decode(row["spectrum"])
+                rows.append((record["table"], row))
+        return rows
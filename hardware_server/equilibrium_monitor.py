@@ -0,0 +1,193 @@
+import math
+from collections import deque
+
+import numpy as np
+
+
+class RollingStats:
+    def __init__(self):
+        """
+        滑动窗口内序列的均值、标准差和线性回归斜率（自变量为窗口内的采样序号0..n-1），追加和移出均为O(1)。
+        移出最早的数据时其余数据序号整体减1，Σxy相应减去Σy；每移出一个窗口长度的数据按保存的数据重新求和，消除累积误差
+        """
+        self.values = deque()
+        self.sum = 0.0
+        self.sum_sq = 0.0
+        self.sum_xy = 0.0
+        self._removed = 0
+
+    def __len__(self):
+        return len(self.values)
+
+    def append(self, value):
+        self.sum_xy += len(self.values) * value
+        self.values.append(value)
+        self.sum += value
+        self.sum_sq += value * value
+
+    def popleft(self):
+        value = self.values.popleft()
+        self.sum -= value
+        self.sum_sq -= value * value
+        self.sum_xy -= self.sum  # 剩余数据序号减1
+        self._removed += 1
+        if self._removed >= len(self.values):
+            self._recompute()
+
+    def _recompute(self):
+        values = np.asarray(self.values, dtype=float)
+        self.sum = float(values.sum())
+        self.sum_sq = float(values @ values)
+        self.sum_xy = float(np.arange(len(values)) @ values)
+        self._removed = 0
+
+    def mean(self):
+        return self.sum / len(self.values)
+
+    def std(self):
+        """总体标准差，与 np.std 一致"""
+        mean = self.mean()
+        return math.sqrt(max(self.sum_sq / len(self.values) - mean * mean, 0.0))
+
+    def slope(self):
+        """线性回归斜率，与 np.polyfit(np.arange(n), values, 1)[0] 一致"""
+        n = len(self.values)
+        if n < 2:
+            return 0.0
+        sum_x = n * (n - 1) / 2
+        return (n * self.sum_xy - sum_x * self.sum) / (n * n * (n * n - 1) / 12)
+
+
+class SpectralTracker:
+    def __init__(self, n_components, bin_size=1):
+        """
+        滑动窗口光谱的秩k主成分跟踪。主成分（重新）初始化时（首条光谱、光谱维度或主成分数量变化）对窗口做一次SVD得到精确结果，
+        之后每加入一条光谱做一次子空间迭代和Rayleigh-Ritz旋转（以上一次的主成分为初值），代价O(n·d·k)，
+        判断时直接读取缓存的各主成分得分标准差。窗口内光谱变化缓慢，每次迭代的初值已接近窗口的PCA结果
+        :param n_components: 主成分数量
+        :param bin_size: 波长合并点数，每bin_size个相邻波长求和后除以sqrt(bin_size)，平滑光谱的得分尺度与未合并时一致
+        """
+        self.n_components = n_components
+        self.bin_size = bin_size
+        self.data = None  # 窗口数据缓冲区，有效数据为 data[start:end]
+        self.start = 0
+        self.end = 0
+        self.sum = None
+        self.basis = None  # (d, k) 正交基
+        self.component_std = np.zeros(0)  # 各主成分得分的标准差（从大到小）
+
+    def __len__(self):
+        return self.end - self.start
+
+    def _bin(self, spectrum):
+        spectrum = np.asarray(spectrum, dtype=float)
+        if self.bin_size <= 1:
+            return spectrum
+        edges = np.arange(0, len(spectrum), self.bin_size)
+        counts = np.diff(np.append(edges, len(spectrum)))
+        return np.add.reduceat(spectrum, edges) / np.sqrt(counts)
+
+    def append(self, spectrum):
+        x = self._bin(spectrum)
+        if self.data is None or self.data.shape[1] != len(x):
+            self.data = np.empty((64, len(x)))
+            self.start = self.end = 0
+            self.sum = np.zeros(len(x))
+            self.basis = None
+        if self.end == len(self.data):
+            n = len(self)
+            if self.start < len(self.data) // 2:
+                grown = np.empty((2 * len(self.data), self.data.shape[1]))
+                grown[:n] = self.data[self.start:self.end]
+                self.data = grown
+            else:
+                self.data[:n] = self.data[self.start:self.end]
+            self.start, self.end = 0, n
+            self.sum = self.data[:n].sum(axis=0)  # 整理缓冲区时重新求和，消除累积误差
+        self.data[self.end] = x
+        self.end += 1
+        self.sum += x
+        self._update()
+
+    def popleft(self):
+        self.sum -= self.data[self.start]
+        self.start += 1
+
+    def set_components(self, n_components):
+        self.n_components = n_components
+        self.basis = None
+        self._update()
+
+    def _update(self):
+        n = len(self)
+        if self.data is None or n == 0:
+            self.component_std = np.zeros(0)
+            return
+        k = min(self.n_components, self.data.shape[1])
+        window = self.data[self.start:self.end]
+        mean = self.sum / n
+        if self.basis is None or self.basis.shape[1] != k:
+            # 随机初值只做一次迭代时低估次要主成分的方差，会过早判断为平衡，初始化时用窗口的SVD
+            # （窗口光谱数少于k时得到的主成分数不足k，之后每次加入光谱都重新SVD直到够k个）
+            _, _, vt = np.linalg.svd(window - mean, full_matrices=False)
+            self.basis = vt[:k].T
+        # 子空间迭代：Q <- orth(Xcᵀ Xc Q)
+        scores = window @ self.basis - mean @ self.basis
+        self.basis, _ = np.linalg.qr(window.T @ scores - np.outer(mean, scores.sum(axis=0)))
+        # Rayleigh-Ritz：在子空间内旋转到主成分方向，得到各主成分的方差
+        scores = window @ self.basis - mean @ self.basis
+        variances, vectors = np.linalg.eigh(scores.T @ scores / n)
+        order = np.argsort(variances)[::-1]
+        self.basis = self.basis @ vectors[:, order]
+        self.component_std = np.sqrt(np.clip(variances[order], 0, None))
+
+
+class EquilibriumMonitor:
+    def __init__(self, span, n_components, bin_size=1, sensors=('ph', 'orp', 'conductivity')):
+        """
+        平衡判断的增量统计：每个紫外光谱采样时刻加入一组按时间戳对齐的（传感器、紫外、近红外）数据，
+        维护时间窗口内各传感器的滑动统计量和光谱主成分，判断时为常数时间读取
+        :param span: 时间窗口s
+        :param n_components: 光谱主成分数量
+        :param bin_size: 光谱波长合并点数
+        :param sensors: 参与判断的传感器
+        """
+        self.span = span
+        self.n_components = n_components
+        self.bin_size = bin_size
+        self.sensor_names = sensors
+        self.reset()
+
+    def reset(self):
+        """清空窗口，如光谱ROI修改后维度变化时"""
+        self.timestamps = deque()
+        self.sensors = {name: RollingStats() for name in self.sensor_names}
+        self.spectra = {"uv": SpectralTracker(self.n_components, self.bin_size),
+                        "nir": SpectralTracker(self.n_components, self.bin_size)}
+        self.latest_sensor = None
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def earliest(self):
+        return self.timestamps[0] if self.timestamps else None
+
+    def add(self, timestamp, sensor_data, uv, nir):
+        values = {name: sensor_data[name]['value'] for name in self.sensors}  # 先取值，数据不完整时不改变窗口
+        while self.timestamps and self.timestamps[0] < timestamp - self.span:
+            self.timestamps.popleft()
+            for stats in self.sensors.values():
+                stats.popleft()
+            for tracker in self.spectra.values():
+                tracker.popleft()
+        self.timestamps.append(timestamp)
+        for name, stats in self.sensors.items():
+            stats.append(values[name])
+        self.spectra["uv"].append(uv)
+        self.spectra["nir"].append(nir)
+        self.latest_sensor = sensor_data
+
+    def set_components(self, n_components):
+        self.n_components = n_components
+        for tracker in self.spectra.values():
+            tracker.set_components(n_components)
@@ -3,7 +3,6 @@ import json
 import socket
 from contextlib import asynccontextmanager
 from typing import Optional
-from collections import deque
 import aiohttp
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
@@ -51,6 +50,8 @@ async def heartbeat_task(target_url: str, interval: int = 5):
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     chrom_sys = ChromSys()
+    # 启动数据库后台写入任务
+    chrom_sys.db_writer.start()
     # 启动数据收集任务
     data_collection_task = asyncio.create_task(chrom_sys.start_data_collection())
 
@@ -72,6 +73,12 @@ async def lifespan(app: FastAPI):
         await heartbeat_task_handle
     except asyncio.CancelledError:
         pass
+    # 写完队列中剩余的数据
+    await chrom_sys.db_writer.close()
+    for store in chrom_sys.raw_stores.values():
+        store.close()
+    if chrom_sys.simulator is not None:
+        chrom_sys.simulator.close()
 
 
 # 创建 FastAPI 应用并传入 lifespan 函数
@@ -122,11 +129,17 @@ async def control_uv(uv: Uv):
             chrom_sys.uv_controller.set_integration_time(uv.value * 1000)
             await chrom_sys.send_log(f"紫外积分时间设置为{uv.value}ms")
         elif uv.type == "set_background":
-            chrom_sys.uv_controller.set_background()
+            # 关灯等待和多次扫描平均在工作线程中执行，不阻塞事件循环
+            if not await asyncio.to_thread(chrom_sys.uv_controller.set_background):
+                raise RuntimeError("紫外暗背景采集失败")
             await chrom_sys.send_log("紫外暗背景设置成功")
         elif uv.type == "set_reference":
-            chrom_sys.uv_controller.set_reference()
+            if not await asyncio.to_thread(chrom_sys.uv_controller.set_reference):
+                raise RuntimeError("紫外参比采集失败")
             await chrom_sys.send_log("紫外参比设置成功")
+        elif uv.type == "roi":
+            chrom_sys.set_spectral_roi('uv', uv.value.get('ranges'), uv.value.get('bin_size', 1))
+            await chrom_sys.send_log(f"紫外ROI设置为{chrom_sys.uv_controller.roi.config()}")
     except Exception as e:
         await chrom_sys.send_log("紫外操作失败")
         print(e)
@@ -142,11 +155,16 @@ async def control_nir(nir: Nir):
             chrom_sys.nir_controller.set_avg_times(nir.value)
             await chrom_sys.send_log(f"红外平均次数设置为{nir.value}")
         elif nir.type == "set_background":
-            chrom_sys.nir_controller.set_background()
+            if not await asyncio.to_thread(chrom_sys.nir_controller.set_background):
+                raise RuntimeError("红外暗背景采集失败")
             await chrom_sys.send_log("红外暗背景设置成功")
         elif nir.type == "set_reference":
-            chrom_sys.nir_controller.set_reference()
+            if not await asyncio.to_thread(chrom_sys.nir_controller.set_reference):
+                raise RuntimeError("红外参比采集失败")
             await chrom_sys.send_log("红外参比设置成功")
+        elif nir.type == "roi":
+            chrom_sys.set_spectral_roi('nir', nir.value.get('ranges'), nir.value.get('bin_size', 1))
+            await chrom_sys.send_log(f"红外ROI设置为{chrom_sys.nir_controller.roi.config()}")
     except Exception as e:
         await chrom_sys.send_log("红外操作失败")
         print(e)
@@ -210,7 +228,9 @@ async def query_system_params():
         SystemParamsType.TYPE_E: chrom_sys.sensor_thresholds,
         SystemParamsType.TYPE_F: chrom_sys.stage_constraints,
         SystemParamsType.TYPE_G: chrom_sys.spectral_threshold,
-        SystemParamsType.TYPE_H: chrom_sys.pca_components
+        SystemParamsType.TYPE_H: chrom_sys.pca_components,
+        SystemParamsType.TYPE_I: chrom_sys.sample_spans_run,
+        SystemParamsType.TYPE_J: chrom_sys.raw_spectra_store
     }
 
     # 构建返回结果，使用枚举的value作为键
@@ -218,6 +238,12 @@ async def query_system_params():
     return result
 
 
+@app.get('/query/scheduler')
+async def query_scheduler_stats():
+    """查询各采集任务和液位控制的调度统计（触发抖动、超时次数等，时间单位s）"""
+    return app.state.chrom_sys.scheduler_stats()
+
+
 @app.post('/control/params')
 async def control_params(params: SystemParams):
     chrom_sys = app.state.chrom_sys
@@ -228,32 +254,17 @@ async def control_params(params: SystemParams):
         elif params.type == "sample_span_stop":
             chrom_sys.sampleSpan_stop = params.value
             await chrom_sys.send_log(f"非实验时采样间隔设置为 {params.value} 秒")
+        elif params.type == "sample_spans_run":
+            chrom_sys.set_sample_spans_run(params.value)
+            await chrom_sys.send_log(f"实验时各仪器采样间隔设置为 {chrom_sys.sample_spans_run} 秒")
+        elif params.type == "raw_spectra_store":
+            chrom_sys.raw_spectra_store = bool(params.value)
+            await chrom_sys.send_log(f"原始光谱冷存储{'开启' if chrom_sys.raw_spectra_store else '关闭'}")
         elif params.type == "lc_span":
             chrom_sys.lc_span = params.value
             await chrom_sys.send_log(f"液位控制间隔设置为 {params.value} 秒")
         elif params.type == "equilibrium_check_span":
-            chrom_sys.equilibriumCheckSpan = params.value
-            new_max_points = int(params.value * 60 / (chrom_sys.sampleSpan_run + 10))
-
-            # 处理传感器数据队列
-            current_sensor = list(chrom_sys.sensor_datas)
-            # 根据新长度截断或保留数据
-            adjusted_sensor = current_sensor[-new_max_points:] if new_max_points < len(
-                current_sensor) else current_sensor
-            chrom_sys.sensor_datas = deque(adjusted_sensor, maxlen=new_max_points)
-
-            # 处理UV数据队列
-            current_uv = list(chrom_sys.uv_datas)
-            adjusted_uv = current_uv[-new_max_points:] if new_max_points < len(current_uv) else current_uv
-            chrom_sys.uv_datas = deque(adjusted_uv, maxlen=new_max_points)
-
-            # 处理NIR数据队列
-            current_nir = list(chrom_sys.nir_datas)
-            adjusted_nir = current_nir[-new_max_points:] if new_max_points < len(current_nir) else current_nir
-            chrom_sys.nir_datas = deque(adjusted_nir, maxlen=new_max_points)
-
-            chrom_sys.max_data_points = new_max_points
-
+            chrom_sys.set_equilibrium_check_span(params.value)
             await chrom_sys.send_log(f"平衡检查窗口设置为 {params.value} 分钟")
         elif params.type == "sensor_thresholds":
             chrom_sys.sensor_thresholds = params.value
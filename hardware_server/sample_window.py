@@ -0,0 +1,50 @@
+import bisect
+from collections import deque
+
+
+class SampleWindow:
+    def __init__(self, span):
+        """
+        按采集时间戳保存最近的采样数据，供平衡判断使用。各仪器采样周期不同，判断时按时间戳对齐
+        :param span: 时间窗口s，额外保留一个窗口的数据用于对齐不同仪器的最新时刻
+        """
+        self.span = span
+        self.timestamps = deque()
+        self.values = deque()
+
+    def append(self, timestamp, value):
+        self.timestamps.append(timestamp)
+        self.values.append(value)
+        while self.timestamps and self.timestamps[0] < timestamp - 2 * self.span:
+            self.timestamps.popleft()
+            self.values.popleft()
+
+    def clear(self):
+        self.timestamps.clear()
+        self.values.clear()
+
+    def latest(self):
+        return self.timestamps[-1] if self.timestamps else None
+
+    def earliest(self):
+        return self.timestamps[0] if self.timestamps else None
+
+    def between(self, start, end):
+        """返回采集时间在 [start, end] 内的 (时间戳列表, 数据列表)"""
+        timestamps = list(self.timestamps)
+        i = bisect.bisect_left(timestamps, start)
+        j = bisect.bisect_right(timestamps, end)
+        return timestamps[i:j], list(self.values)[i:j]
+
+    def at(self, t):
+        """不晚于时刻t的最新数据（早于第一条数据时取第一条），从最新数据向前查找，t接近最新时刻时为O(1)"""
+        for i in range(len(self.timestamps) - 1, -1, -1):
+            if self.timestamps[i] <= t:
+                return self.values[i]
+        return self.values[0]
+
+    def asof(self, times):
+        """对齐到给定时刻：各时刻取不晚于该时刻的最新数据，早于第一条数据时取第一条"""
+        timestamps = list(self.timestamps)
+        values = list(self.values)
+        return [values[max(bisect.bisect_right(timestamps, t) - 1, 0)] for t in times]
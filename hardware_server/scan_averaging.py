@@ -0,0 +1,52 @@
+import numpy as np
+
+
+class ScanAverager:
+    def __init__(self, n_points, n_scans=5, threshold=3.5):
+        """
+        多次扫描的稳健平均：扫描写入环形缓冲区，按像素计算中位数和MAD（中位数绝对偏差），
+        偏离中位数超过 threshold 倍稳健标准差（1.4826 * MAD）的值视为异常值剔除后取平均，
+        全部运算在整个缓冲区上向量化完成
+        :param n_points: 每次扫描的点数
+        :param n_scans: 环形缓冲区容量（扫描次数）
+        :param threshold: 异常值判定阈值
+        """
+        self.n_points = n_points
+        self.n_scans = n_scans
+        self.threshold = threshold
+        self.scans = np.zeros((n_scans, n_points), dtype=np.float64)
+        self.count = 0
+        self.rejected = 0  # 最近一次平均中剔除的异常值数量
+
+    def __len__(self):
+        return min(self.count, self.n_scans)
+
+    def reset(self):
+        self.count = 0
+
+    def add(self, scan):
+        """写入一次扫描，缓冲区满时覆盖最早的扫描"""
+        self.scans[self.count % self.n_scans] = scan
+        self.count += 1
+
+    def mean(self):
+        """
+        剔除异常值后的逐像素平均
+        :return: 平均值数组，缓冲区为空时返回None
+        """
+        n = len(self)
+        if n == 0:
+            return None
+        scans = self.scans[:n]
+        if n < 3:
+            self.rejected = 0
+            return scans.mean(axis=0)
+        median = np.median(scans, axis=0)
+        deviation = np.abs(scans - median)
+        scale = 1.4826 * np.median(deviation, axis=0)
+        # 扫描次数少时逐像素的MAD波动大，以各像素稳健标准差的中位数作为下限，避免误剔除正常噪声；
+        # 全部MAD为0时（扫描完全相同）只保留等于中位数的值
+        scale = np.maximum(scale, np.median(scale))
+        keep = deviation <= self.threshold * scale
+        self.rejected = int(keep.size - np.count_nonzero(keep))
+        return np.sum(scans, axis=0, where=keep) / keep.sum(axis=0)
@@ -0,0 +1,123 @@
+import asyncio
+import math
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
+
+
+async def sleep_until(deadline, event=None):
+    """
+    等待到单调时钟（loop.time()）上的绝对时刻deadline，可被事件提前唤醒
+    :param deadline: 截止时刻，loop.time()
+    :param event: asyncio.Event，置位时立即返回
+    :return: 被事件唤醒返回True，到期返回False
+    """
+    loop = asyncio.get_running_loop()
+    if event is not None and event.is_set():
+        return True
+    timer = loop.create_future()
+    handle = loop.call_at(deadline, _resolve, timer)
+    if event is None:
+        try:
+            await timer
+        finally:
+            handle.cancel()
+        return False
+
+    event_task = asyncio.ensure_future(event.wait())
+    try:
+        await asyncio.wait({timer, event_task}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        handle.cancel()
+        timer.cancel()
+        event_task.cancel()
+    return event.is_set()
+
+
+async def wait_for(duration, event=None):
+    """等待duration秒，可被事件提前唤醒，返回值同 sleep_until"""
+    return await sleep_until(asyncio.get_running_loop().time() + duration, event)
+
+
+class Notifier:
+    def __init__(self):
+        """广播通知：notify 唤醒所有正在等待 event 的任务，之后的等待使用新的事件，无需由某个等待者清除"""
+        self.event = asyncio.Event()
+
+    def notify(self):
+        self.event.set()
+        self.event = asyncio.Event()
+
+
+class PeriodicTimer:
+    def __init__(self, period, name=""):
+        """
+        按绝对截止时间推进的周期定时器：第n次触发的时刻为 起点 + n * period，任务本身的耗时不累积为漂移。
+        任务耗时超过周期（超时）时跳过已错过的时刻，保持原有相位。统计触发抖动（实际唤醒时刻与截止时刻之差）和超时次数
+        :param period: 周期s
+        :param name: 名称，用于统计信息
+        """
+        if period <= 0:
+            raise ValueError(f"{name}周期必须大于0: {period}")
+        self.period = period
+        self.name = name
+        self.deadline = None
+        self.ticks = 0  # 按时触发次数
+        self.wakeups = 0  # 被事件提前唤醒次数
+        self.overruns = 0  # 任务耗时超过周期的次数
+        self.missed = 0  # 因超时跳过的触发次数
+        self.max_overrun = 0.0  # 最大超时s
+        self.max_jitter = 0.0  # 最大触发抖动s
+        self._jitter_sum = 0.0
+
+    def reset(self):
+        """以当前时刻为新的起点"""
+        self.deadline = asyncio.get_running_loop().time()
+
+    async def wait(self, period=None, event=None):
+        """
+        等待下一个触发时刻，第一次调用前未 reset 时以调用时刻为起点
+        :param period: 新的周期s，为None时沿用原周期
+        :param event: asyncio.Event，置位时提前返回并以唤醒时刻为新的起点
+        :return: 被事件唤醒返回True，按时触发返回False
+        """
+        loop = asyncio.get_running_loop()
+        if period is not None:
+            if period <= 0:
+                raise ValueError(f"{self.name}周期必须大于0: {period}")
+            self.period = period
+        if self.deadline is None:
+            self.reset()
+        self.deadline += self.period
+        now = loop.time()
+        if self.deadline < now:
+            missed = math.ceil((now - self.deadline) / self.period)
+            self.overruns += 1
+            self.missed += missed
+            self.max_overrun = max(self.max_overrun, now - self.deadline)
+            self.deadline += missed * self.period
+
+        if await sleep_until(self.deadline, event):
+            self.wakeups += 1
+            self.reset()
+            return True
+        jitter = loop.time() - self.deadline
+        self.ticks += 1
+        self._jitter_sum += jitter
+        self.max_jitter = max(self.max_jitter, jitter)
+        return False
+
+    def stats(self):
+        return {
+            "name": self.name,
+            "period": self.period,
+            "ticks": self.ticks,
+            "wakeups": self.wakeups,
+            "overruns": self.overruns,
+            "missed": self.missed,
+            "max_overrun": self.max_overrun,
+            "mean_jitter": self._jitter_sum / self.ticks if self.ticks else 0.0,
+            "max_jitter": self.max_jitter,
+        }
@@ -0,0 +1,167 @@
+import json
+import mmap
+import os
+import struct
+import threading
+import zlib
+
+
+class SegmentStore:
+    HEADER = struct.Struct("<QdII")  # 序号, 时间戳, 数据长度, crc32
+
+    def __init__(self, directory, record_size, records_per_segment=4096):
+        """
+        本地仅追加的分段存储，采集数据先写入此处再由 DBWriter 异步复制到数据库。
+        每个分段文件预分配 record_size * records_per_segment 字节并内存映射，第seq条记录位于第
+        seq // records_per_segment 个分段的第 seq % records_per_segment 个槽。记录头含序号和crc32，
+        打开时扫描最后一个分段恢复写入位置，断电时写了一半的记录会被丢弃。
+        复制进度（下一条待复制记录的序号）保存在 offset 文件中，已复制完的分段文件被删除
+        :param directory: 存储目录
+        :param record_size: 单条记录大小（含记录头），目录中已有数据时沿用已有的记录大小
+        :param records_per_segment: 每个分段的记录数
+        """
+        self.directory = directory
+        self.records_per_segment = records_per_segment
+        self.segments = {}  # {分段序号: (文件对象, mmap)}
+        # 采集任务在事件循环中追加，DBWriter在线程中读取、刷写和提交，分段的打开和关闭需要加锁
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self.meta_path = os.path.join(directory, "meta.json")
+        self.offset_path = os.path.join(directory, "offset")
+        self.record_size = self._load_meta(record_size)
+        self.max_payload = self.record_size - self.HEADER.size
+        self.offset = self._load_offset()
+        self.next_seq = self._recover()
+
+    def _load_meta(self, record_size):
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path, "r") as f:
+                meta = json.load(f)
+            if meta["record_size"] >= record_size and meta["records_per_segment"] == self.records_per_segment:
+                return meta["record_size"]
+            if self._segment_indexes():
+                # 记录大小变化，已有数据仍需复制，沿用原有格式
+                print(f"{self.directory} 中仍有未复制的数据，沿用原记录大小 {meta['record_size']}")
+                self.records_per_segment = meta["records_per_segment"]
+                return meta["record_size"]
+        with open(self.meta_path, "w") as f:
+            json.dump({"record_size": record_size, "records_per_segment": self.records_per_segment}, f)
+        return record_size
+
+    def _load_offset(self):
+        if os.path.exists(self.offset_path):
+            with open(self.offset_path, "r") as f:
+                return int(f.read().strip() or 0)
+        return 0
+
+    def _segment_indexes(self):
+        return sorted(int(name[:-4]) for name in os.listdir(self.directory) if name.endswith(".seg"))
+
+    def _segment_path(self, index):
+        return os.path.join(self.directory, f"{index:012d}.seg")
+
+    def _segment(self, index, create=False):
+        with self.lock:
+            if index not in self.segments:
+                path = self._segment_path(index)
+                if not os.path.exists(path):
+                    if not create:
+                        return None
+                    with open(path, "wb") as f:
+                        f.truncate(self.record_size * self.records_per_segment)
+                f = open(path, "r+b")
+                self.segments[index] = (f, mmap.mmap(f.fileno(), 0))
+            return self.segments[index][1]
+
+    def _recover(self):
+        """扫描最后一个分段，第一个无效记录的位置即下一条记录的序号"""
+        indexes = self._segment_indexes()
+        if not indexes:
+            return self.offset
+        seq = indexes[-1] * self.records_per_segment
+        end = seq + self.records_per_segment
+        while seq < end and self._read_record(seq) is not None:
+            seq += 1
+        return max(seq, self.offset)
+
+    def _read_record(self, seq):
+        m = self._segment(seq // self.records_per_segment)
+        if m is None:
+            return None
+        pos = (seq % self.records_per_segment) * self.record_size
+        record_seq, timestamp, length, crc = self.HEADER.unpack_from(m, pos)
+        if record_seq != seq or length == 0 or length > self.max_payload:
+            return None
+        start = pos + self.HEADER.size
+        payload = m[start:start + length]
+        if zlib.crc32(payload) != crc:
+            return None
+        return seq, timestamp, payload
+
+    def append(self, payload: bytes, timestamp: float):
+        """
+        追加一条记录（写入内存映射，进程崩溃不丢失；断电保护依赖 sync）
+        :param payload: 记录数据，不超过 max_payload 字节
+        :param timestamp: 采集时间戳（time.time()）
+        :return: 记录序号
+        """
+        if not 0 < len(payload) <= self.max_payload:
+            raise ValueError(f"记录长度 {len(payload)} 超出范围 (0, {self.max_payload}]")
+        seq = self.next_seq
+        m = self._segment(seq // self.records_per_segment, create=True)
+        pos = (seq % self.records_per_segment) * self.record_size
+        # 先写数据再写记录头，记录头的序号和crc校验通过才视为有效记录
+        m[pos + self.HEADER.size:pos + self.HEADER.size + len(payload)] = payload
+        self.HEADER.pack_into(m, pos, seq, timestamp, len(payload), zlib.crc32(payload))
+        self.next_seq += 1
+        return seq
+
+    def read(self, start, limit):
+        """读取从序号start开始的至多limit条记录，返回 [(序号, 时间戳, 数据)]"""
+        records = []
+        seq = start
+        while seq < self.next_seq and len(records) < limit:
+            record = self._read_record(seq)
+            if record is None:
+                break
+            records.append(record)
+            seq += 1
+        return records
+
+    def pending(self):
+        """未复制的记录数"""
+        return self.next_seq - self.offset
+
+    def commit(self, next_seq):
+        """记录复制进度并删除已复制完的分段"""
+        tmp_path = f"{self.offset_path}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(str(next_seq))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.offset_path)
+        self.offset = next_seq
+        current = self.next_seq // self.records_per_segment
+        for index in self._segment_indexes():
+            if index >= min(next_seq // self.records_per_segment, current):
+                break
+            with self.lock:
+                if index in self.segments:
+                    f, m = self.segments.pop(index)
+                    m.close()
+                    f.close()
+                os.remove(self._segment_path(index))
+
+    def sync(self):
+        """将内存映射中的数据刷写到磁盘"""
+        with self.lock:
+            for _, m in self.segments.values():
+                m.flush()
+
+    def close(self):
+        self.sync()
+        with self.lock:
+            for f, m in self.segments.values():
+                m.close()
+                f.close()
+            self.segments.clear()
@@ -0,0 +1,7 @@
+from .backend import SimulatedHardware
+from .modbus_server import SimulatedBus, SimulatedSlave, pump_valve_bus, sensor_bus
+from .process import ColumnProcess
+from .spectrometers import SimulatedNIRDevice, SimulatedUVDevice
+
+__all__ = ['SimulatedHardware', 'SimulatedBus', 'SimulatedSlave', 'pump_valve_bus', 'sensor_bus', 'ColumnProcess',
+           'SimulatedUVDevice', 'SimulatedNIRDevice']
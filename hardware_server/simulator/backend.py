@@ -0,0 +1,77 @@
+import os
+
+from pymodbus.client import ModbusTcpClient
+
+from pumps import PumpController
+from sensors import SensorController
+from valves import ValveController
+from .modbus_server import pump_valve_bus, sensor_bus
+from .process import ColumnProcess
+from .spectrometers import SimulatedNIRDevice, SimulatedUVDevice
+
+
+class SimulatedHardware:
+    def __init__(self, pump_addresses, valve_channels, valve_address=1, conductivity_address=1, ph_address=2,
+                 orp_address=3, level_address=4, time_scale=1.0, noise=1.0, modbus_latency=0.0,
+                 spectrometer_latency=0.0, seed=None):
+        """
+        模拟硬件后端：过程模型驱动的两条Modbus总线（进程内pymodbus TCP服务器）和两台光谱仪。
+        泵、阀门、传感器使用真实的控制器类，只是客户端换成连接模拟服务器的 ModbusTcpClient，寄存器读写与真实设备一致；
+        光谱仪与 UV.UVDevice、NIR.NIRDevice 接口相同
+        :param pump_addresses: 泵地址
+        :param valve_channels: 阀门通道
+        :param valve_address: 阀门模拟量输出模块的从站地址
+        :param time_scale: 过程时间加速倍数
+        :param noise: 传感器和光谱噪声倍数
+        :param modbus_latency: 每次Modbus请求的延时s
+        :param spectrometer_latency: 每次光谱扫描的延时s
+        :param seed: 随机种子
+        """
+        self.process = ColumnProcess(time_scale=time_scale, noise=noise, seed=seed)
+        self.buses = [pump_valve_bus(self.process, pump_addresses, valve_address, latency=modbus_latency),
+                      sensor_bus(self.process, conductivity_address, ph_address, orp_address, level_address,
+                                 latency=modbus_latency)]
+        self.clients = []
+        try:
+            pump_client, sensor_client = [self._connect(bus) for bus in self.buses]
+            self.pump_controller = PumpController(pump_addresses=pump_addresses, client=pump_client)
+            self.valve_controller = ValveController(valve_channels=valve_channels, client=pump_client,
+                                                    slave_address=valve_address)
+            self.sensor_controller = SensorController(client=sensor_client, conductivity_address=conductivity_address,
+                                                      ph_address=ph_address, orp_address=orp_address,
+                                                      level_address=level_address)
+        except Exception:
+            self.close()
+            raise
+        self.uv_controller = SimulatedUVDevice(self.process, latency=spectrometer_latency, noise=noise, seed=seed)
+        self.nir_controller = SimulatedNIRDevice(self.process, latency=spectrometer_latency, noise=noise,
+                                                 seed=None if seed is None else seed + 1)
+
+    @classmethod
+    def from_env(cls, pump_addresses, valve_channels, **kwargs):
+        """
+        按环境变量创建：CHROM_SIM_TIME_SCALE、CHROM_SIM_NOISE、CHROM_SIM_MODBUS_LATENCY、
+        CHROM_SIM_SPECTROMETER_LATENCY、CHROM_SIM_SEED
+        """
+        env = os.environ
+        seed = env.get("CHROM_SIM_SEED")
+        return cls(pump_addresses, valve_channels,
+                   time_scale=float(env.get("CHROM_SIM_TIME_SCALE", 1.0)),
+                   noise=float(env.get("CHROM_SIM_NOISE", 1.0)),
+                   modbus_latency=float(env.get("CHROM_SIM_MODBUS_LATENCY", 0.0)),
+                   spectrometer_latency=float(env.get("CHROM_SIM_SPECTROMETER_LATENCY", 0.0)),
+                   seed=None if seed is None else int(seed), **kwargs)
+
+    def _connect(self, bus):
+        port = bus.start()
+        client = ModbusTcpClient(bus.host, port=port)
+        self.clients.append(client)
+        if not client.connect():
+            raise ConnectionError(f"无法连接模拟Modbus服务器 {bus.host}:{port}")
+        return client
+
+    def close(self):
+        for client in self.clients:
+            client.close()
+        for bus in self.buses:
+            bus.stop()
@@ -0,0 +1,156 @@
+import asyncio
+import struct
+import threading
+import time
+
+from pymodbus.datastore import ModbusSequentialDataBlock, ModbusServerContext, ModbusSlaveContext
+from pymodbus.server import ModbusTcpServer
+
+from pumps import PumpController
+from valves import ValveController
+
+
+def encode_float(value, low_word_first=False):
+    """32位浮点数转换为两个16位寄存器值，默认高16位在前；传感器为低16位在前（见 sensors.decode_float）"""
+    high, low = struct.unpack('>HH', struct.pack('>f', value))
+    return [low, high] if low_word_first else [high, low]
+
+
+class SimulatedSlave(ModbusSlaveContext):
+    def __init__(self, unit, size, on_read=None, on_write=None, latency=0.0):
+        """
+        寄存器级模拟的Modbus从站：读请求前由 on_read 按过程模型刷新寄存器，写请求后由 on_write 把寄存器值同步给过程模型
+        :param unit: 从站地址
+        :param size: 线圈和保持寄存器的数量（地址0..size-1）
+        :param on_read: on_read(slave, fc, address, count)
+        :param on_write: on_write(slave, fc, address, values)
+        :param latency: 每次请求的应答延时s，模拟串口总线的通信耗时
+        """
+        super().__init__(di=ModbusSequentialDataBlock(0, [0] * 16), co=ModbusSequentialDataBlock(0, [0] * size),
+                         ir=ModbusSequentialDataBlock(0, [0] * 16), hr=ModbusSequentialDataBlock(0, [0] * size))
+        self.unit = unit
+        self.on_read = on_read
+        self.on_write = on_write
+        self.latency = latency
+
+    def getValues(self, fc_as_hex, address, count=1):
+        if self.latency:
+            time.sleep(self.latency)
+        if self.on_read:
+            self.on_read(self, fc_as_hex, address, count)
+        return super().getValues(fc_as_hex, address, count)
+
+    def setValues(self, fc_as_hex, address, values, notify=True):
+        """
+        :param notify: 为False时只写寄存器，供 on_read 刷新测量值时使用
+        """
+        if notify and self.latency:
+            time.sleep(self.latency)
+        super().setValues(fc_as_hex, address, values)
+        if notify and self.on_write:
+            self.on_write(self, fc_as_hex, address, values)
+
+
+class SimulatedBus:
+    def __init__(self, slaves, host='127.0.0.1', port=0):
+        """
+        在独立线程的事件循环中运行的Modbus TCP服务器，代替一条RS485总线，客户端用 ModbusTcpClient 连接
+        :param slaves: {从站地址: SimulatedSlave}
+        :param host: 监听地址
+        :param port: 监听端口，0为自动分配
+        """
+        self.context = ModbusServerContext(slaves=slaves, single=False)
+        self.host = host
+        self.port = port
+        self.server = None
+        self.loop = None
+        self.thread = None
+
+    def start(self, timeout=5):
+        started = threading.Event()
+
+        async def serve():
+            self.server = ModbusTcpServer(self.context, address=(self.host, self.port))
+            await self.server.serve_forever(background=True)
+            self.port = self.server.transport.sockets[0].getsockname()[1]
+            started.set()
+
+        def run():
+            self.loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self.loop)
+            self.loop.create_task(serve())
+            self.loop.run_forever()
+            self.loop.close()
+
+        self.thread = threading.Thread(target=run, name=f"modbus-sim-{id(self)}", daemon=True)
+        self.thread.start()
+        if not started.wait(timeout):
+            raise RuntimeError("模拟Modbus服务器启动超时")
+        return self.port
+
+    def stop(self):
+        if self.loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self.server.shutdown(), self.loop).result(timeout=5)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout=5)
+        self.loop = None
+
+
+def pump_valve_bus(process, pump_addresses, valve_address=1, latency=0.0):
+    """
+    泵与阀门共用的总线：蠕动泵的启停线圈和转速寄存器同步到过程模型，实时转速由过程模型给出；
+    模拟量输出模块的4-20mA寄存器换算为阀门开度
+    """
+    start_stop = PumpController.COIL_ADDRESS['start_stop']
+    speed_setting = PumpController.HOLDING_REGISTERS['speed_setting']
+    speed_real = PumpController.HOLDING_REGISTERS['speed_real']
+    valve_registers = {register: channel for channel, register in
+                       ValveController.HOLDING_REGISTERS['valve_setting'].items()}
+
+    def pump_write(slave, fc, address, values):
+        if fc in (5, 15) and address <= start_stop < address + len(values):
+            process.set_pump(slave.unit, running=values[start_stop - address])
+        elif fc in (6, 16) and address <= speed_setting and speed_setting + 1 < address + len(values):
+            registers = values[speed_setting - address:speed_setting - address + 2]
+            process.set_pump(slave.unit, speed=struct.unpack('>f', struct.pack('>HH', *registers))[0])
+
+    def pump_read(slave, fc, address, count):
+        if fc == 3 and address <= speed_real < address + count:
+            slave.setValues(3, speed_real, encode_float(process.pump_speed(slave.unit)), notify=False)
+
+    def valve_write(slave, fc, address, values):
+        if fc not in (6, 16):
+            return
+        for i, value in enumerate(values):
+            channel = valve_registers.get(address + i)
+            if channel is not None:
+                current = value / 1000
+                process.set_valve(channel, min(max((current - 4) / 16 * 100, 0.0), 100.0))
+
+    slaves = {}
+    for address in pump_addresses:
+        slaves[address] = SimulatedSlave(address, 0x3010, on_read=pump_read, on_write=pump_write, latency=latency)
+    slaves[valve_address] = SimulatedSlave(valve_address, 0x20, on_write=valve_write, latency=latency)
+    return SimulatedBus(slaves)
+
+
+def sensor_bus(process, conductivity_address=1, ph_address=2, orp_address=3, level_address=4, latency=0.0):
+    """传感器总线：每次读请求时按过程模型刷新对应从站的测量值和温度寄存器"""
+    def sensor_read(slave, fc, address, count):
+        data = process.read_sensors()
+        if slave.unit == level_address:
+            slave.setValues(3, 0x0200, [int(min(max(data['level'], 0), 65535))], notify=False)
+            return
+        if slave.unit == conductivity_address:
+            slave.setValues(3, 0x0000, encode_float(data['conductivity'], low_word_first=True), notify=False)
+            slave.setValues(3, 0x0004, encode_float(data['temperature'], low_word_first=True), notify=False)
+        else:
+            name = 'ph' if slave.unit == ph_address else 'orp'
+            slave.setValues(3, 0x0001, encode_float(data[name], low_word_first=True), notify=False)
+            slave.setValues(3, 0x0003, encode_float(data['temperature'], low_word_first=True), notify=False)
+
+    slaves = {}
+    for address in (conductivity_address, ph_address, orp_address, level_address):
+        slaves[address] = SimulatedSlave(address, 0x0210, on_read=sensor_read, latency=latency)
+    return SimulatedBus(slaves)
@@ -0,0 +1,141 @@
+import math
+import threading
+import time
+
+import numpy as np
+
+from hardware_config import HardwareConfig
+
+# 各阶段流出液传感器的目标值 (pH, ORP mV, 电导率 mS/cm)，进入新阶段后按柱体积一阶趋近
+STAGE_TARGETS = {
+    'equilibrate': (6.5, 220.0, 0.3),
+    'feed': (5.2, 260.0, 8.0),
+    'wash': (6.0, 240.0, 0.8),
+    'elute': (9.0, 150.0, 4.0),
+    'refresh': (6.8, 210.0, 0.4),
+}
+
+
+class ColumnProcess:
+    def __init__(self, bed_volume=50.0, column_area=7.0, level_distance=150.0, time_scale=1.0, noise=1.0, seed=None):
+        """
+        柱层析过程的简化模型，由模拟的泵、阀门状态驱动，供模拟传感器和光谱仪读取：
+        上样阶段流出液目标物浓度为穿透曲线（logistic），洗脱阶段为色谱峰，其余阶段指数衰减；
+        pH、ORP、电导率随通过的柱体积一阶趋近各阶段目标值；液面由进出口流量差积分得到
+        :param bed_volume: 柱体积mL
+        :param column_area: 柱截面积cm²，用于由体积变化计算液面高度变化
+        :param level_distance: 初始液位计到液面的距离mm
+        :param time_scale: 过程时间加速倍数，如60表示1秒对应过程中的1分钟，用于快速测试整个实验流程
+        :param noise: 噪声倍数，0为无噪声
+        :param seed: 随机种子
+        """
+        self.bed_volume = bed_volume
+        self.column_area = column_area
+        self.level_distance = level_distance
+        self.time_scale = time_scale
+        self.noise = noise
+        self.rng = np.random.default_rng(seed)
+        self.lock = threading.Lock()
+
+        self.pumps = {}  # {泵地址: {'running': bool, 'speed': rpm}}
+        self.valves = {}  # {阀门通道: 开度}
+        self.stage = None
+        self.stage_bv = 0.0  # 当前阶段通过的柱体积
+        self.concentration = 0.0  # 流出液目标物相对浓度
+        self.sensors = dict(zip(('ph', 'orp', 'conductivity'), STAGE_TARGETS['equilibrate']))
+        self._stage_start = (self.concentration, dict(self.sensors))
+        self._last = time.monotonic()
+        self.inlet_valves = {config['valve']: stage for stage, config in (
+            ('feed', HardwareConfig.feed), ('wash', HardwareConfig.wash), ('elute', HardwareConfig.elute),
+            ('refresh', HardwareConfig.refresh), ('equilibrate', HardwareConfig.equilibrate))}
+
+    # ========================== 执行器状态 ============================= #
+    def set_pump(self, address, running=None, speed=None):
+        with self.lock:
+            self._advance()
+            pump = self.pumps.setdefault(address, {'running': False, 'speed': 0.0})
+            if running is not None:
+                pump['running'] = bool(running)
+            if speed is not None:
+                pump['speed'] = float(speed)
+
+    def set_valve(self, channel, opening):
+        with self.lock:
+            self._advance()
+            self.valves[channel] = opening
+
+    def pump_speed(self, address):
+        pump = self.pumps.get(address)
+        return pump['speed'] if pump and pump['running'] else 0.0
+
+    def _flow(self, pump_address):
+        """泵流量mL/min，转速=校正因子*流量"""
+        factor = HardwareConfig.pump_factor.get(str(pump_address), 1.0)
+        return self.pump_speed(pump_address) / factor
+
+    # ========================== 过程推进 ============================= #
+    def _advance(self):
+        now = time.monotonic()
+        dt_min = (now - self._last) * self.time_scale / 60
+        self._last = now
+
+        open_inlets = [(opening, channel) for channel, opening in self.valves.items()
+                       if channel in self.inlet_valves and opening > 0]
+        stage = self.inlet_valves[max(open_inlets)[1]] if open_inlets else None
+        if stage != self.stage:
+            self.stage = stage
+            self.stage_bv = 0.0
+            self._stage_start = (self.concentration, dict(self.sensors))
+
+        q_in = self._flow(HardwareConfig.feed['pump']) if stage else 0.0
+        q_out = self._flow(HardwareConfig.out['pump'])
+        self.stage_bv += q_in * dt_min / self.bed_volume
+        # 液面上升则液位计到液面的距离减小
+        self.level_distance -= (q_in - q_out) * dt_min / self.column_area * 10
+        self.level_distance = min(max(self.level_distance, 0.0), 400.0)
+
+        bv = self.stage_bv
+        c0, sensors0 = self._stage_start
+        if stage == 'feed':
+            self.concentration = max(c0 * math.exp(-bv / 0.5), 1 / (1 + math.exp(-(bv - 3.0) / 0.4)))
+        elif stage == 'elute':
+            self.concentration = c0 * math.exp(-bv / 0.3) + 4.0 * math.exp(-0.5 * ((bv - 1.2) / 0.35) ** 2)
+        else:
+            self.concentration = c0 * math.exp(-bv / 0.5)
+        if stage is not None:
+            decay = math.exp(-bv / 0.8)
+            for name, target in zip(('ph', 'orp', 'conductivity'), STAGE_TARGETS[stage]):
+                self.sensors[name] = target + (sensors0[name] - target) * decay
+
+    # ========================== 测量值 ============================= #
+    def read_sensors(self):
+        """
+        :return: {'ph', 'orp', 'conductivity', 'temperature', 'level'}，含测量噪声，液位为液位计到液面的距离mm
+        """
+        with self.lock:
+            self._advance()
+            n = self.noise
+            return {
+                'ph': self.sensors['ph'] + self.rng.normal(0, 0.005 * n),
+                'orp': self.sensors['orp'] + self.rng.normal(0, 0.5 * n),
+                'conductivity': max(self.sensors['conductivity'] * (1 + self.rng.normal(0, 0.005 * n)), 0.0),
+                'temperature': 25.0 + self.rng.normal(0, 0.05 * n),
+                'level': self.level_distance + self.rng.normal(0, 0.5 * n),
+            }
+
+    def absorbance(self, instrument, wavelengths):
+        """
+        流出液的吸光度mAU（不含噪声，噪声由光谱仪的强度噪声产生）
+        :param instrument: uv、nir
+        :param wavelengths: 波长nm
+        """
+        with self.lock:
+            self._advance()
+            c = self.concentration
+            salt = self.sensors['conductivity'] / STAGE_TARGETS['feed'][2]
+        w = np.asarray(wavelengths, dtype=np.float64)
+        if instrument == 'uv':
+            # 目标物在280nm、杂质和盐在220nm附近吸收
+            return 800 * c * np.exp(-0.5 * ((w - 280) / 15) ** 2) + 300 * salt * np.exp(-0.5 * ((w - 220) / 12) ** 2)
+        # 水在1450nm的吸收带为恒定背景，目标物在1200nm附近吸收
+        return 300 * np.exp(-0.5 * ((w - 1450) / 60) ** 2) + 50 * c * np.exp(-0.5 * ((w - 1200) / 40) ** 2)
@@ -0,0 +1,148 @@
+import time
+
+import numpy as np
+
+from spectral_device import SpectralDevice
+
+
+class SimulatedSpectrometer(SpectralDevice):
+    def __init__(self, process, instrument, wavelengths, lamp_profile, dark_level, full_scale, latency=0.0,
+                 noise=1.0, calibration_scans=5, seed=None):
+        """
+        模拟光谱仪：只模拟原始强度 暗电流 + 光源强度 * 10^(-A/1000) + 噪声，A为过程模型给出的吸光度；
+        多次扫描平均、暗底与参比、吸光度计算和ROI使用与真实设备相同的 SpectralDevice
+        :param process: ColumnProcess
+        :param instrument: uv、nir
+        :param wavelengths: 波长
+        :param lamp_profile: 各波长的光源强度（计数）
+        :param dark_level: 暗电流计数
+        :param full_scale: 满量程计数，强度被截断到此值
+        :param latency: 单次扫描耗时s
+        :param noise: 噪声倍数
+        :param calibration_scans: 设置暗底和参比时的平均扫描次数
+        :param seed: 随机种子
+        """
+        self.process = process
+        self.instrument = instrument
+        self.wavelengths = np.asarray(wavelengths, dtype=np.float64)
+        self.lamp_profile = np.asarray(lamp_profile, dtype=np.float64)
+        self.dark_level = dark_level
+        self.full_scale = full_scale
+        self.latency = latency
+        self.noise = noise
+        self.rng = np.random.default_rng(seed)
+        self.lamp = True
+        self.counts = np.zeros(len(self.wavelengths), dtype=np.float64)  # 采集缓冲区，下次扫描时被覆盖
+        self.init_processing(len(self.wavelengths), calibration_scans)
+
+    def full_wavelengths(self):
+        return self.wavelengths
+
+    def read_scan(self):
+        """模拟一次扫描，返回原始强度"""
+        with self.lock:
+            if self.latency:
+                time.sleep(self.latency)
+            n = len(self.counts)
+            self.counts[:] = self.dark_level + self.rng.normal(0, 5 * self.noise, n)
+            if self.lamp:
+                absorbance = self.process.absorbance(self.instrument, self.wavelengths)
+                light = self.lamp_profile * np.power(10.0, -absorbance / 1000)
+                # 散粒噪声与信号的平方根成正比
+                self.counts += light + self.rng.normal(0, 1, n) * np.sqrt(light) * self.noise
+            np.clip(self.counts, 0, self.full_scale, out=self.counts)
+            np.rint(self.counts, out=self.counts)
+            return self.counts
+
+
+class SimulatedUVDevice(SimulatedSpectrometer):
+    label = "模拟紫外"
+
+    def __init__(self, process, latency=0.0, noise=1.0, settle_time=0.0, seed=None):
+        """
+        模拟紫外光谱仪，2048像素、190-1100nm，接口与 UV.UVDevice 相同：
+        设置暗底时关灯（之后保持关闭），设置参比时开灯，初始化时依次设置暗底和参比
+        :param settle_time: 开关灯后的稳定时间s，真实设备为2s
+        """
+        pixels = np.arange(2048)
+        wavelengths = np.around(190 + pixels * (910 / 2047), decimals=2)
+        # 氙灯光谱：紫外端和近红外端较弱
+        lamp_profile = 30000 * np.exp(-0.5 * ((wavelengths - 480) / 220) ** 2) + 1500
+        super().__init__(process, 'uv', wavelengths, lamp_profile, dark_level=1000, full_scale=65535,
+                         latency=latency, noise=noise, calibration_scans=10, seed=seed)
+        self.settle_time = settle_time
+        self.integration_time_us = 96 * 1000
+        self.average_times = 5
+        self.lamp = False
+        self.uvState = {'lamp': False, 'avg_times': self.average_times,
+                        'integration_time': self.integration_time_us / 1000}
+        self.set_background()
+        self.set_reference()
+
+    def get_uv_state(self):
+        return self.uvState
+
+    def get_Wavelengths(self):
+        return self.wavelengths
+
+    def enable_lamp(self, on):
+        self.lamp = bool(on)
+        self.uvState['lamp'] = bool(on)
+
+    def set_integration_time(self, time_us):
+        self.integration_time_us = time_us
+        self.uvState['integration_time'] = time_us / 1000
+
+    def set_average(self, avg_times):
+        self.average_times = avg_times
+        self.uvState['avg_times'] = avg_times
+
+    def set_background(self, n_scans=None):
+        with self.lock:
+            self.enable_lamp(0)
+            time.sleep(self.settle_time)
+            return self.calibrate_background(n_scans)
+
+    def set_reference(self, n_scans=None):
+        with self.lock:
+            self.enable_lamp(1)
+            time.sleep(self.settle_time)
+            return self.calibrate_reference(n_scans)
+
+    def close_device(self):
+        self.enable_lamp(0)
+
+
+class SimulatedNIRDevice(SimulatedSpectrometer):
+    label = "模拟近红外"
+
+    def __init__(self, process, latency=0.0, noise=1.0, seed=None):
+        """
+        模拟近红外光谱仪，228个波长点、900-1700nm，接口与 NIR.NIRDevice 相同：
+        设置暗背景不控制光源（与真实设备一样，需先 set_lamp_status(0)），初始化时只设置参比
+        """
+        self.WLS_NUM = 228
+        wavelengths = np.around(np.linspace(900, 1700, self.WLS_NUM), decimals=2)
+        lamp_profile = 200000 * np.exp(-0.5 * ((wavelengths - 1250) / 350) ** 2)
+        super().__init__(process, 'nir', wavelengths, lamp_profile, dark_level=2000, full_scale=2 ** 31 - 1,
+                         latency=latency, noise=noise, calibration_scans=5, seed=seed)
+        self.nirState = {'avg_times': 6}
+        self.set_reference()
+
+    def get_nir_state(self):
+        return self.nirState
+
+    def get_wavelengths(self):
+        return self.wavelengths
+
+    def set_avg_times(self, avg_times=6):
+        self.nirState['avg_times'] = avg_times
+
+    def set_lamp_status(self, enable):
+        self.lamp = bool(enable)
+
+    def set_background(self, n_scans=None):
+        return self.calibrate_background(n_scans)
+
+    def set_reference(self, n_scans=None):
+        return self.calibrate_reference(n_scans)
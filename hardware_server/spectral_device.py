@@ -0,0 +1,115 @@
+import threading
+
+import numpy as np
+
+from scan_averaging import ScanAverager
+from spectral_roi import SpectralROI
+
+
+class SpectralDevice:
+    label = ""  # 日志前缀，如 紫外、近红外
+
+    def init_processing(self, n_points, calibration_scans):
+        """
+        光谱仪的公共数据处理：多次扫描稳健平均、暗底与参比、吸光度计算和ROI，紫外、近红外设备和模拟设备共用。
+        子类实现 read_scan（采集一次原始强度，失败返回None）和 full_wavelengths（全部像素的波长）。
+        采集缓冲区和计算用数组都预分配，全部在 self.lock 内使用；暗底、参比的整个标定过程也持有锁，
+        并发的标定和吸光度采集不会交错写入扫描缓冲区
+        :param n_points: 像素数
+        :param calibration_scans: 设置暗底和参比时的软件平均扫描次数
+        """
+        self.n_points = n_points
+        self.dark_data = np.zeros(n_points, dtype=np.float64)  # 暗底数据
+        self.reference_data = np.zeros(n_points, dtype=np.float64)  # 扣除暗底后的参比数据
+        self.absorbance_data = np.zeros(n_points, dtype=np.float64)  # 全部像素的吸光度mau
+        self.signal_data = np.zeros(n_points, dtype=np.float64)  # 扣除暗底后的信号
+        self.valid_mask = np.zeros(n_points, dtype=bool)  # 可计算吸光度的像素
+        self.reference_valid = np.zeros(n_points, dtype=bool)  # 参比大于0的像素，设置参比时更新
+        self.calibration_scans = calibration_scans
+        self.averager = ScanAverager(n_points, calibration_scans)  # 多次扫描的环形缓冲区，剔除异常值后平均
+        self.lock = threading.RLock()  # 线程锁，采集和使用采集缓冲区的计算都在锁内进行
+        self.roi = SpectralROI(self.full_wavelengths())  # 感兴趣区域与像素合并，默认保留全部像素
+
+    def read_scan(self):
+        raise NotImplementedError
+
+    def full_wavelengths(self):
+        raise NotImplementedError
+
+    def collect_average(self, n_scans=None):
+        """
+        连续采集多次，剔除异常值（中位数/MAD）后逐像素平均。阻塞调用，应在工作线程中执行
+        :param n_scans: 扫描次数，默认为 calibration_scans
+        :return: 全部扫描成功时返回平均后的强度（新数组），否则返回None
+        """
+        n_scans = n_scans or self.calibration_scans
+        with self.lock:
+            if self.averager.n_scans != n_scans:
+                self.averager = ScanAverager(self.n_points, n_scans)
+            self.averager.reset()
+            for _ in range(n_scans):
+                data = self.read_scan()
+                if data is None:
+                    return None
+                self.averager.add(data)
+            mean = self.averager.mean()
+            rejected = self.averager.rejected
+        if rejected:
+            print(f"[{self.label}] {n_scans}次扫描中剔除异常值 {rejected} 个")
+        return mean
+
+    def calibrate_background(self, n_scans=None):
+        """采集多次平均作为暗底数据，光源状态由子类在调用前设置"""
+        with self.lock:
+            data = self.collect_average(n_scans)
+            if data is None:
+                print(f"[{self.label}] 设置暗底失败")
+                return False
+            self.dark_data[:] = data
+        print(f"[{self.label}] 设置暗底成功")
+        return True
+
+    def calibrate_reference(self, n_scans=None):
+        """采集多次平均并减去暗底作为参比数据，光源状态由子类在调用前设置"""
+        with self.lock:
+            data = self.collect_average(n_scans)
+            if data is None:
+                print(f"[{self.label}] 参比设置失败")
+                return False
+            np.subtract(data, self.dark_data, out=self.reference_data)
+            np.greater(self.reference_data, 0, out=self.reference_valid)
+        print(f"[{self.label}] 参比设置成功")
+        return True
+
+    def get_absorbance(self):
+        """
+        采集新数据并计算吸光度，全部像素的吸光度保存在 absorbance_data 中，信号或参比不大于0的像素吸光度为0
+        :return: ROI内合并后的吸光度（新数组），采集失败时返回None
+        """
+        with self.lock:
+            data = self.read_scan()
+            if data is None:
+                print(f"[{self.label}] [Error] 没有采集到数据")
+                return None
+            # 在预分配的数组中原地计算
+            np.subtract(data, self.dark_data, out=self.signal_data)
+            np.greater(self.signal_data, 0, out=self.valid_mask)
+            self.valid_mask &= self.reference_valid
+            self.absorbance_data.fill(0.0)
+            np.divide(self.reference_data, self.signal_data, out=self.absorbance_data, where=self.valid_mask)
+            np.log10(self.absorbance_data, out=self.absorbance_data, where=self.valid_mask)
+            self.absorbance_data *= 1000
+            return self.roi.apply(self.absorbance_data)
+
+    def set_roi(self, ranges=None, bin_size=1):
+        """
+        设置感兴趣区域（ROI）与像素合并，之后 get_absorbance 只返回ROI内合并后的吸光度
+        :param ranges: 波长范围列表 [(起始波长nm, 结束波长nm), ...]，为None时保留全部像素
+        :param bin_size: 合并像素数，每bin_size个相邻像素取平均，1为不合并
+        """
+        self.roi = SpectralROI(self.full_wavelengths(), ranges, bin_size)
+        print(f"[{self.label}] ROI设置为: {self.roi.config()}")
+
+    def get_roi_wavelengths(self):
+        """ROI内合并后的波长，与 get_absorbance 返回的吸光度一一对应"""
+        return self.roi.wavelengths
@@ -0,0 +1,54 @@
+import numpy as np
+
+
+class SpectralROI:
+    def __init__(self, wavelengths, ranges=None, bin_size=1):
+        """
+        光谱感兴趣区域（ROI）与像素合并：只保留ranges内的像素，每个连续区域内每bin_size个相邻像素取平均，
+        区域末尾不足bin_size的像素单独成一组。设备层在返回吸光度前调用，入库、平衡判断等下游只处理合并后的数据
+        :param wavelengths: 设备全部像素的波长
+        :param ranges: 波长范围列表 [(起始波长nm, 结束波长nm), ...]，为None时保留全部像素
+        :param bin_size: 合并像素数，1为不合并
+        """
+        self.full_wavelengths = np.asarray(wavelengths, dtype=np.float64)
+        if bin_size < 1:
+            raise ValueError("合并像素数必须大于等于1")
+        self.ranges = [tuple(r) for r in ranges] if ranges else None
+        self.bin_size = int(bin_size)
+
+        mask = np.zeros(len(self.full_wavelengths), dtype=bool)
+        if self.ranges is None:
+            mask[:] = True
+        else:
+            for start, end in self.ranges:
+                mask |= (self.full_wavelengths >= min(start, end)) & (self.full_wavelengths <= max(start, end))
+        self.pixels = np.flatnonzero(mask)
+        if len(self.pixels) == 0:
+            raise ValueError(f"波长范围 {self.ranges} 内没有像素")
+
+        # 各组在 pixels 中的起始位置：每个连续区域从头开始按bin_size分组
+        breaks = np.flatnonzero(np.diff(self.pixels) != 1) + 1
+        segment_starts = np.concatenate(([0], breaks))
+        segment_ends = np.concatenate((breaks, [len(self.pixels)]))
+        self.group_starts = np.concatenate([np.arange(s, e, self.bin_size) for s, e in zip(segment_starts, segment_ends)])
+        self.group_counts = np.diff(np.append(self.group_starts, len(self.pixels)))
+        # 全部像素且不合并时直接复制
+        self.identity = self.ranges is None and self.bin_size == 1
+        self.wavelengths = np.around(self.apply(self.full_wavelengths), decimals=2)
+
+    def __len__(self):
+        return len(self.group_starts)
+
+    def apply(self, spectrum):
+        """
+        截取ROI并合并像素，总是返回新数组，调用方可以保存返回值而不受设备缓冲区后续写入的影响
+        :param spectrum: 全部像素的数据
+        :return: 合并后的数据
+        """
+        spectrum = np.asarray(spectrum, dtype=np.float64)
+        if self.identity:
+            return spectrum.copy()
+        return np.add.reduceat(spectrum[self.pixels], self.group_starts) / self.group_counts
+
+    def config(self):
+        return {"ranges": self.ranges, "bin_size": self.bin_size, "points": len(self)}
@@ -1,3 +1,6 @@
 from .connect_mysql import AsyncDBSession
+from .spectrum_codec import encode_spectrum, decode_spectrum, encode_wavelengths, decode_wavelengths, \
+    wavelength_keys
 
-__all__ = ['AsyncDBSession']
+__all__ = ['AsyncDBSession', 'encode_spectrum', 'decode_spectrum', 'encode_wavelengths', 'decode_wavelengths',
+           'wavelength_keys']
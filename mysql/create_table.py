@@ -70,14 +70,33 @@ async def create_tables():
             await conn.execute(text(create_sensors_table))
             print("Sensors table created successfully.")
 
+            # 创建光谱波长轴表，同一实验同一仪器标定的波长轴只保存一次
+            create_spectrum_axes_table = """
+            CREATE TABLE IF NOT EXISTS SpectrumAxes (
+                ID INT AUTO_INCREMENT PRIMARY KEY,
+                experiment_id INT NOT NULL COMMENT '实验ID',
+                instrument VARCHAR(10) NOT NULL COMMENT '仪器，uv或nir',
+                axis_hash CHAR(64) NOT NULL COMMENT '波长轴sha256摘要',
+                wavelengths BLOB NOT NULL COMMENT '波长nm，float64小端序',
+                UNIQUE KEY uk_axis (experiment_id, instrument, axis_hash),
+                FOREIGN KEY (experiment_id) REFERENCES ExperimentRecords(ID) ON DELETE CASCADE
+            ) COMMENT='光谱波长轴表';
+            """
+            await conn.execute(text(create_spectrum_axes_table))
+            print("SpectrumAxes table created successfully.")
+
             # 创建紫外数据表
             create_uvs_table = """
             CREATE TABLE IF NOT EXISTS UVs (
                 ID INT AUTO_INCREMENT PRIMARY KEY,
                 time DATETIME DEFAULT CURRENT_TIMESTAMP COMMENT '时间',
                 experiment_id INT NOT NULL COMMENT '实验ID',
-                data TEXT COMMENT '各波长nm下的紫外强度(mau)',
-                FOREIGN KEY (experiment_id) REFERENCES ExperimentRecords(ID) ON DELETE CASCADE
+                data TEXT COMMENT '各波长nm下的紫外强度(mau)，旧格式JSON',
+                spectrum BLOB COMMENT '紫外强度(mau)，float32小端序，见spectrum_codec',
+                encoding VARCHAR(10) COMMENT 'spectrum编码方式，f32或f32-zstd',
+                axis_id INT COMMENT '波长轴ID',
+                FOREIGN KEY (experiment_id) REFERENCES ExperimentRecords(ID) ON DELETE CASCADE,
+                FOREIGN KEY (axis_id) REFERENCES SpectrumAxes(ID)
             ) COMMENT='紫外数据表';
             """
             await conn.execute(text(create_uvs_table))
@@ -89,8 +108,12 @@ async def create_tables():
                 ID INT AUTO_INCREMENT PRIMARY KEY,
                 time DATETIME DEFAULT CURRENT_TIMESTAMP COMMENT '时间',
                 experiment_id INT NOT NULL COMMENT '实验ID',
-                data TEXT COMMENT '各波长nm下的近红外强度(mau)',
-                FOREIGN KEY (experiment_id) REFERENCES ExperimentRecords(ID) ON DELETE CASCADE
+                data TEXT COMMENT '各波长nm下的近红外强度(mau)，旧格式JSON',
+                spectrum BLOB COMMENT '近红外强度(mau)，float32小端序，见spectrum_codec',
+                encoding VARCHAR(10) COMMENT 'spectrum编码方式，f32或f32-zstd',
+                axis_id INT COMMENT '波长轴ID',
+                FOREIGN KEY (experiment_id) REFERENCES ExperimentRecords(ID) ON DELETE CASCADE,
+                FOREIGN KEY (axis_id) REFERENCES SpectrumAxes(ID)
             ) COMMENT='近红外数据表';
             """
             await conn.execute(text(create_nirs_table))
@@ -128,11 +151,39 @@ async def create_tables():
             print(f"An error occurred: {e}")
 
 
+async def migrate_spectrum_storage():
+    """为已建好的UVs/NIRs表添加二进制光谱列，旧数据保留在data列中，读取时两种格式都支持"""
+    async with engine.begin() as conn:
+        await conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS SpectrumAxes (
+                ID INT AUTO_INCREMENT PRIMARY KEY,
+                experiment_id INT NOT NULL COMMENT '实验ID',
+                instrument VARCHAR(10) NOT NULL COMMENT '仪器，uv或nir',
+                axis_hash CHAR(64) NOT NULL COMMENT '波长轴sha256摘要',
+                wavelengths BLOB NOT NULL COMMENT '波长nm，float64小端序',
+                UNIQUE KEY uk_axis (experiment_id, instrument, axis_hash),
+                FOREIGN KEY (experiment_id) REFERENCES ExperimentRecords(ID) ON DELETE CASCADE
+            ) COMMENT='光谱波长轴表';
+        """))
+        for table_name in ['UVs', 'NIRs']:
+            try:
+                await conn.execute(text(f"""
+                    ALTER TABLE {table_name}
+                        ADD COLUMN spectrum BLOB COMMENT 'float32小端序，见spectrum_codec',
+                        ADD COLUMN encoding VARCHAR(10) COMMENT 'spectrum编码方式，f32或f32-zstd',
+                        ADD COLUMN axis_id INT COMMENT '波长轴ID',
+                        ADD FOREIGN KEY (axis_id) REFERENCES SpectrumAxes(ID);
+                """))
+                print(f"{table_name} table migrated successfully.")
+            except Exception as e:
+                print(f"An error occurred while migrating {table_name}: {e}")
+
+
 async def drop_all_tables():
     async with engine.begin() as conn:
         try:
             # 定义表删除顺序，先删除有外键引用的表，最后删除被引用的表
-            table_names = ['Sensors', 'UVs', 'NIRs', 'Logs', 'OptimizationRecords', 'FeedRecords', 'ExperimentRecords']
+            table_names = ['Sensors', 'UVs', 'NIRs', 'SpectrumAxes', 'Logs', 'OptimizationRecords', 'FeedRecords', 'ExperimentRecords']
 
             # 依次删除所有表
             for table_name in table_names:
@@ -146,4 +197,5 @@ async def drop_all_tables():
 
 if __name__ == "__main__":
     asyncio.run(create_tables())
+    # asyncio.run(migrate_spectrum_storage())
     # asyncio.run(drop_all_tables())
@@ -3,6 +3,7 @@ import json
 import pandas as pd
 from sqlalchemy import text
 from connect_mysql import AsyncDBSession
+from spectrum_codec import decode_spectrum, wavelength_keys
 from tqdm.asyncio import tqdm_asyncio
 
 
@@ -117,14 +118,21 @@ async def export_spectrum_data(experiment_id: int, spectrum_type: str, output_pa
 
         print(f"开始导出{spectrum_name}光谱数据，共 {total_records} 条记录...")
 
-        # 2. 分页查询数据
+        # 2. 读取该实验的波长轴，二进制光谱通过axis_id引用；列名与旧JSON的波长键相同（字符串）
+        result = await session.execute(
+            text("SELECT ID, wavelengths FROM SpectrumAxes WHERE experiment_id = :exp_id AND instrument = :instrument"),
+            {"exp_id": experiment_id, "instrument": spectrum_type}
+        )
+        axes = {row[0]: wavelength_keys(row[1]) for row in result.fetchall()}
+
+        # 3. 分页查询数据
         data = []
         progress_bar = tqdm_asyncio(total=total_records, desc=f"导出{spectrum_name}光谱数据")
 
         offset = 0
         while offset < total_records:
             query = text(f"""
-                SELECT time, data 
+                SELECT time, data, spectrum, encoding, axis_id 
                 FROM {table_name} 
                 WHERE experiment_id = :exp_id 
                 ORDER BY time
@@ -140,14 +148,16 @@ async def export_spectrum_data(experiment_id: int, spectrum_type: str, output_pa
             )
             rows = result.fetchall()
 
-            # 3. 流式处理每页数据
+            # 4. 流式处理每页数据
             for row in rows:
                 time_str = row[0].strftime("%Y-%m-%d %H:%M:%S") if row[0] else None
-                spectrum_data = json.loads(row[1]) if row[1] else {}
 
-                # 构建每行数据（时间 + 各波长吸光度）
+                # 构建每行数据（时间 + 各波长吸光度），二进制光谱直接用np.frombuffer解码，旧数据为JSON文本
                 row_data = {'时间': time_str}
-                row_data.update(spectrum_data)
+                if row[2] is not None:
+                    row_data.update(zip(axes[row[4]], decode_spectrum(row[2], row[3]).tolist()))
+                else:
+                    row_data.update(json.loads(row[1]) if row[1] else {})
                 data.append(row_data)
 
             offset += len(rows)
@@ -155,7 +165,7 @@ async def export_spectrum_data(experiment_id: int, spectrum_type: str, output_pa
 
         progress_bar.close()
 
-        # 4. 写入Excel
+        # 5. 写入Excel
         df = pd.DataFrame(data)
         df.to_excel(output_path, index=False)
         print(f"\n{spectrum_name}光谱数据已导出至 {output_path}")
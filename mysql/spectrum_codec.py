@@ -0,0 +1,71 @@
+"""
+光谱数据的二进制编码
+
+UVs/NIRs 表的 spectrum 列保存 float32 小端序吸光度数组（可选zstd压缩），encoding 列记录编码方式；
+波长轴对同一实验、同一仪器标定只在 SpectrumAxes 表中保存一次（float64小端序），光谱行通过 axis_id 引用。
+UV光谱2048点约8KB（JSON文本约60KB），读取时用 np.frombuffer 直接解码，无需解析文本。
+"""
+import hashlib
+
+import numpy as np
+
+try:
+    import zstandard
+except ImportError:  # 未安装zstandard时只写入未压缩数据
+    zstandard = None
+
+RAW = "f32"  # float32小端序
+ZSTD = "f32-zstd"  # float32小端序 + zstd压缩
+
+
+def encode_spectrum(absorbance, compress: bool = True):
+    """
+    编码光谱吸光度
+    :param absorbance: 吸光度数组
+    :param compress: 是否使用zstd压缩（未安装zstandard时忽略）
+    :return: (二进制数据, 编码方式)
+    """
+    raw = np.ascontiguousarray(absorbance, dtype='<f4').tobytes()
+    if compress and zstandard is not None:
+        return zstandard.ZstdCompressor(level=3).compress(raw), ZSTD
+    return raw, RAW
+
+
+def decode_spectrum(blob: bytes, encoding: str) -> np.ndarray:
+    """
+    解码 encode_spectrum 得到的二进制数据
+    :param blob: 二进制数据
+    :param encoding: 编码方式
+    :return: float32吸光度数组（只读）
+    """
+    if encoding == ZSTD:
+        if zstandard is None:
+            raise RuntimeError("解码zstd压缩的光谱数据需要安装zstandard")
+        blob = zstandard.ZstdDecompressor().decompress(blob)
+    elif encoding != RAW:
+        raise ValueError(f"不支持的光谱编码方式: {encoding}")
+    return np.frombuffer(blob, dtype='<f4')
+
+
+def encode_wavelengths(wavelengths):
+    """
+    编码波长轴，波长保留float64精度，与原JSON中的波长键一致
+    :param wavelengths: 波长数组
+    :return: (二进制数据, sha256十六进制摘要)，摘要用于识别同一仪器标定
+    """
+    blob = np.ascontiguousarray(wavelengths, dtype='<f8').tobytes()
+    return blob, hashlib.sha256(blob).hexdigest()
+
+
+def decode_wavelengths(blob: bytes) -> np.ndarray:
+    return np.frombuffer(blob, dtype='<f8')
+
+
+def wavelength_keys(blob: bytes) -> list:
+    """
+    解码波长轴并格式化为旧JSON格式中的波长键（json.dumps对float键使用repr，如 '190.0'、'190.44'），
+    二进制光谱与JSON文本解码后的 {波长: 吸光度} 键类型一致
+    :param blob: encode_wavelengths 得到的二进制数据
+    :return: 波长字符串列表
+    """
+    return [repr(wavelength) for wavelength in decode_wavelengths(blob).tolist()]